@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+"""
+Acquisition série dans un processus séparé, trames publiées en mémoire partagée
+Le démon possède le port série : il lit les octets, découpe les lignes, décode
+les trames (valeurs brutes) et les écrit dans un tampon circulaire
+multiprocessing.shared_memory avec un numéro de séquence par trame. Le serveur
+web, ou tout autre programme local, lit ce tampon sans passer par le démon :
+les exports et le travail pandas du serveur ne peuvent plus retarder la lecture
+de l'UART (processus et GIL distincts).
+
+Tampon : en-tête (compteurs, état du port) puis `capacity` enregistrements de
+RECORD.size octets. L'écrivain (unique) écrit l'enregistrement puis publie la
+tête ; un lecteur en retard de plus de `capacity` trames les compte comme perdues.
+La calibration reste appliquée par le lecteur (valeurs brutes dans le tampon).
+Le journal brut (.mevraw) d'une mesure est écrit par le démon, seul à voir les octets.
+"""
+
+import os
+import struct
+import sys
+import time
+from multiprocessing import shared_memory
+
+from main import FRAME_TYPES, parse_frames
+from raw_recorder import RawStreamRecorder
+
+RING_MAGIC = b'MEVRING1'
+RING_VERSION = 2
+DEFAULT_CAPACITY = 65536    # ~1 min à la limite de l'UART
+DEFAULT_NAME = 'mevem_acquisition'
+# magic | version | taille d'enregistrement | capacité | tête (trames publiées)
+# | octets lus | lignes | lignes sans trame | erreurs série | battement (epoch) | port ouvert | pid | port
+# | trames par type (ordre de FRAME_TYPES)
+HEADER = struct.Struct('<8sIIQQQQQQdII64s' + 'Q' * len(FRAME_TYPES))
+HEAD_OFFSET = 24
+# Séquence | arrivée (epoch) | type (indice dans FRAME_TYPES) | angle brut | force brute
+RECORD = struct.Struct('<QdBxHH2x')
+TYPE_CODES = {name: code for code, name in enumerate(FRAME_TYPES)}
+_HEAD = struct.Struct('<Q')
+
+
+def _attach(name, untrack=True):
+    """Ouvrir un segment existant sans le confier au resource_tracker de ce processus
+
+    Sinon, avant Python 3.13, un lecteur indépendant qui se termine supprimerait le
+    segment du démon. untrack=False : processus qui partage le resource_tracker du
+    créateur (sous-processus de AcquisitionLink), rien à retirer.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        if not untrack:
+            return shm
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        except Exception:
+            pass
+        return shm
+
+
+class FrameRing:
+    """Tampon circulaire de trames en mémoire partagée (un écrivain, plusieurs lecteurs)"""
+
+    def __init__(self, shm, owner=False):
+        self.shm = shm
+        self.owner = owner
+        self.buf = shm.buf
+        magic, version, record_size, capacity = HEADER.unpack_from(self.buf)[:4]
+        if magic != RING_MAGIC or version != RING_VERSION or record_size != RECORD.size:
+            raise ValueError(f"Segment {shm.name} : tampon d'acquisition inconnu")
+        self.capacity = capacity
+        self.name = shm.name
+
+    @classmethod
+    def create(cls, name=None, capacity=DEFAULT_CAPACITY):
+        """Créer le segment (propriétaire : le supprime à la fermeture)"""
+        shm = shared_memory.SharedMemory(name=name, create=True, size=HEADER.size + capacity * RECORD.size)
+        HEADER.pack_into(shm.buf, 0, RING_MAGIC, RING_VERSION, RECORD.size, capacity,
+                         0, 0, 0, 0, 0, 0.0, 0, 0, b'', *([0] * len(FRAME_TYPES)))
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name=DEFAULT_NAME, untrack=True):
+        return cls(_attach(name, untrack))
+
+    @property
+    def head(self):
+        """Nombre de trames publiées (séquence de la prochaine trame)"""
+        return _HEAD.unpack_from(self.buf, HEAD_OFFSET)[0]
+
+    def status(self):
+        (_, _, _, capacity, head, bytes_read, lines, parse_failures, serial_errors,
+         heartbeat, connected, pid, port, *frames_by_type) = HEADER.unpack_from(self.buf)
+        return {
+            'name': self.name,
+            'capacity': capacity,
+            'head': head,
+            'bytes_read': bytes_read,
+            'lines': lines,
+            'parse_failures': parse_failures,
+            'frames_by_type': dict(zip(FRAME_TYPES, frames_by_type)),
+            'serial_errors': serial_errors,
+            'heartbeat': heartbeat,
+            'connected': bool(connected),
+            'pid': pid,
+            'port': port.rstrip(b'\0').decode('utf-8', errors='replace') or None
+        }
+
+    def records(self, start, stop):
+        """Vue numpy (sans copie) des enregistrements [start, stop) ; deux vues si le tampon reboucle"""
+        import numpy as np
+
+        dtype = np.dtype({'names': ['seq', 'arrival', 'type', 'raw_angle', 'raw_force'],
+                          'formats': ['<u8', '<f8', 'u1', '<u2', '<u2'],
+                          'offsets': [0, 8, 16, 18, 20], 'itemsize': RECORD.size})
+        table = np.ndarray((self.capacity,), dtype=dtype, buffer=self.buf, offset=HEADER.size)
+        first, last = start % self.capacity, stop % self.capacity
+        if stop - start <= 0:
+            return []
+        if first < last:
+            return [table[first:last]]
+        return [table[first:], table[:last]] if last else [table[first:]]
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class RingWriter:
+    """Côté démon : écriture des trames et des compteurs"""
+
+    def __init__(self, ring):
+        self.ring = ring
+        self.buf = ring.buf
+        self.capacity = ring.capacity
+        self.head = ring.head
+        self.bytes_read = 0
+        self.lines = 0
+        self.parse_failures = 0
+        self.frames_by_type = [0] * len(FRAME_TYPES)
+        self.serial_errors = 0
+        self.connected = False
+        self.port = ''
+
+    def append(self, frames, arrival):
+        """Écrire les trames d'une lecture puis publier la nouvelle tête"""
+        seq = self.head
+        for frame in frames:
+            code = TYPE_CODES[frame['type']]
+            RECORD.pack_into(self.buf, HEADER.size + (seq % self.capacity) * RECORD.size,
+                             seq, arrival, code, frame['raw_angle'], frame['raw_force'])
+            self.frames_by_type[code] += 1
+            seq += 1
+        self.head = seq
+        self.publish()
+
+    def publish(self):
+        HEADER.pack_into(self.buf, 0, RING_MAGIC, RING_VERSION, RECORD.size, self.capacity, self.head,
+                         self.bytes_read, self.lines, self.parse_failures, self.serial_errors, time.time(),
+                         int(self.connected), os.getpid(), self.port.encode('utf-8')[:64], *self.frames_by_type)
+
+
+class RingReader:
+    """Côté consommateur : trames publiées depuis la dernière lecture, pertes comptées par séquence"""
+
+    def __init__(self, ring):
+        self.ring = ring
+        self.next_seq = ring.head
+        self.lost = 0
+
+    def seek_head(self):
+        """Ignorer les trames déjà publiées (début de mesure)"""
+        self.next_seq = self.ring.head
+
+    def _window(self, limit):
+        """Séquences [start, head) à lire ; les trames déjà écrasées sont comptées perdues"""
+        ring = self.ring
+        head = ring.head
+        start = self.next_seq
+        if head - start > ring.capacity:
+            # Lecteur trop lent : les plus anciennes ont été écrasées
+            self.lost += head - ring.capacity - start
+            start = head - ring.capacity
+        if limit is not None:
+            head = min(head, start + limit)
+        return start, head
+
+    def read_views(self, limit=None):
+        """Trames nouvelles en vues numpy (sans copie) : liste de (première séquence, vue)
+
+        Les vues pointent dans le tampon partagé : l'appelant en extrait les colonnes
+        (conversion par table, calibration_lut.convert_array) puis appelle check()
+        pour écarter les enregistrements que le démon a écrasés entre-temps.
+        """
+        start, head = self._window(limit)
+        views = []
+        for view in self.ring.records(start, head):
+            views.append((start, view))
+            start += len(view)
+        self.next_seq = head
+        return views
+
+    def check(self, first, view):
+        """Masque des enregistrements intacts (séquence attendue), à appeler après extraction"""
+        import numpy as np
+
+        intact = view['seq'] == np.arange(first, first + len(view), dtype=np.uint64)
+        self.lost += len(view) - int(np.count_nonzero(intact))
+        return intact
+
+    def read(self, limit=None):
+        """Trames nouvelles, copiées une à une : liste de (séquence, arrivée, type, angle brut, force brute)"""
+        ring = self.ring
+        start, head = self._window(limit)
+
+        frames = []
+        buf = ring.buf
+        for seq in range(start, head):
+            record = RECORD.unpack_from(buf, HEADER.size + (seq % ring.capacity) * RECORD.size)
+            if record[0] != seq:
+                # Écrasée pendant la lecture
+                self.lost += 1
+                continue
+            frames.append((seq, record[1], FRAME_TYPES[record[2]], record[3], record[4]))
+        self.next_seq = head
+        return frames
+
+
+def run_daemon(ring_name, commands=None, port=None, baudrate=115200, verbose=True):
+    """Boucle du démon : lecture série, décodage ligne par ligne, publication dans le tampon
+
+    commands : extrémité d'un multiprocessing.Pipe ; messages ('open', port, baudrate),
+    ('close',), ('record', chemin, options de RawStreamRecorder), ('stop_record',)
+    et ('stop',), chacun acquitté par (succès, message).
+    """
+    import serial
+
+    # Lancé par AcquisitionLink ou par main() : même resource_tracker que le créateur
+    ring = FrameRing.attach(ring_name, untrack=False)
+    writer = RingWriter(ring)
+    conn = None
+    pending = b''
+    recorder = None
+
+    def open_port(device, rate):
+        nonlocal conn, pending
+        close_port()
+        try:
+            conn = serial.Serial(port=device, baudrate=rate, timeout=0.02)
+        except Exception as e:
+            writer.serial_errors += 1
+            return False, str(e)
+        pending = b''
+        writer.connected = True
+        writer.port = device
+        writer.publish()
+        if verbose:
+            print(f"📡 Démon d'acquisition : {device} ouvert")
+        return True, device
+
+    def close_port():
+        nonlocal conn
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+            conn = None
+        writer.connected = False
+        writer.publish()
+
+    def start_recording(path, options):
+        nonlocal recorder
+        stop_recording()
+        try:
+            recorder = RawStreamRecorder(path, **options)
+        except Exception as e:
+            return False, str(e)
+        return True, path
+
+    def stop_recording():
+        nonlocal recorder
+        if recorder is not None:
+            recorder.close()
+            recorder = None
+
+    if port:
+        open_port(port, baudrate)
+
+    try:
+        while True:
+            if commands is not None and commands.poll(0 if conn else 0.05):
+                message = commands.recv()
+                if message[0] == 'open':
+                    commands.send(open_port(message[1], message[2]))
+                elif message[0] == 'close':
+                    close_port()
+                    commands.send((True, ''))
+                elif message[0] == 'record':
+                    commands.send(start_recording(message[1], message[2]))
+                elif message[0] == 'stop_record':
+                    stop_recording()
+                    commands.send((True, ''))
+                elif message[0] == 'stop':
+                    commands.send((True, ''))
+                    break
+
+            if conn is None:
+                if commands is None:
+                    time.sleep(0.05)
+                writer.publish()
+                continue
+
+            try:
+                chunk = conn.read(max(1, min(conn.in_waiting, 4096)))
+            except Exception as e:
+                print(f"⚠️ Démon d'acquisition : erreur série {e}")
+                writer.serial_errors += 1
+                close_port()
+                continue
+
+            if not chunk:
+                writer.publish()  # Battement
+                continue
+            arrival = time.time()
+            writer.bytes_read += len(chunk)
+            if recorder is not None:
+                recorder.feed(chunk, arrival)
+            pending += chunk
+            end = pending.rfind(b'\n')
+            if end < 0:
+                continue
+
+            frames = []
+            for line in pending[:end].split(b'\n'):
+                if not line.strip():
+                    continue
+                writer.lines += 1
+                line_frames = parse_frames(line)
+                if line_frames:
+                    frames.extend(line_frames)
+                else:
+                    writer.parse_failures += 1
+            pending = pending[end + 1:]
+            writer.append(frames, arrival)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_recording()
+        close_port()
+        ring.close()
+
+
+class DaemonRecording:
+    """Journal brut écrit par le démon ; close() comme RawStreamRecorder (attend la fin de l'écriture)"""
+
+    def __init__(self, link, path):
+        self.link = link
+        self.path = path
+        self._closed = False
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.link._call('stop_record', timeout=30.0)
+
+
+class AcquisitionLink:
+    """Côté serveur web : démon lancé en sous-processus, commandé par un tube"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, name=None, baudrate=115200):
+        import multiprocessing
+
+        self.baudrate = baudrate
+        self.ring = FrameRing.create(name, capacity)
+        self._commands, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=run_daemon, args=(self.ring.name, child),
+                                               name='mevem-acquisition', daemon=True)
+        self.process.start()
+        self.port = None
+
+    def _call(self, *message, timeout=5.0):
+        try:
+            self._commands.send(message)
+            if not self._commands.poll(timeout):
+                return False, "Le démon d'acquisition ne répond pas"
+            return self._commands.recv()
+        except (EOFError, OSError):
+            return False, "Le démon d'acquisition est arrêté"
+
+    def open(self, port):
+        """Faire ouvrir un port au démon (déjà ouvert : rien à faire)"""
+        status = self.ring.status()
+        if status['connected'] and status['port'] == port:
+            return True
+        success, message = self._call('open', port, self.baudrate)
+        self.port = port if success else None
+        if not success:
+            print(f"❌ Démon d'acquisition : {port} non ouvert ({message})")
+        return success
+
+    def close(self):
+        """Libérer le port (calibration interactive, lecture directe)"""
+        self._call('close')
+        self.port = None
+
+    def record(self, path, **options):
+        """Faire écrire au démon le journal brut des octets lus (options de RawStreamRecorder)"""
+        success, message = self._call('record', path, options)
+        if not success:
+            raise OSError(message)
+        return DaemonRecording(self, path)
+
+    def reader(self):
+        return RingReader(self.ring)
+
+    def status(self):
+        status = self.ring.status()
+        status['alive'] = self.process.is_alive()
+        return status
+
+    def stop(self):
+        if self.process.is_alive():
+            self._call('stop', timeout=2.0)
+            self.process.join(2.0)
+        self.ring.close()
+
+
+def main():
+    """Démon autonome : le tampon est lisible par tout programme local (--tail pour suivre les trames)"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Démon d'acquisition série en mémoire partagée")
+    parser.add_argument('--port', help='Port série du capteur (détection automatique si absent)')
+    parser.add_argument('--baudrate', type=int, default=115200)
+    parser.add_argument('--name', default=DEFAULT_NAME, help='Nom du segment de mémoire partagée')
+    parser.add_argument('--capacity', type=int, default=DEFAULT_CAPACITY, help='Trames gardées dans le tampon')
+    parser.add_argument('--tail', action='store_true', help='Lire le tampon d\'un démon déjà lancé')
+
+    args = parser.parse_args()
+    if args.tail:
+        reader = RingReader(FrameRing.attach(args.name))
+        try:
+            while True:
+                for seq, arrival, kind, raw_angle, raw_force in reader.read():
+                    print(f"{seq} {arrival:.3f} {kind} angle=0x{raw_angle:04X} force=0x{raw_force:04X}")
+                time.sleep(0.05)
+        except KeyboardInterrupt:
+            print(f"\n{reader.lost} trame(s) perdue(s)")
+        return
+
+    port = args.port
+    if not port:
+        from device_detection import detect_sensor
+        found, _ = detect_sensor(baudrate=args.baudrate)
+        if not found:
+            sys.exit("❌ Aucun capteur détecté")
+        port = found['device']
+
+    ring = FrameRing.create(args.name, args.capacity)
+    print(f"🧠 Tampon {ring.name} : {ring.capacity} trames ({args.name})")
+    try:
+        run_daemon(ring.name, port=port, baudrate=args.baudrate)
+    finally:
+        ring.close()
+
+
+if __name__ == "__main__":
+    main()
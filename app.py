@@ -4,20 +4,42 @@ Application Flask pour MEVEM - Mesure de la verse du maïs
 Interface web pour capteurs angle/force avec communication série
 """
 
+from startup_profile import startup_profiler, wait_for_server, warm_imports  # Chronométrage dès le premier import
 import json
 import threading
 import time
 import webbrowser
 from datetime import datetime
-from flask import Flask, render_template, jsonify, request, send_file
-from flask_socketio import SocketIO, emit
-import pandas as pd
+from flask import Flask, Response, render_template, jsonify, request, send_file
+from flask_socketio import SocketIO, emit, join_room, leave_room
 import os
 import sys
-import serial.tools.list_ports
-from main import CalibratedSensorDecoder
+from main import FRAME_TYPES, CalibratedSensorDecoder, SampleAverager
+from calibration_lut import DEFAULT_SCALES, evaluate, validate_channel
+from features import MechanicalFeatureTracker
+from sample_detector import IDLE, SampleDetector, detection_settings, validate_detection_settings
+from zero_tracking import ForceZeroTracker
+from port_monitor import PortMonitor
+from stage_profiler import (MAX_CAPTURE_SECONDS, DEFAULT_SAMPLE_INTERVAL, collapsed_text, pipeline_profiler,
+                            profile_dump, profile_top, sample_stacks)
+from latency_tracker import LatencyTracker
+from pipeline_metrics import (CONTENT_TYPE as METRICS_CONTENT_TYPE, DURATION_BUCKETS, Counter, MetricsRegistry,
+                              register_process_metrics)
+from live_transport import FLOAT_FIELDS, INT_FIELDS, TRANSPORT_FORMATS, TransportRegistry, pack_points
+from device_detection import detect_sensor, remember_device
+from outlier_filter import OutlierFilter, outlier_metadata, outlier_settings, validate_outlier_settings
+from raw_recorder import RawStreamRecorder, RAW_EXTENSION, CODECS as RAW_CODECS
+from sample_store import (build_sample_metadata, delete_sample, read_sample_metadata, read_sample_points,
+                          sample_file_path, sample_summary_row, save_samples, variety_directory,
+                          variety_workbook_path)
+from reference_envelope import ReferenceEnvelopeRegistry
+from trial_analytics import TrialReport, analyse_exports, write_trial_report
+from variety_stats import VarietyStatsRegistry
+from sample_file import SampleFileReader
 import io
 
+startup_profiler.mark('imports')
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'mevem_secret_2024'
 # Configuration SocketIO compatible PyInstaller
@@ -32,61 +54,102 @@ measurement_active = False
 measurement_thread = None
 selected_port = None
 averaging_window = 25  # Nombre de valeurs pour la moyenne
-angle_accumulator = []  # Accumulateur pour les angles
-force_accumulator = []  # Accumulateur pour les forces
 initial_skip_points = 10  # Nombre de points à ignorer au début (bruit initial)
-points_received = 0  # Compteur de points reçus dans la mesure actuelle
+sample_averager = SampleAverager(averaging_window, initial_skip_points)  # Filtrage et moyennage par blocs
+feature_tracker = MechanicalFeatureTracker()  # Caractéristiques mécaniques de la mesure en cours
+detection_config = detection_settings()  # Seuils de détection début/fin d'échantillon
+sample_detector = SampleDetector(detection_config)  # Machine à états de la mesure en cours
+zero_tracker = ForceZeroTracker()  # Suivi du zéro de force pendant les phases de repos
+outlier_config = outlier_settings()  # Paramètres du rejet des trames aberrantes
+outlier_filter = OutlierFilter(outlier_config)  # Filtre de Hampel par voie, compteurs par échantillon
+envelope_registry = ReferenceEnvelopeRegistry(loader=read_sample_points, source_path=variety_directory)  # Courbes de référence par variété
+envelope_scorer = None  # Comparaison de l'échantillon en cours à l'enveloppe de sa variété
+variety_stats = VarietyStatsRegistry(loader=read_sample_metadata, source_path=variety_workbook_path)  # Agrégats par variété
+raw_recording_enabled = False  # Enregistrer le flux série brut de chaque échantillon
+raw_recording_codec = 'zlib'  # Compression du flux brut (zlib, lzma ou none)
+pending_raw_recording = None  # Journal brut de la dernière mesure, pas encore rattaché à un échantillon
+raw_recorder = None  # Enregistreur du flux brut de la mesure en cours
+acquisition = None  # Démon d'acquisition (MEVEM_ACQUISITION=daemon) ; sinon lecture série dans le thread de mesure
+acquisition_reader = None  # Lecteur du tampon partagé du démon (pertes comptées par numéro de séquence)
+ACQUISITION_ENV = 'MEVEM_ACQUISITION'
+live_transports = TransportRegistry()  # Format des points (JSON ou binaire) choisi par chaque client
+MEASUREMENT_THREAD = 'measurement-worker'  # Nom du thread de mesure (profilage par échantillonnage)
+JSON_ROOM = 'live_json'  # Salons Socket.IO par format de transport
+BINARY_ROOM = 'live_binary'
+trial_report = None  # Rapport croisé des variétés (complété au fil de l'analyse)
+trial_progress = {'running': False, 'done': 0, 'total': 0, 'error': None}  # Avancement de l'analyse d'essai
+
+# Supervision de la chaîne d'acquisition (/api/metrics, format Prometheus)
+metrics = MetricsRegistry()
+serial_bytes = Counter('mevem_serial_bytes_total', "Octets lus sur le port série")  # Mode thread
+
+def acquisition_stat(key, thread_value):
+    """Compteur de lecture série : en-tête du tampon du démon (mode démon) ou valeur du mode thread"""
+    if acquisition:
+        return acquisition.ring.status()[key]
+    return thread_value() if decoder else None
+
+metrics.callback('mevem_serial_bytes_total', "Octets lus sur le port série",
+                 lambda: acquisition_stat('bytes_read', lambda: serial_bytes.value), kind='counter')
+serial_queue = metrics.gauge('mevem_serial_queue_bytes', "Octets en attente dans le tampon du port série au dernier passage")
+line_buffer = metrics.gauge('mevem_line_buffer_bytes', "Caractères reçus en attente d'une fin de ligne")
+metrics.callback('mevem_lines_total', "Lignes décodées depuis la création du décodeur (ou du démon)",
+                 lambda: acquisition_stat('lines', lambda: decoder.stats['total_lines']), kind='counter')
+metrics.callback('mevem_frames_total', "Trames valides par type depuis la création du décodeur (ou du démon)",
+                 lambda: acquisition_stat('frames_by_type', lambda: decoder.stats['frames_by_type']),
+                 kind='counter', labelnames=('type',))
+metrics.callback('mevem_parse_failures_total', "Lignes non vides sans trame valide",
+                 lambda: acquisition_stat('parse_failures', lambda: decoder.stats['parse_failures']),
+                 kind='counter')
+averaged_points = metrics.counter('mevem_averaged_points_total', "Points moyennés produits par la mesure")
+emit_seconds = metrics.histogram('mevem_emit_seconds', "Durée d'envoi des points aux clients Socket.IO",
+                                 labelnames=('event',))
+export_seconds = metrics.histogram('mevem_export_seconds', "Durée des exports Excel", labelnames=('export',),
+                                   buckets=DURATION_BUCKETS)
+metrics.callback('mevem_clients', "Clients connectés par transport des points",
+                 lambda: live_transports.counts, labelnames=('transport',))
+latency_seconds = metrics.histogram('mevem_latency_seconds', "Latence des points en direct par étape "
+                                   "(arrivée → décodage → envoi → affichage)", labelnames=('stage', 'transport'))
+latency_tracker = LatencyTracker(histogram=latency_seconds)  # Distributions de la mesure en cours
+metrics.callback('mevem_measurement_active', "Mesure en cours (1) ou arrêtée (0)", lambda: int(measurement_active))
+metrics.callback('mevem_server_info', "Mode asynchrone du serveur Socket.IO",
+                 lambda: {socketio.async_mode: 1}, labelnames=('async_mode',))
+register_process_metrics(metrics)
+metrics.callback('mevem_acquisition_frames_total', "Trames publiées dans le tampon partagé",
+                 lambda: acquisition.ring.head if acquisition else None, kind='counter')
+metrics.callback('mevem_acquisition_lag_frames', "Trames publiées pas encore lues par le serveur",
+                 lambda: acquisition.ring.head - acquisition_reader.next_seq if acquisition else None)
+metrics.callback('mevem_acquisition_lost_frames_total', "Trames écrasées avant lecture par le serveur",
+                 lambda: acquisition_reader.lost if acquisition else None, kind='counter')
+
+def ports_in_use():
+    """Ports ouverts par l'application (jamais ouverts par la surveillance des ports)"""
+    ports = set()
+    if acquisition and acquisition.port:
+        ports.add(acquisition.port)
+    if decoder and decoder.serial_conn and decoder.serial_conn.is_open:
+        ports.add(decoder.port)
+    return ports
+
+def on_ports_changed(ports):
+    """Pousser la nouvelle liste des ports aux navigateurs connectés"""
+    socketio.emit('ports_changed', {
+        'ports': ports,
+        'current_port': decoder.port if decoder else None
+    })
+
+port_monitor = PortMonitor(in_use=ports_in_use, on_change=on_ports_changed)  # Cache des ports série (branchements à chaud)
 
 def get_available_ports():
-    """Obtenir la liste des ports série disponibles"""
-    ports = []
+    """Obtenir la liste des ports série disponibles (cache de la surveillance des ports)"""
     try:
-        available_ports = serial.tools.list_ports.comports()
-        for port in available_ports:
-            # Tester l'accès au port
-            access_status = check_port_access(port.device)
-            
-            ports.append({
-                'device': port.device,
-                'description': port.description,
-                'manufacturer': port.manufacturer or 'Inconnu',
-                'accessible': access_status['accessible'],
-                'error': access_status.get('error', '')
-            })
+        if not port_monitor.ports():
+            # Surveillance pas encore démarrée : premier inventaire immédiat
+            return port_monitor.refresh()
+        return port_monitor.ports()
     except Exception as e:
         print(f"Erreur lors de la recherche des ports: {e}")
-    
-    return ports
-
-def check_port_access(port):
-    """Vérifier l'accès à un port série"""
-    try:
-        # Essayer d'ouvrir le port brièvement
-        test_conn = serial.Serial(port, timeout=0.1)
-        test_conn.close()
-        return {'accessible': True}
-    except serial.SerialException as e:
-        error_msg = str(e)
-        if 'Permission denied' in error_msg:
-            return {
-                'accessible': False,
-                'error': 'Permission refusée - Ajoutez votre utilisateur au groupe dialout'
-            }
-        elif 'Device or resource busy' in error_msg:
-            return {
-                'accessible': False,
-                'error': 'Port occupé par une autre application'
-            }
-        else:
-            return {
-                'accessible': False,
-                'error': f'Erreur: {error_msg}'
-            }
-    except Exception as e:
-        return {
-            'accessible': False,
-            'error': f'Erreur inconnue: {str(e)}'
-        }
+        return []
 
 def initialize_decoder(port=None):
     """Initialiser le décodeur de capteurs"""
@@ -94,7 +157,11 @@ def initialize_decoder(port=None):
     try:
         if port:
             # Utiliser le port spécifié
-            decoder = CalibratedSensorDecoder(port=port, baudrate=115200)
+            with startup_profiler.phase('initialisation du décodeur'):
+                decoder = CalibratedSensorDecoder(port=port, baudrate=115200)
+            if acquisition:
+                # Le démon garde le port ouvert
+                return acquisition.open(port)
             if decoder.connect():
                 print(f"✅ Connecté au port {port}")
                 decoder.disconnect()  # Déconnecter pour l'instant
@@ -102,33 +169,66 @@ def initialize_decoder(port=None):
             else:
                 return False
         else:
-            # Auto-détection
-            ports = ['/dev/ttyUSB0', '/dev/ttyUSB1', '/dev/ttyACM0', 'COM3', 'COM4', 'COM5']
-            
-            for port in ports:
-                try:
-                    decoder = CalibratedSensorDecoder(port=port, baudrate=115200)
-                    if decoder.connect():
-                        print(f"✅ Connecté au port {port}")
-                        decoder.disconnect()  # Déconnecter pour l'instant
-                        return True
-                except Exception as e:
-                    continue
+            # Auto-détection : port émettant des trames valides (VeTiMa/iMa/Ta)
+            with startup_profiler.phase('recherche du port'):
+                found, _ = detect_sensor(exclude=ports_in_use())
+            with startup_profiler.phase('initialisation du décodeur'):
+                decoder = CalibratedSensorDecoder(port=found['device'] if found else '/dev/null', baudrate=115200)
+            if found:
+                if acquisition:
+                    acquisition.open(found['device'])
+                return True
             
-            print("⚠️ Aucun port série trouvé, utilisation du mode démo")
-            decoder = CalibratedSensorDecoder(port='/dev/null', baudrate=115200)
+            print("⚠️ Aucun capteur détecté, utilisation du mode démo")
             return False
     except Exception as e:
         print(f"❌ Erreur initialisation décodeur: {e}")
         return False
 
+def start_acquisition_daemon():
+    """Lancer le démon d'acquisition (avant les threads du serveur) si MEVEM_ACQUISITION=daemon"""
+    global acquisition, acquisition_reader
+    if os.environ.get(ACQUISITION_ENV) != 'daemon':
+        return
+    import atexit
+    from acquisition_daemon import AcquisitionLink
+
+    acquisition = AcquisitionLink()
+    acquisition_reader = acquisition.reader()
+    atexit.register(acquisition.stop)
+    print(f"🧠 Démon d'acquisition lancé (tampon partagé {acquisition.ring.name}, "
+          f"{acquisition.ring.capacity} trames)")
+
+def release_acquisition_port():
+    """Mode démon : libérer le port pour une lecture directe (calibration, détection)"""
+    if acquisition and acquisition.port:
+        acquisition.close()
+
+def reclaim_acquisition_port():
+    """Mode démon : rendre le port du décodeur au démon"""
+    if acquisition and decoder and decoder.port != '/dev/null':
+        acquisition.open(decoder.port)
+
+def run_interactive_calibration():
+    """Calibration en console (lecture directe du port)"""
+    release_acquisition_port()
+    try:
+        decoder.calibrate_sensor()
+    finally:
+        reclaim_acquisition_port()
+
 def measurement_worker():
     """Worker thread pour la mesure en continu avec détection automatique"""
     global current_measurement, measurement_active, decoder
-    global averaging_window, angle_accumulator, force_accumulator
-    global initial_skip_points, points_received
+    global averaging_window, initial_skip_points, sample_averager
     
-    if not decoder.connect():
+    if acquisition:
+        # Mode démon : le port est lu par le processus d'acquisition, trames lues dans le tampon partagé
+        if not acquisition.open(decoder.port):
+            socketio.emit('error', {'message': 'Impossible de se connecter au capteur'})
+            return
+        acquisition_reader.seek_head()
+    elif not decoder.connect():
         socketio.emit('error', {'message': 'Impossible de se connecter au capteur'})
         return
     
@@ -136,82 +236,224 @@ def measurement_worker():
     start_time = time.time()
     last_data_time = time.time()
     
+    if not zero_tracker.enabled:
+        decoder.set_force_offset(0.0)
+    recorder = start_raw_recording(start_time)
+    emit_json = emit_seconds.labels('measurement_data')
+    emit_binary = emit_seconds.labels('measurement_batch')
+    latency_tracker.start_session()
+    profiler = pipeline_profiler
+    clock = time.perf_counter
+    profiling = False
+    batch = []  # Points du bloc en cours, pour les clients en transport binaire
+    batch_times = []  # (arrivée, point produit) de chaque point du lot
+    
     # Réinitialiser les accumulateurs et compteurs
-    angle_accumulator = []
-    force_accumulator = []
-    points_received = 0
+    sample_averager.configure(averaging_window, initial_skip_points)
+    sample_averager.reset()
+    feature_tracker.reset()
+    sample_detector.configure(detection_config)
+    sample_detector.reset()
+    outlier_filter.configure(outlier_config)
     
-    # Variables pour la détection automatique
-    data_received = False
+    # Arrêt de secours si le flux s'interrompt pendant un échantillon
     silence_threshold = 3.0  # 3 secondes de silence pour arrêter automatiquement
     
+    def process_frame(data, arrival_time):
+        """Détection, moyennage et envoi d'une trame calibrée ; True à la fin de l'échantillon"""
+        if profiling:
+            t0 = clock()
+        # Trame aberrante : ni détection, ni moyennage
+        if not outlier_filter.accept(data):
+            return False
+        
+        previous_state = sample_detector.state
+        false_starts = sample_detector.false_starts
+        released = sample_detector.feed(data, arrival_time)
+        zero_tracker.step(decoder, previous_state, sample_detector.state, data, released)
+        if previous_state == IDLE and sample_detector.state != IDLE:
+            outlier_filter.reset_counts()  # Début d'échantillon
+        if profiling:
+            profiler.record('detection', clock() - t0)
+        
+        if sample_detector.false_starts != false_starts:
+            # Faux départ : abandonner les points déjà envoyés
+            print("↩️ Faux départ ignoré (échantillon trop court)")
+            current_measurement.clear()
+            sample_averager.reset()
+            feature_tracker.reset()
+            if envelope_scorer:
+                envelope_scorer.reset()
+            socketio.emit('measurement_discarded', sample_detector.to_dict())
+        elif sample_detector.state != previous_state:
+            socketio.emit('measurement_detection', sample_detector.to_dict())
+        
+        for frame, frame_time in released:
+            if profiling:
+                t0 = clock()
+            measurement_point = sample_averager.add(frame, frame_time - sample_detector.start_time)
+            
+            if measurement_point:
+                parsed_at = time.time()
+                latency_tracker.record('arrival_parse', parsed_at - frame_time)
+                averaged_points.inc()
+                current_measurement.append(measurement_point)
+                feature_tracker.update(measurement_point['angle'], measurement_point['force'])
+                if profiling:
+                    profiler.record('averaging', clock() - t0)
+                
+                # Envoyer les données en temps réel (clients JSON, point par point)
+                emit_start = clock()
+                if live_transports.has('json'):
+                    # Heures d'arrivée et d'envoi : le client renvoie emit_ts une fois dessiné
+                    emit_ts = time.time()
+                    socketio.emit('measurement_data', dict(measurement_point, arrival_ts=frame_time,
+                                                           emit_ts=emit_ts), to=JSON_ROOM)
+                    emit_json.observe(clock() - emit_start)
+                    latency_tracker.record('parse_emit', emit_ts - parsed_at, 'json')
+                batch.append(measurement_point)
+                batch_times.append((frame_time, parsed_at))
+                if profiling:
+                    profiler.record('emit', clock() - emit_start)
+                
+                # Écart à l'enveloppe de la variété
+                if envelope_scorer:
+                    score = envelope_scorer.update(measurement_point['angle'], measurement_point['force'])
+                    if score:
+                        socketio.emit('measurement_envelope', score)
+            elif profiling:
+                profiler.record('averaging', clock() - t0)
+        
+        return sample_detector.finished
+    
+    def daemon_frames():
+        """Trames publiées par le démon, calibrées par bloc sur les vues du tampon partagé"""
+        frames = []
+        for first, view in acquisition_reader.read_views():
+            raw_angles = view['raw_angle']
+            raw_forces = view['raw_force']
+            angles, forces = decoder.convert_raw_arrays(raw_angles, raw_forces)
+            columns = (view['arrival'].tolist(), view['type'].tolist(), raw_angles.tolist(), raw_forces.tolist(),
+                       angles.tolist(), forces.tolist())
+            # Après extraction : écarter les enregistrements écrasés entre-temps par le démon
+            intact = acquisition_reader.check(first, view).tolist()
+            for ok, arrival, kind, raw_angle, raw_force, angle, force in zip(intact, *columns):
+                if ok:
+                    frames.append(({'timestamp': datetime.fromtimestamp(arrival), 'type': FRAME_TYPES[kind],
+                                    'raw_angle': raw_angle, 'raw_force': raw_force,
+                                    'angle_deg': angle, 'force_kg': force}, arrival))
+        return frames
+    
+    def emit_batch():
+        """Clients binaires : un lot en colonnes par bloc lu ; caractéristiques une fois par bloc"""
+        if not batch:
+            return
+        emit_start = clock()
+        if live_transports.has('binary'):
+            emit_ts = time.time()
+            socketio.emit('measurement_batch', pack_points(batch, batch_times[0][0], emit_ts),
+                          to=BINARY_ROOM)
+            emit_binary.observe(clock() - emit_start)
+            for _, point_parsed_at in batch_times:
+                latency_tracker.record('parse_emit', emit_ts - point_parsed_at, 'binary')
+        # Caractéristiques à jour du dernier point, aux seuls salons des points en direct
+        features = measurement_features()
+        for fmt, room in (('json', JSON_ROOM), ('binary', BINARY_ROOM)):
+            if live_transports.has(fmt):
+                socketio.emit('measurement_features', features, to=room)
+        if profiling:
+            profiler.record('emit', clock() - emit_start)
+        batch.clear()
+        batch_times.clear()
+    
     try:
         while measurement_active:
             try:
-                if decoder.serial_conn and decoder.serial_conn.in_waiting > 0:
-                    bytes_to_read = min(decoder.serial_conn.in_waiting, 1024)
+                profiler.poll_capture()
+                profiling = profiler.enabled  # Chronométrage par étape (mode profilage)
+                if acquisition:
+                    # Trames publiées par le démon depuis le dernier passage
+                    if profiling:
+                        t0 = clock()
+                    frames = daemon_frames()
+                    if profiling:
+                        profiler.record('calibration', clock() - t0)
+                    if frames:
+                        last_data_time = frames[-1][1]
+                        force_offset = decoder.force_offset
+                        for data, arrival in frames:
+                            if decoder.force_offset != force_offset:
+                                # Tare appliquée au début de l'échantillon : suite du bloc reconvertie
+                                data['angle_deg'], data['force_kg'] = decoder.convert_raw_to_physical(
+                                    data['raw_angle'], data['raw_force'])
+                            if process_frame(data, arrival):
+                                break
+                        emit_batch()
+                    waiting = 0
+                else:
+                    waiting = decoder.serial_conn.in_waiting if decoder.serial_conn else 0
+                serial_queue.set(waiting)
+                if waiting > 0:
+                    bytes_to_read = min(waiting, 1024)
+                    if profiling:
+                        t0 = clock()
                     chunk = decoder.serial_conn.read(bytes_to_read)
+                    if profiling:
+                        profiler.record('serial_read', clock() - t0)
                     
                     if chunk:
-                        buffer += chunk.decode('utf-8', errors='ignore')
                         last_data_time = time.time()
-                        data_received = True
+                        serial_bytes.inc(len(chunk))
+                        if recorder:
+                            recorder.feed(chunk, last_data_time)
+                        if profiling:
+                            t0 = clock()
+                        buffer += chunk.decode('utf-8', errors='ignore')
+                        if profiling:
+                            profiler.record('decode', clock() - t0)
                         
-                        while '\n' in buffer:
+                        while '\n' in buffer and not sample_detector.finished:
                             line, buffer = buffer.split('\n', 1)
-                            parsed = decoder.parse_line(line)
+                            if profiling:
+                                # Expressions régulières puis calibration, chronométrées séparément
+                                t0 = clock()
+                                raw_data = decoder.parse_line_raw(line)
+                                t1 = clock()
+                                parsed = decoder.convert_frames(raw_data) if raw_data else None
+                                profiler.record('parse', t1 - t0)
+                                profiler.record('calibration', clock() - t1)
+                            else:
+                                parsed = decoder.parse_line(line)
                             
                             if parsed:
                                 for data in parsed:
-                                    points_received += 1
-                                    
-                                    # Ignorer les premiers points (bruit initial)
-                                    if points_received <= initial_skip_points:
-                                        print(f"🚫 Ignorer point {points_received}/{initial_skip_points} (bruit initial)")
-                                        continue
-                                    
-                                    # Accumuler les valeurs
-                                    angle_accumulator.append({
-                                        'angle': data['angle_deg'],
-                                        'raw_angle': data['raw_angle']
-                                    })
-                                    force_accumulator.append({
-                                        'force': data['force_kg'],
-                                        'raw_force': data['raw_force']
-                                    })
-                                    
-                                    # Si on a assez de valeurs, calculer la moyenne
-                                    if len(angle_accumulator) >= averaging_window:
-                                        avg_angle = sum([item['angle'] for item in angle_accumulator]) / len(angle_accumulator)
-                                        avg_force = sum([item['force'] for item in force_accumulator]) / len(force_accumulator)
-                                        avg_raw_angle = sum([item['raw_angle'] for item in angle_accumulator]) / len(angle_accumulator)
-                                        avg_raw_force = sum([item['raw_force'] for item in force_accumulator]) / len(force_accumulator)
-                                        
-                                        measurement_point = {
-                                            'timestamp': time.time() - start_time,
-                                            'angle': round(avg_angle, 2),
-                                            'force': round(avg_force, 3),
-                                            'raw_angle': int(avg_raw_angle),
-                                            'raw_force': int(avg_raw_force),
-                                            'samples_count': len(angle_accumulator)
-                                        }
-                                        
-                                        current_measurement.append(measurement_point)
-                                        
-                                        # Envoyer les données en temps réel
-                                        socketio.emit('measurement_data', measurement_point)
-                                        
-                                        # Vider les accumulateurs
-                                        angle_accumulator = []
-                                        force_accumulator = []
+                                    if process_frame(data, last_data_time):
+                                        break
+                        
+                        emit_batch()
+                        line_buffer.set(len(buffer))
                 
-                # Détection d'arrêt automatique si aucune donnée reçue depuis un moment
-                if data_received and (time.time() - last_data_time) > silence_threshold:
+                # Fin de l'échantillon détectée sur le signal (retour au repos)
+                if sample_detector.finished:
+                    print("🔴 Arrêt automatique détecté (retour au repos)")
+                    measurement_active = False
+                    socketio.emit('measurement_auto_stopped', {
+                        'message': 'Mesure arrêtée automatiquement (retour au repos)',
+                        'reason': 'signal',
+                        'data_points': len(current_measurement),
+                        'features': measurement_features()
+                    })
+                    break
+                
+                # Secours : aucune donnée reçue depuis un moment pendant un échantillon
+                if sample_detector.started and (time.time() - last_data_time) > silence_threshold:
                     print("🔴 Arrêt automatique détecté (silence détecté)")
                     measurement_active = False
                     socketio.emit('measurement_auto_stopped', {
                         'message': 'Mesure arrêtée automatiquement (fin des données)',
-                        'data_points': len(current_measurement)
+                        'reason': 'silence',
+                        'data_points': len(current_measurement),
+                        'features': measurement_features()
                     })
                     break
                 
@@ -224,8 +466,110 @@ def measurement_worker():
     except Exception as e:
         print(f"❌ Erreur critique dans measurement_worker: {e}")
     finally:
+        profiler.finish_capture()
         decoder.disconnect()
         measurement_active = False
+        if recorder:
+            recorder.close()
+
+def prepare_envelope_scorer(data):
+    """Préparer la comparaison à la variété de l'échantillon qui va être mesuré"""
+    global envelope_scorer
+    
+    envelope_scorer = None
+    variety = (data.get('variety') or '').strip()
+    if not variety:
+        return
+    try:
+        # L'échantillon remesuré ne sert pas de référence à lui-même
+        envelope_scorer = envelope_registry.scorer(variety, exclude=data.get('sample_number'))
+    except Exception as e:
+        print(f"⚠️ Enveloppe de référence indisponible pour {variety}: {e}")
+
+def envelope_metadata(variety):
+    """Lignes de métadonnées de la comparaison à la référence (si l'échantillon a été noté)"""
+    if not envelope_scorer or envelope_scorer.variety != variety or not envelope_scorer.compared:
+        return []
+    return [
+        ('Écart RMS à la référence (%)', round(envelope_scorer.rms_pct(), 1)),
+        ('Points hors bande de référence (%)', round(envelope_scorer.outside_pct(), 1)),
+        ('Échantillons de référence', envelope_scorer.envelope['samples'])
+    ]
+
+def measurement_features():
+    """Caractéristiques de la mesure en cours et trames rejetées (envoyées à l'interface)"""
+    features = feature_tracker.to_dict()
+    features['rejected_frames'] = outlier_filter.counts()
+    return features
+
+def wait_for_measurement_worker(timeout=2.0):
+    """Attendre la fin du worker précédent (port série libéré) avant d'en relancer un"""
+    if measurement_thread and measurement_thread.is_alive() and measurement_thread is not threading.current_thread():
+        measurement_thread.join(timeout)
+
+def start_raw_recording(start_time):
+    """Ouvrir un journal brut pour la mesure qui démarre (si activé)"""
+    global pending_raw_recording, raw_recorder
+    
+    discard_raw_recording()
+    if not raw_recording_enabled:
+        return None
+    
+    path = os.path.join('exports', '_raw', f"mesure_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}{RAW_EXTENSION}")
+    try:
+        # Mode démon : le journal est écrit par le processus d'acquisition, seul à lire les octets
+        open_recorder = acquisition.record if acquisition else RawStreamRecorder
+        recorder = open_recorder(
+            path,
+            calibration=decoder.calibration,
+            settings={
+                'averaging_window': averaging_window,
+                'initial_skip_points': initial_skip_points,
+                'detection': detection_config,
+                'outliers': outlier_config,
+                'zero_tracking': {**zero_tracker.to_dict(), 'offset': decoder.force_offset}
+            },
+            codec=raw_recording_codec,
+            port=decoder.port,
+            baudrate=decoder.baudrate,
+            start_time=start_time
+        )
+    except Exception as e:
+        print(f"⚠️ Enregistrement du flux brut impossible: {e}")
+        return None
+    
+    pending_raw_recording = path
+    raw_recorder = recorder
+    return recorder
+
+def discard_raw_recording():
+    """Supprimer le journal brut d'une mesure qui n'a pas été sauvegardée"""
+    global pending_raw_recording
+    
+    if raw_recorder:
+        raw_recorder.close()
+    if pending_raw_recording and os.path.exists(pending_raw_recording):
+        try:
+            os.remove(pending_raw_recording)
+        except OSError as e:
+            print(f"⚠️ Suppression du flux brut impossible: {e}")
+    pending_raw_recording = None
+
+def attach_raw_recording(variety_dir, variety, sample_number):
+    """Rattacher le journal brut de la mesure courante à un échantillon sauvegardé"""
+    global pending_raw_recording
+    
+    if raw_recorder:
+        raw_recorder.close()
+    if not pending_raw_recording or not os.path.exists(pending_raw_recording):
+        return None
+    
+    raw_dir = os.path.join(variety_dir, 'raw')
+    os.makedirs(raw_dir, exist_ok=True)
+    target = os.path.join(raw_dir, f"{variety}_ech{sample_number}{RAW_EXTENSION}")
+    os.replace(pending_raw_recording, target)
+    pending_raw_recording = None
+    return target
 
 @app.route('/')
 def index():
@@ -234,8 +578,11 @@ def index():
 
 @app.route('/api/ports/list')
 def list_ports():
-    """Lister les ports série disponibles"""
-    ports = get_available_ports()
+    """Lister les ports série disponibles (refresh=1 : nouvel inventaire et nouveaux tests)"""
+    if request.args.get('refresh') == '1':
+        ports = port_monitor.refresh(reprobe=True)
+    else:
+        ports = get_available_ports()
     return jsonify({
         'ports': ports,
         'current_port': decoder.port if decoder else None
@@ -262,6 +609,10 @@ def select_port():
     success = initialize_decoder(port)
     if success:
         selected_port = port
+        # Choix manuel : ce port sera écouté en premier au prochain démarrage
+        port_info = port_monitor.get(port)
+        if port_info:
+            remember_device(port_info)
         return jsonify({
             'success': True, 
             'message': f'Port {port} sélectionné',
@@ -272,6 +623,35 @@ def select_port():
             'error': f'Impossible de se connecter au port {port}'
         }), 400
 
+@app.route('/api/ports/detect', methods=['POST'])
+def detect_sensor_port():
+    """Rechercher le capteur sur tous les ports (écoute parallèle des trames)"""
+    global decoder, selected_port
+
+    if measurement_active:
+        return jsonify({'error': 'Arrêtez la mesure avant de rechercher le capteur'}), 409
+
+    try:
+        if decoder:
+            decoder.disconnect()
+        release_acquisition_port()
+        found, results = detect_sensor()
+        if not found:
+            reclaim_acquisition_port()
+            return jsonify({'error': 'Aucun port n\'émet de trames du capteur', 'probes': results}), 404
+
+        decoder = CalibratedSensorDecoder(port=found['device'], baudrate=115200)
+        selected_port = found['device']
+        reclaim_acquisition_port()
+        return jsonify({
+            'success': True,
+            'message': f'Capteur détecté sur {found["device"]}',
+            'port': found['device'],
+            'probes': results
+        })
+    except Exception as e:
+        return jsonify({'error': f'Erreur détection capteur: {str(e)}'}), 500
+
 @app.route('/api/calibration/status')
 def get_calibration_status():
     """Obtenir le statut de calibration"""
@@ -294,7 +674,7 @@ def start_calibration():
     
     try:
         # Démarrer la calibration dans un thread séparé
-        threading.Thread(target=decoder.calibrate_sensor, daemon=True).start()
+        threading.Thread(target=run_interactive_calibration, daemon=True).start()
         return jsonify({'success': True, 'message': 'Calibration démarrée'})
     except Exception as e:
         return jsonify({'error': f'Erreur calibration: {str(e)}'}), 500
@@ -302,15 +682,17 @@ def start_calibration():
 @app.route('/api/measurement/start', methods=['POST'])
 def start_measurement():
     """Démarrer une mesure"""
-    global measurement_active, measurement_thread, current_measurement, points_received
+    global measurement_active, measurement_thread, current_measurement
     
     if measurement_active:
         return jsonify({'error': 'Une mesure est déjà en cours'}), 400
     
+    wait_for_measurement_worker()
+    prepare_envelope_scorer(request.get_json(silent=True) or {})
     current_measurement = []
-    points_received = 0  # Réinitialiser le compteur
+    sample_averager.reset()  # Réinitialiser le compteur
     measurement_active = True
-    measurement_thread = threading.Thread(target=measurement_worker, daemon=True)
+    measurement_thread = threading.Thread(target=measurement_worker, name=MEASUREMENT_THREAD, daemon=True)
     measurement_thread.start()
     
     return jsonify({'success': True, 'message': 'Mesure démarrée'})
@@ -318,15 +700,17 @@ def start_measurement():
 @app.route('/api/measurement/start_listening', methods=['POST'])
 def start_listening():
     """Démarrer l'écoute automatique des données (sans mesure active)"""
-    global measurement_active, measurement_thread, current_measurement, points_received
+    global measurement_active, measurement_thread, current_measurement
     
     if measurement_active:
         return jsonify({'success': True, 'message': 'Écoute déjà active'})
     
+    wait_for_measurement_worker()
+    prepare_envelope_scorer(request.get_json(silent=True) or {})
     current_measurement = []
-    points_received = 0  # Réinitialiser le compteur
+    sample_averager.reset()  # Réinitialiser le compteur
     measurement_active = True
-    measurement_thread = threading.Thread(target=measurement_worker, daemon=True)
+    measurement_thread = threading.Thread(target=measurement_worker, name=MEASUREMENT_THREAD, daemon=True)
     measurement_thread.start()
     
     return jsonify({'success': True, 'message': 'Écoute des données démarrée'})
@@ -350,7 +734,8 @@ def get_measurement_data():
     return jsonify({
         'data': current_measurement,
         'active': measurement_active,
-        'points': len(current_measurement)
+        'points': len(current_measurement),
+        'features': measurement_features()
     })
 
 @app.route('/api/measurement/clear', methods=['POST'])
@@ -363,6 +748,8 @@ def clear_measurement():
         time.sleep(0.5)  # Laisser le temps au thread de s'arrêter
     
     current_measurement = []
+    feature_tracker.reset()
+    discard_raw_recording()
     
     return jsonify({'success': True, 'message': 'Mesure effacée'})
 
@@ -379,7 +766,7 @@ def get_averaging_window():
 @app.route('/api/averaging/set', methods=['POST'])
 def set_averaging_window():
     """Définir la fenêtre de moyennage"""
-    global averaging_window, angle_accumulator, force_accumulator
+    global averaging_window
     
     data = request.get_json()
     new_window = data.get('window', 10)
@@ -390,8 +777,8 @@ def set_averaging_window():
     averaging_window = new_window
     
     # Vider les accumulateurs si on change pendant une mesure
-    angle_accumulator = []
-    force_accumulator = []
+    sample_averager.configure(averaging_window, initial_skip_points)
+    sample_averager.clear_accumulators()
     
     return jsonify({
         'success': True, 
@@ -412,6 +799,7 @@ def set_skip_points():
             return jsonify({'error': 'Nombre de points à ignorer doit être entre 0 et 100'}), 400
         
         initial_skip_points = new_skip
+        sample_averager.configure(averaging_window, initial_skip_points)
         print(f"🚫 Points à ignorer défini à {initial_skip_points}")
         
         return jsonify({
@@ -422,7 +810,131 @@ def set_skip_points():
     except Exception as e:
         return jsonify({'error': f'Erreur configuration points à ignorer: {str(e)}'}), 500
 
+@app.route('/api/raw_recording/get')
+def get_raw_recording():
+    """Obtenir la configuration de l'enregistrement du flux brut"""
+    return jsonify({
+        'enabled': raw_recording_enabled,
+        'codec': raw_recording_codec,
+        'codecs': list(RAW_CODECS)
+    })
+
+@app.route('/api/raw_recording/set', methods=['POST'])
+def set_raw_recording():
+    """Activer ou désactiver l'enregistrement du flux brut"""
+    global raw_recording_enabled, raw_recording_codec
+    
+    data = request.get_json()
+    enabled = data.get('enabled', raw_recording_enabled)
+    codec = data.get('codec', raw_recording_codec)
+    
+    if not isinstance(enabled, bool):
+        return jsonify({'error': 'Le paramètre enabled doit être un booléen'}), 400
+    if codec not in RAW_CODECS:
+        return jsonify({'error': f"Compression inconnue: {codec}"}), 400
+    
+    raw_recording_enabled = enabled
+    raw_recording_codec = codec
+    
+    return jsonify({
+        'success': True,
+        'message': f"Enregistrement du flux brut {'activé' if enabled else 'désactivé'} ({codec})",
+        'enabled': raw_recording_enabled,
+        'codec': raw_recording_codec
+    })
+
+@app.route('/api/detection/get')
+def get_detection_settings():
+    """Obtenir les seuils de détection début/fin d'échantillon"""
+    return jsonify({
+        'settings': detection_config,
+        'state': sample_detector.to_dict()
+    })
+
+@app.route('/api/detection/set', methods=['POST'])
+def set_detection_settings():
+    """Définir les seuils de détection (appliqués au prochain échantillon)"""
+    global detection_config
+    
+    data = request.get_json() or {}
+    error = validate_detection_settings(data, detection_config)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    detection_config = detection_settings({**detection_config, **data})
+    
+    return jsonify({
+        'success': True,
+        'message': 'Paramètres de détection mis à jour',
+        'settings': detection_config
+    })
+
+@app.route('/api/outliers/get')
+def get_outlier_settings():
+    """Obtenir les paramètres du rejet des trames aberrantes"""
+    return jsonify({
+        'settings': outlier_config,
+        'rejected_frames': outlier_filter.counts()
+    })
+
+@app.route('/api/outliers/set', methods=['POST'])
+def set_outlier_settings():
+    """Définir les paramètres du rejet des trames aberrantes (appliqués à la prochaine écoute)"""
+    global outlier_config
+    
+    data = request.get_json() or {}
+    error = validate_outlier_settings(data)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    outlier_config = outlier_settings({**outlier_config, **data})
+    
+    return jsonify({
+        'success': True,
+        'message': 'Paramètres de filtrage mis à jour',
+        'settings': outlier_config
+    })
+
+@app.route('/api/zero_tracking/get')
+def get_zero_tracking():
+    """Obtenir l'état du suivi automatique du zéro de force"""
+    offset = decoder.force_offset if decoder else 0.0
+    offset_kg = 0.0
+    if decoder and decoder.calibration['force']['calibrated']:
+        force_cal = decoder.calibration['force']
+        offset_kg = (evaluate(force_cal, force_cal['raw_min'] + offset, DEFAULT_SCALES['force']) -
+                     evaluate(force_cal, force_cal['raw_min'], DEFAULT_SCALES['force']))
+    return jsonify({
+        'enabled': zero_tracker.enabled,
+        'ready': zero_tracker.ready,
+        'offset_raw': round(offset, 3),
+        'offset_kg': round(offset_kg, 4),
+        'baseline_raw': round(zero_tracker.estimate, 3) if zero_tracker.estimate is not None else None
+    })
+
+@app.route('/api/zero_tracking/set', methods=['POST'])
+def set_zero_tracking():
+    """Activer ou désactiver le suivi automatique du zéro de force"""
+    data = request.get_json() or {}
+    enabled = data.get('enabled', zero_tracker.enabled)
+    
+    if not isinstance(enabled, bool):
+        return jsonify({'error': 'Le paramètre enabled doit être un booléen'}), 400
+    
+    zero_tracker.enabled = enabled
+    if not enabled and decoder and not (measurement_active and sample_detector.started):
+        # Revenir au zéro de calibration (sinon au début de la prochaine écoute)
+        decoder.set_force_offset(0.0)
+    
+    return jsonify({
+        'success': True,
+        'message': f"Suivi du zéro de force {'activé' if enabled else 'désactivé'}",
+        'enabled': zero_tracker.enabled
+    })
+
 @app.route('/api/measurement/export/excel', methods=['POST'])
+@export_seconds.labels('measurement').timed
+@pipeline_profiler.timed('export_excel')
 def export_to_excel():
     """Exporter les données vers Excel avec gestion des échantillons multiples"""
     if not current_measurement:
@@ -437,74 +949,36 @@ def export_to_excel():
         if not variety:
             return jsonify({'error': 'Variété obligatoire pour la sauvegarde'}), 400
 
-        # Créer le dossier de la variété
-        variety_dir = os.path.join('exports', variety)
-        os.makedirs(variety_dir, exist_ok=True)
-
-        # Nom du fichier principal pour cette variété
-        main_filename = f"{variety}_mesures.xlsx"
-        filepath = os.path.join(variety_dir, main_filename)
-
-        # Calculer les statistiques de la mesure actuelle
-        forces = [p['force'] for p in current_measurement]
-        angles = [p['angle'] for p in current_measurement]
-        timestamps = [p['timestamp'] for p in current_measurement]
-
-        max_force = max(forces) if forces else 0
-        max_force_index = forces.index(max_force) if forces else 0
-        angle_at_max_force = angles[max_force_index] if angles else 0
-
-        # Créer un DataFrame pour cette mesure
-        df_measurement = pd.DataFrame(current_measurement)
-
-        # Métadonnées pour cette mesure
-        metadata_info = [
-            'Date de mesure', 'Variété', 'Échantillon', 'Nombre de points',
-            'Durée (s)', 'Angle min (°)', 'Angle max (°)',
-            'Force min (kg)', 'Force max (kg)', 'Angle à force max (°)'
-        ]
-        metadata_values = [
-            datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            variety,
-            sample_number,
-            len(current_measurement),
-            round(max(timestamps) - min(timestamps) if timestamps else 0, 2),
-            round(min(angles) if angles else 0, 2),
-            round(max(angles) if angles else 0, 2),
-            round(min(forces) if forces else 0, 3),
-            round(max_force, 3),
-            round(angle_at_max_force, 2)
-        ]
-
-        # Nom des onglets
-        sheet_name_data = f"Echantillon_{sample_number}"
-        sheet_name_meta = f"Meta_Ech_{sample_number}"
-
-        # Si le fichier existe déjà, on l'ouvre et on ajoute les nouveaux onglets
-        if os.path.exists(filepath):
-            # Lire le fichier existant
-            with pd.ExcelWriter(filepath, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
-                # Ajouter les données de cette mesure
-                df_measurement.to_excel(writer, sheet_name=sheet_name_data, index=False)
-                
-                # Ajouter les métadonnées
-                metadata_df = pd.DataFrame({
-                    'Information': metadata_info,
-                    'Valeur': metadata_values
-                })
-                metadata_df.to_excel(writer, sheet_name=sheet_name_meta, index=False)
-        else:
-            # Créer un nouveau fichier
-            with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-                # Ajouter les données de cette mesure
-                df_measurement.to_excel(writer, sheet_name=sheet_name_data, index=False)
-                
-                # Ajouter les métadonnées
-                metadata_df = pd.DataFrame({
-                    'Information': metadata_info,
-                    'Valeur': metadata_values
-                })
-                metadata_df.to_excel(writer, sheet_name=sheet_name_meta, index=False)
+        # Écrire l'échantillon dans le classeur de la variété
+        features = feature_tracker.to_dict() if feature_tracker.count == len(current_measurement) else None
+        force_offset = decoder.force_offset if decoder else 0.0
+        metadata = build_sample_metadata(variety, sample_number, current_measurement, features=features,
+                                         extra_metadata=[('Correction zéro force (brut)', round(force_offset, 3))] +
+                                         outlier_metadata(outlier_filter.counts()) +
+                                         envelope_metadata(variety))
+        filepath = save_samples(variety, [{
+            'sample_number': sample_number,
+            'points': current_measurement,
+            'metadata': metadata,
+            'calibration': decoder.calibration if decoder else None,
+            'settings': {
+                'averaging_window': averaging_window,
+                'initial_skip_points': initial_skip_points,
+                'detection': detection_config,
+                'outliers': outlier_config,
+                'force_offset': force_offset
+            }
+        }])
+        
+        # Mettre à jour les statistiques de la variété (remplace l'échantillon s'il existait)
+        variety_stats.set_sample(variety, sample_summary_row(metadata))
+        envelope_registry.set_curve(variety, sample_number, current_measurement)
+        variety_dir = os.path.dirname(filepath)
+        main_filename = os.path.basename(filepath)
+
+        # Rattacher le flux brut à l'échantillon (retraitement ultérieur)
+        if not measurement_active:
+            attach_raw_recording(variety_dir, variety, sample_number)
 
         # Créer la réponse pour le téléchargement
         output = io.BytesIO()
@@ -522,6 +996,37 @@ def export_to_excel():
     except Exception as e:
         return jsonify({'error': f'Erreur export Excel: {str(e)}'}), 500
 
+@app.route('/api/sample/slice')
+def get_sample_slice():
+    """Lire une tranche temporelle d'un échantillon sauvegardé (fichier binaire indexé)"""
+    variety = request.args.get('variety', '').strip()
+    sample_number = request.args.get('sample', type=int)
+    t0 = request.args.get('t0', type=float)
+    t1 = request.args.get('t1', type=float)
+    max_points = request.args.get('max_points', type=int)
+    
+    if not variety or sample_number is None:
+        return jsonify({'error': 'Variété et échantillon obligatoires'}), 400
+    
+    path = sample_file_path(variety, sample_number)
+    if not os.path.exists(path):
+        return jsonify({'error': f'Échantillon {sample_number} introuvable pour {variety}'}), 404
+    
+    try:
+        with SampleFileReader(path) as reader:
+            level = reader.level_for(max_points, t0, t1) if max_points else 0
+            points = reader.read_range(t0, t1, level)
+            return jsonify({
+                'variety': variety,
+                'sample': sample_number,
+                'level': level,
+                'decimation': reader.levels[level]['factor'],
+                'total_points': reader.count,
+                'points': points
+            })
+    except Exception as e:
+        return jsonify({'error': f'Erreur lecture échantillon: {str(e)}'}), 500
+
 @app.route('/api/calibration/save', methods=['POST'])
 def save_calibration():
     """Sauvegarder une nouvelle calibration"""
@@ -530,11 +1035,19 @@ def save_calibration():
         return jsonify({'error': 'Décodeur non initialisé'}), 500
 
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         angle_data = data.get('angle', {})
         force_data = data.get('force', {})
 
-        # Mettre à jour la calibration
+        # Points supplémentaires optionnels (calibration multipoints), vérifiés avant toute modification
+        for channel_data in (angle_data, force_data):
+            error = validate_channel(channel_data)
+            if error:
+                return jsonify({'error': error}), 400
+
+        # Mettre à jour la calibration (rétablie si les tables ne peuvent pas être compilées)
+        previous_calibration = json.loads(json.dumps(decoder.calibration))
+        previous_offset = decoder.force_offset
         decoder.calibration['angle'].update({
             'raw_min': angle_data.get('raw_min'),
             'raw_max': angle_data.get('raw_max'),
@@ -551,8 +1064,26 @@ def save_calibration():
             'calibrated': True
         })
 
+        for channel, channel_data in (('angle', angle_data), ('force', force_data)):
+            calibration = decoder.calibration[channel]
+            if 'points' in channel_data:
+                calibration['points'] = channel_data['points']
+                calibration['fit'] = channel_data.get('fit', 'linear')
+                calibration['degree'] = channel_data.get('degree', 2)
+            else:
+                # Calibration à deux points : ne pas garder d'anciens points
+                for key in ('points', 'fit', 'degree'):
+                    calibration.pop(key, None)
+
         # Sauvegarder la calibration
-        decoder.save_calibration()
+        try:
+            decoder.save_calibration()
+        except Exception:
+            decoder.calibration.clear()
+            decoder.calibration.update(previous_calibration)
+            decoder.force_offset = previous_offset
+            decoder.rebuild_calibration_tables()
+            raise
 
         return jsonify({
             'success': True,
@@ -570,14 +1101,27 @@ def read_current_values():
         return jsonify({'error': 'Décodeur non initialisé'}), 500
 
     try:
-        # Lire les valeurs pendant 2 secondes
-        angle_value, force_value = decoder.read_current_values(duration=2)
+        # Lire jusqu'à stabilisation de la moyenne (ou instabilité signalée)
+        data = request.get_json(silent=True) or {}
+        release_acquisition_port()
+        try:
+            result = decoder.capture_stable_values(
+                target_sem=float(data.get('target_sem', 0.1)),
+                max_duration=float(data.get('max_duration', 5.0))
+            )
+        finally:
+            reclaim_acquisition_port()
 
-        if angle_value is not None and force_value is not None:
+        if result is not None:
             return jsonify({
                 'success': True,
-                'angle': round(angle_value, 1),
-                'force': round(force_value, 1)
+                'angle': round(result['angle'], 1),
+                'force': round(result['force'], 1),
+                'angle_sem': round(result['angle_sem'], 3) if result['angle_sem'] is not None else None,
+                'force_sem': round(result['force_sem'], 3) if result['force_sem'] is not None else None,
+                'samples': result['samples'],
+                'duration': result['duration'],
+                'stable': result['stable']
             })
         else:
             return jsonify({'error': 'Impossible de lire les valeurs du capteur'}), 500
@@ -586,8 +1130,10 @@ def read_current_values():
         return jsonify({'error': f'Erreur lecture capteur: {str(e)}'}), 500
 
 @app.route('/api/variety/stats', methods=['POST'])
+@export_seconds.labels('variety_stats').timed
+@pipeline_profiler.timed('export_variety_stats')
 def export_variety_stats():
-    """Exporter les statistiques d'une variété à partir du fichier consolidé"""
+    """Exporter les statistiques d'une variété à partir des agrégats tenus à jour"""
     try:
         data = request.get_json()
         variety = data.get('variety', '').strip()
@@ -595,63 +1141,51 @@ def export_variety_stats():
         if not variety:
             return jsonify({'error': 'Variété non spécifiée'}), 400
 
-        # Chercher le fichier principal de la variété
-        variety_dir = os.path.join('exports', variety)
-        main_file = os.path.join(variety_dir, f"{variety}_mesures.xlsx")
-        
-        if not os.path.exists(main_file):
+        if not os.path.exists(variety_workbook_path(variety)):
             return jsonify({'error': f'Aucune donnée consolidée trouvée pour la variété {variety}'}), 404
 
-        # Lire tous les onglets de métadonnées du fichier
         try:
-            sample_stats = []
-            
-            # Lister tous les onglets du fichier Excel
-            xls = pd.ExcelFile(main_file)
-            
-            for sheet_name in xls.sheet_names:
-                if sheet_name.startswith('Meta_Ech_'):
-                    # Extraire le numéro d'échantillon
-                    sample_num = int(sheet_name.split('_')[-1])
-                    
-                    # Lire les métadonnées
-                    metadata_df = pd.read_excel(main_file, sheet_name=sheet_name)
-                    metadata_dict = dict(zip(metadata_df['Information'], metadata_df['Valeur']))
-
-                    sample_stats.append({
-                        'echantillon': sample_num,
-                        'force_max_kg': metadata_dict.get('Force max (kg)', 0),
-                        'angle_force_max_deg': metadata_dict.get('Angle à force max (°)', 0),
-                        'date_mesure': metadata_dict.get('Date de mesure', ''),
-                        'nb_points': metadata_dict.get('Nombre de points', 0),
-                        'duree_s': metadata_dict.get('Durée (s)', 0)
-                    })
-
-            # Trier par numéro d'échantillon
-            sample_stats.sort(key=lambda x: x['echantillon'])
+            sample_stats = variety_stats.samples(variety)
 
             if len(sample_stats) < 1:
                 return jsonify({'error': f'Aucun échantillon valide trouvé pour {variety}'}), 400
 
+            import pandas as pd  # Chargé à la demande (préchargé en arrière-plan au démarrage)
+
             # Créer le fichier de statistiques
             stats_df = pd.DataFrame(sample_stats)
 
-            # Calculer les statistiques globales
-            forces = [s['force_max_kg'] for s in sample_stats]
-            angles = [s['angle_force_max_deg'] for s in sample_stats]
+            # Statistiques globales (agrégats incrémentaux)
+            summary = variety_stats.summary(variety)
+            force = summary['force_max']
+            angle = summary['angle_force_max']
 
             summary_stats = {
                 'Variété': variety,
-                'Nombre échantillons': len(sample_stats),
-                'Force max moyenne (kg)': round(sum(forces) / len(forces), 3),
-                'Force max médiane (kg)': round(sorted(forces)[len(forces)//2], 3),
-                'Force max min (kg)': round(min(forces), 3),
-                'Force max max (kg)': round(max(forces), 3),
-                'Angle moyen à force max (°)': round(sum(angles) / len(angles), 1),
-                'Écart-type force (kg)': round((sum([(f - sum(forces)/len(forces))**2 for f in forces]) / len(forces))**0.5, 3) if len(forces) > 1 else 0,
-                'Date compilation': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                'Nombre échantillons': summary['count'],
+                'Force max moyenne (kg)': round(force['mean'], 3),
+                'Force max médiane (kg)': round(force['median'], 3),
+                'Force max min (kg)': round(force['min'], 3),
+                'Force max max (kg)': round(force['max'], 3),
+                'Angle moyen à force max (°)': round(angle['mean'], 1),
+                'Angle médian à force max (°)': round(angle['median'], 1),
+                'Écart-type force (kg)': round(force['std'], 3) if summary['count'] > 1 else 0,
+                'Écart-type angle (°)': round(angle['std'], 1) if summary['count'] > 1 else 0,
             }
 
+            # Intervalles de confiance bootstrap des moyennes (au moins deux échantillons)
+            bootstrap = summary['bootstrap']
+            if bootstrap:
+                level = round(bootstrap['confidence'] * 100)
+                summary_stats.update({
+                    f'Force max moyenne IC{level} bas (kg)': round(bootstrap['force_max']['low'], 3),
+                    f'Force max moyenne IC{level} haut (kg)': round(bootstrap['force_max']['high'], 3),
+                    f'Angle moyen à force max IC{level} bas (°)': round(bootstrap['angle_force_max']['low'], 1),
+                    f'Angle moyen à force max IC{level} haut (°)': round(bootstrap['angle_force_max']['high'], 1),
+                    'Rééchantillonnages bootstrap': bootstrap['resamples']
+                })
+            summary_stats['Date compilation'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
             # Créer le fichier Excel de statistiques
             output = io.BytesIO()
             with pd.ExcelWriter(output, engine='openpyxl') as writer:
@@ -678,21 +1212,245 @@ def export_variety_stats():
     except Exception as e:
         return jsonify({'error': f'Erreur export statistiques: {str(e)}'}), 500
 
+@app.route('/api/variety/summary')
+def get_variety_summary():
+    """Résumé statistique d'une variété (agrégats incrémentaux, sans relire le classeur)"""
+    variety = request.args.get('variety', '').strip()
+    if not variety:
+        return jsonify({'error': 'Variété non spécifiée'}), 400
+
+    try:
+        return jsonify(variety_stats.summary(variety))
+    except Exception as e:
+        return jsonify({'error': f'Erreur statistiques: {str(e)}'}), 500
+
+@app.route('/api/variety/envelope')
+def get_variety_envelope():
+    """Enveloppe de référence d'une variété (courbe moyenne et bande de percentiles)"""
+    variety = request.args.get('variety', '').strip()
+    if not variety:
+        return jsonify({'error': 'Variété non spécifiée'}), 400
+    exclude = request.args.get('exclude', type=int)
+
+    try:
+        return jsonify({
+            'variety': variety,
+            'envelope': envelope_registry.envelope(variety, exclude=exclude)
+        })
+    except Exception as e:
+        return jsonify({'error': f'Erreur enveloppe de référence: {str(e)}'}), 500
+
+@app.route('/api/variety/sample/delete', methods=['POST'])
+def delete_variety_sample():
+    """Supprimer un échantillon sauvegardé (onglets, fichier binaire et statistiques)"""
+    data = request.get_json()
+    variety = data.get('variety', '').strip()
+    sample_number = data.get('sample_number')
+
+    if not variety or not isinstance(sample_number, int):
+        return jsonify({'error': 'Variété et numéro d\'échantillon obligatoires'}), 400
+
+    try:
+        removed = delete_sample(variety, sample_number)
+        variety_stats.remove_sample(variety, sample_number)
+        envelope_registry.remove_curve(variety, sample_number)
+        return jsonify({
+            'success': True,
+            'removed': removed,
+            'message': f'Échantillon {sample_number} supprimé pour {variety}'
+        })
+    except Exception as e:
+        return jsonify({'error': f'Erreur suppression échantillon: {str(e)}'}), 500
+
+def run_trial_analysis(cache_mode):
+    """Analyse de toutes les variétés en arrière-plan, avancement poussé par Socket.IO"""
+    global trial_report
+
+    def on_result(result, done, total):
+        trial_progress.update({'done': done, 'total': total})
+        socketio.emit('trial_progress', {
+            'variety': result['variety'],
+            'error': result.get('error'),
+            'done': done,
+            'total': total,
+            'report': trial_report.to_dict()
+        })
+
+    try:
+        trial_report = TrialReport()
+        analyse_exports('exports', cache_mode=cache_mode, on_result=on_result, report=trial_report)
+        socketio.emit('trial_complete', trial_report.to_dict())
+    except Exception as e:
+        trial_progress['error'] = str(e)
+        socketio.emit('error', {'message': f'Erreur analyse d\'essai: {str(e)}'})
+    finally:
+        trial_progress['running'] = False
+
+@app.route('/api/trial/analyse', methods=['POST'])
+def start_trial_analysis():
+    """Lancer l'analyse croisée de toutes les variétés du dossier exports"""
+    data = request.get_json(silent=True) or {}
+    cache_mode = data.get('cache', 'mtime')
+    if cache_mode not in ('mtime', 'hash'):
+        return jsonify({'error': 'Le cache doit être mtime ou hash'}), 400
+
+    if trial_progress['running']:
+        return jsonify({'error': 'Analyse d\'essai déjà en cours'}), 409
+
+    trial_progress.update({'running': True, 'done': 0, 'total': 0, 'error': None})
+    threading.Thread(target=run_trial_analysis, args=(cache_mode,), daemon=True).start()
+    return jsonify({'success': True, 'message': 'Analyse d\'essai démarrée'})
+
+@app.route('/api/trial/report')
+def get_trial_report():
+    """Rapport d'essai courant (partiel tant que l'analyse est en cours)"""
+    return jsonify({
+        'progress': trial_progress,
+        'report': trial_report.to_dict() if trial_report else None
+    })
+
+@app.route('/api/trial/report/excel')
+@export_seconds.labels('trial_report').timed
+@pipeline_profiler.timed('export_trial_report')
+def export_trial_report():
+    """Télécharger le rapport d'essai (classement, comparaisons, détail)"""
+    if trial_report is None or trial_progress['running']:
+        return jsonify({'error': 'Aucun rapport d\'essai terminé'}), 404
+
+    try:
+        output = io.BytesIO()
+        write_trial_report(trial_report, output)
+        output.seek(0)
+        filename = f"rapport_essai_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        return send_file(
+            output,
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            as_attachment=True,
+            download_name=filename
+        )
+    except Exception as e:
+        return jsonify({'error': f'Erreur export rapport d\'essai: {str(e)}'}), 500
+
+@app.route('/api/metrics')
+def get_metrics():
+    """Compteurs et histogrammes de la chaîne d'acquisition (format texte Prometheus)"""
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+@app.route('/api/debug/profile', methods=['GET', 'POST'])
+def debug_profile():
+    """Durées par étape de la chaîne de mesure ; POST {enabled, reset} pour activer le profilage"""
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        if 'enabled' in data:
+            pipeline_profiler.enabled = bool(data['enabled'])
+        if data.get('reset'):
+            pipeline_profiler.reset()
+        print(f"⏱️ Profilage de la chaîne de mesure: {'activé' if pipeline_profiler.enabled else 'désactivé'}")
+    return jsonify(pipeline_profiler.to_dict())
+
+@app.route('/api/debug/profile/capture')
+def capture_profile():
+    """Capture de N secondes : échantillonnage des piles (piles repliées) ou cProfile du thread de mesure"""
+    mode = request.args.get('mode', 'sampling')
+    seconds = request.args.get('seconds', 5.0, type=float)
+    if not 0 < seconds <= MAX_CAPTURE_SECONDS:
+        return jsonify({'error': f'Durée entre 0 et {MAX_CAPTURE_SECONDS:.0f} secondes'}), 400
+
+    if mode == 'sampling':
+        interval = request.args.get('interval', DEFAULT_SAMPLE_INTERVAL, type=float)
+        thread = request.args.get('thread', '').strip()
+        counts = sample_stacks(seconds, max(interval, 0.001), {thread} if thread else None)
+        return Response(collapsed_text(counts), content_type='text/plain; charset=utf-8',
+                        headers={'Content-Disposition': 'attachment; filename=mevem_profile.collapsed'})
+
+    if mode != 'cprofile':
+        return jsonify({'error': f'Mode de capture inconnu: {mode}'}), 400
+    if not measurement_active:
+        return jsonify({'error': 'Aucune mesure en cours à profiler'}), 409
+
+    capture = pipeline_profiler.request_cprofile(seconds)
+    if capture is None:
+        return jsonify({'error': 'Une capture cProfile est déjà en cours'}), 409
+    if not capture['done'].wait(seconds + 2.0) or capture['profile'] is None:
+        pipeline_profiler.cancel_cprofile(capture)
+        return jsonify({'error': 'Capture interrompue (mesure arrêtée ?)'}), 500
+
+    if request.args.get('format') == 'json':
+        return jsonify({'seconds': seconds, 'functions': profile_top(capture['profile'])})
+    return send_file(io.BytesIO(profile_dump(capture['profile'])), mimetype='application/octet-stream',
+                     as_attachment=True, download_name='mevem_measurement.prof')
+
+@app.route('/api/debug/latency')
+def get_latency():
+    """Latence arrivée → décodage → envoi → affichage de la mesure en cours, par client"""
+    return jsonify(latency_tracker.to_dict())
+
+@app.route('/api/acquisition/status')
+def get_acquisition_status():
+    """Mode d'acquisition ; en mode démon, état du port et du tampon partagé"""
+    if not acquisition:
+        return jsonify({'mode': 'thread'})
+    status = acquisition.status()
+    status.update({
+        'mode': 'daemon',
+        'reader_lag': status['head'] - acquisition_reader.next_seq,
+        'reader_lost': acquisition_reader.lost
+    })
+    return jsonify(status)
+
+@app.route('/api/debug/startup')
+def get_startup_profile():
+    """Durées des phases de démarrage (imports, décodeur, port, serveur)"""
+    return jsonify(startup_profiler.to_dict())
+
 @socketio.on('connect')
 def handle_connect():
     """Connexion WebSocket"""
     print('Client connecté')
+    # JSON par défaut, jusqu'à ce que le client demande le transport binaire
+    live_transports.set(request.sid, 'json')
+    join_room(JSON_ROOM)
     emit('connected', {'message': 'Connexion établie'})
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """Déconnexion WebSocket"""
+    live_transports.remove(request.sid)
+    latency_tracker.remove_client(request.sid)
     print('Client déconnecté')
 
-def open_browser():
-    """Ouvrir le navigateur automatiquement"""
-    time.sleep(1.5)  # Laisser le temps au serveur de démarrer
+@socketio.on('set_transport')
+def handle_set_transport(data):
+    """Choix du format des points de mesure par le client (json ou binary)"""
+    fmt = (data or {}).get('format', 'json')
+    if fmt not in TRANSPORT_FORMATS:
+        emit('error', {'message': f'Transport inconnu: {fmt}'})
+        return
+
+    previous = live_transports.set(request.sid, fmt)
+    if previous and previous != fmt:
+        leave_room(JSON_ROOM if previous == 'json' else BINARY_ROOM)
+    join_room(JSON_ROOM if fmt == 'json' else BINARY_ROOM)
+    emit('transport', {
+        'format': fmt,
+        'float_fields': list(FLOAT_FIELDS),
+        'int_fields': list(INT_FIELDS)
+    })
+
+@socketio.on('render_report')
+def handle_render_report(data):
+    """Points dessinés par le client : heures d'envoi (emit_ts) des points affichés"""
+    emit_times = (data or {}).get('emit_ts') or []
+    if isinstance(emit_times, list):
+        latency_tracker.record_render(request.sid, live_transports.get(request.sid) or 'json', emit_times[:500])
+
+def after_server_start():
+    """Serveur à l'écoute : fin du profil de démarrage, navigateur, préchargement des modules lourds"""
+    if wait_for_server('127.0.0.1', 5000):
+        startup_profiler.mark('ouverture du serveur')
+    startup_profiler.finish()
     webbrowser.open('http://127.0.0.1:5000')
+    warm_imports(startup_profiler)
 
 def main():
     """Fonction principale"""
@@ -702,12 +1460,18 @@ def main():
     # Créer le dossier exports s'il n'existe pas
     os.makedirs('exports', exist_ok=True)
 
+    # Démon d'acquisition en processus séparé (avant le démarrage des threads)
+    start_acquisition_daemon()
+
     # Initialiser le décodeur
     if not initialize_decoder():
         print("⚠️ Mode démo activé")
     
-    # Ouvrir le navigateur dans un thread séparé
-    browser_thread = threading.Thread(target=open_browser, daemon=True)
+    # Surveillance des ports série (branchements à chaud)
+    port_monitor.start()
+
+    # Ouvrir le navigateur dès que le serveur écoute (thread séparé)
+    browser_thread = threading.Thread(target=after_server_start, daemon=True)
     browser_thread.start()
     
     # Démarrer l'application
@@ -724,4 +1488,7 @@ def main():
         sys.exit(0)
 
 if __name__ == '__main__':
+    # Pool de processus de l'analyse d'essai dans les exécutables PyInstaller
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Intervalles de confiance bootstrap des métriques d'une variété
+Tous les rééchantillonnages d'une variété sont tirés en une seule matrice
+d'indices numpy (rééchantillons × échantillons) : force max et angle à force
+max sont rééchantillonnés par paires, sans boucle Python. Le générateur est
+initialisé par une graine fixe pour que les intervalles soient reproductibles.
+"""
+
+DEFAULT_RESAMPLES = 5000
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_SEED = 20240917
+BOOTSTRAP_METRICS = ('force_max_kg', 'angle_force_max_deg')
+
+
+def bootstrap_means(columns, resamples=DEFAULT_RESAMPLES, confidence=DEFAULT_CONFIDENCE, seed=DEFAULT_SEED):
+    """Intervalles bootstrap (méthode des percentiles) de la moyenne de chaque colonne
+
+    columns : {nom: valeurs}, toutes de même longueur (une valeur par échantillon).
+    Retourne {nom: {'low', 'high'}}, ou None avec moins de deux échantillons.
+    """
+    import numpy as np
+
+    names = list(columns)
+    data = np.array([columns[name] for name in names], dtype=float)
+    count = data.shape[1] if data.ndim == 2 else 0
+    if count < 2:
+        return None
+
+    rng = np.random.default_rng(seed)
+    draws = rng.integers(0, count, size=(resamples, count))
+    # (métriques, rééchantillons) : moyenne de chaque rééchantillon pour chaque métrique
+    means = data[:, draws].mean(axis=2)
+    alpha = (1.0 - confidence) / 2.0
+    bounds = np.quantile(means, [alpha, 1.0 - alpha], axis=1)
+    return {name: {'low': float(bounds[0, i]), 'high': float(bounds[1, i])} for i, name in enumerate(names)}
+
+
+def variety_bootstrap(samples, resamples=DEFAULT_RESAMPLES, confidence=DEFAULT_CONFIDENCE, seed=DEFAULT_SEED):
+    """Intervalles bootstrap de la force max moyenne et de l'angle moyen à force max
+
+    samples : lignes de détail des échantillons (read_sample_metadata).
+    """
+    intervals = bootstrap_means(
+        {metric: [float(sample[metric]) for sample in samples] for metric in BOOTSTRAP_METRICS},
+        resamples, confidence, seed)
+    if intervals is None:
+        return None
+    return {
+        'confidence': confidence,
+        'resamples': resamples,
+        'seed': seed,
+        'force_max': intervals['force_max_kg'],
+        'angle_force_max': intervals['angle_force_max_deg']
+    }
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Calibration multipoints compilée en table de conversion
+Chaque voie (angle, force) est décrite par N points (brut, réel) ajustés en
+linéaire par morceaux ou en polynôme, puis évaluée une fois pour toutes les
+valeurs brutes 16 bits : la conversion d'une trame devient une indexation.
+"""
+
+RAW_RANGE = 0x10000  # parse_line_raw accepte les valeurs 0..0xFFFF
+CALIBRATION_FITS = ('linear', 'polynomial')
+
+# Conversion par défaut des voies non calibrées (valeur physique par unité brute)
+DEFAULT_SCALES = {
+    'angle': 360.0 / 1023.0,
+    'force': 1.0 / 1023.0
+}
+
+
+def calibration_points(channel):
+    """Points (brut, réel) d'une voie, triés par valeur brute
+
+    Le champ optionnel 'points' ([[brut, réel], ...]) remplace les deux points
+    raw_min/real_min et raw_max/real_max de la calibration historique.
+    """
+    points = channel.get('points')
+    if not points or len(points) < 2:
+        points = [(channel['raw_min'], channel['real_min']), (channel['raw_max'], channel['real_max'])]
+    return sorted((float(raw), float(real)) for raw, real in points)
+
+
+def validate_points(points):
+    """Vérifier une liste de points de calibration, retourne un message d'erreur ou None"""
+    if not isinstance(points, list) or len(points) < 2:
+        return "Au moins deux points de calibration sont nécessaires"
+    for point in points:
+        if (not isinstance(point, (list, tuple)) or len(point) != 2 or
+                not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in point)):
+            return f"Point de calibration invalide: {point}"
+    if len({float(raw) for raw, _ in points}) != len(points):
+        return "Deux points de calibration ont la même valeur brute"
+    return None
+
+
+def validate_channel(channel):
+    """Vérifier les champs multipoints d'une voie (points, fit, degree), retourne un message d'erreur ou None"""
+    if not isinstance(channel, dict):
+        return f"Voie de calibration invalide: {channel}"
+    if 'points' in channel:
+        error = validate_points(channel['points'])
+        if error:
+            return error
+    fit = channel.get('fit', 'linear')
+    if fit not in CALIBRATION_FITS:
+        return f"Ajustement inconnu: {fit}"
+    degree = channel.get('degree', 2)
+    # _polynomial borne le degré et np.polyfit attend un entier
+    if not isinstance(degree, int) or isinstance(degree, bool) or degree < 1:
+        return f"Degré du polynôme invalide: {degree} (entier ≥ 1 attendu)"
+    return None
+
+
+def _polynomial(points, degree):
+    """Coefficients du polynôme (moindres carrés), du degré le plus haut au plus bas"""
+    import numpy as np
+
+    degree = max(1, min(degree, len(points) - 1))
+    raws = np.array([raw for raw, _ in points])
+    reals = np.array([real for _, real in points])
+    return np.polyfit(raws, reals, degree).tolist()
+
+
+def evaluate(channel, raw, default_scale=1.0):
+    """Valeur physique d'une valeur brute quelconque (ex. moyenne non entière)"""
+    if not channel.get('calibrated'):
+        return raw * default_scale
+
+    points = calibration_points(channel)
+    if channel.get('fit') == 'polynomial':
+        value = 0.0
+        for coefficient in _polynomial(points, channel.get('degree', 2)):
+            value = value * raw + coefficient
+        return value
+
+    if points[0][0] == points[-1][0]:
+        return points[0][1]
+    # Segment contenant raw (segments extrêmes prolongés au-delà des points)
+    index = 0
+    while index < len(points) - 2 and raw > points[index + 1][0]:
+        index += 1
+    (raw_a, real_a), (raw_b, real_b) = points[index], points[index + 1]
+    return real_a + (raw - raw_a) / (raw_b - raw_a) * (real_b - real_a)
+
+
+def build_table(channel, default_scale=1.0, raw_offset=0.0):
+    """Table des 65536 valeurs physiques d'une voie (liste indexée par la valeur brute)
+
+    raw_offset est retranché à la valeur brute avant conversion (compensation de zéro).
+    """
+    raws = range(RAW_RANGE)
+    if raw_offset:
+        raws = [raw - raw_offset for raw in raws]
+
+    if not channel.get('calibrated'):
+        return [raw * default_scale for raw in raws]
+
+    points = calibration_points(channel)
+    if channel.get('fit') == 'polynomial':
+        import numpy as np
+
+        return np.polyval(_polynomial(points, channel.get('degree', 2)),
+                          np.asarray(raws, dtype=float)).tolist()
+
+    if points[0][0] == points[-1][0]:
+        return [points[0][1]] * RAW_RANGE
+
+    # Linéaire par morceaux : bornes des segments, les extrêmes s'étendent à toute la plage
+    table = []
+    last = len(points) - 2
+    index = 0
+    for raw in raws:
+        while index < last and raw > points[index + 1][0]:
+            index += 1
+        (raw_a, real_a), (raw_b, real_b) = points[index], points[index + 1]
+        table.append(real_a + (raw - raw_a) / (raw_b - raw_a) * (real_b - real_a))
+    return table
+
+
+def table_array(table):
+    """Table sous forme de tableau numpy (à conserver pour les conversions par blocs)"""
+    import numpy as np
+
+    return np.asarray(table, dtype=float)
+
+
+def convert_array(array, raw_values):
+    """Conversion vectorisée d'un bloc de valeurs brutes (numpy.take sur table_array)"""
+    import numpy as np
+
+    return np.take(array, np.asarray(raw_values, dtype=np.intp))
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Détection automatique du capteur MEVEM
+Tous les ports candidats sont écoutés en parallèle pendant un court instant ;
+seul un port qui émet des trames VeTiMa/iMa/Ta valides est retenu (un
+adaptateur USB-série sans capteur est ignoré). Le numéro de série USB du port
+retenu est mémorisé pour n'écouter que lui au démarrage suivant.
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import serial
+import serial.tools.list_ports
+
+from main import get_config_directory, parse_frames
+
+DEVICE_FILE = 'sensor_device.json'
+# Ports essayés quand l'énumération pyserial ne retourne rien
+FALLBACK_PORTS = ('/dev/ttyUSB0', '/dev/ttyUSB1', '/dev/ttyACM0', 'COM3', 'COM4', 'COM5')
+DEFAULT_LISTEN_TIME = 1.0   # Écoute maximale d'un port (s)
+DEFAULT_MIN_FRAMES = 5      # Trames valides pour reconnaître le capteur
+
+
+def device_file_path():
+    return os.path.join(get_config_directory(), DEVICE_FILE)
+
+
+def load_remembered_device():
+    """Identité du dernier capteur détecté ({'serial_number', 'device', ...}) ou None"""
+    try:
+        with open(device_file_path(), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def remember_device(port_info):
+    """Mémoriser l'identité USB du port du capteur dans le dossier de configuration"""
+    device = {key: port_info.get(key) for key in ('device', 'serial_number', 'vid', 'pid', 'description')}
+    try:
+        os.makedirs(get_config_directory(), exist_ok=True)
+        with open(device_file_path(), 'w') as f:
+            json.dump(device, f, indent=2)
+    except OSError as e:
+        print(f"⚠️ Capteur non mémorisé: {e}")
+
+
+def list_candidates():
+    """Ports candidats avec leur identité USB"""
+    candidates = [{
+        'device': port.device,
+        'description': port.description,
+        'serial_number': port.serial_number,
+        'vid': port.vid,
+        'pid': port.pid
+    } for port in serial.tools.list_ports.comports()]
+    if not candidates:
+        candidates = [{'device': device, 'description': '', 'serial_number': None, 'vid': None, 'pid': None}
+                      for device in FALLBACK_PORTS]
+    return candidates
+
+
+def probe_sensor(device, baudrate=115200, listen_time=DEFAULT_LISTEN_TIME, min_frames=DEFAULT_MIN_FRAMES):
+    """Écouter un port et compter les trames valides (arrêt dès min_frames trames)"""
+    result = {'device': device, 'frames': 0, 'types': {}, 'bytes': 0, 'error': ''}
+    try:
+        conn = serial.Serial(port=device, baudrate=baudrate, timeout=0.05)
+    except Exception as e:
+        result['error'] = str(e)
+        return result
+
+    data = bytearray()
+    start = time.monotonic()
+    try:
+        conn.reset_input_buffer()
+        while time.monotonic() - start < listen_time:
+            chunk = conn.read(max(1, min(conn.in_waiting, 1024)))
+            if not chunk:
+                continue
+            data += chunk
+
+            # Première ligne probablement tronquée : décodage à partir de la suivante
+            first = data.find(b'\n')
+            last = data.rfind(b'\n')
+            if first < 0 or last <= first:
+                continue
+            frames = parse_frames(data, first + 1, last + 1)
+            if len(frames) >= min_frames:
+                break
+    except Exception as e:
+        result['error'] = str(e)
+    finally:
+        conn.close()
+
+    first = data.find(b'\n')
+    last = data.rfind(b'\n')
+    frames = parse_frames(data, first + 1, last + 1) if 0 <= first < last else []
+    types = {}
+    for frame in frames:
+        types[frame['type']] = types.get(frame['type'], 0) + 1
+    result.update({'frames': len(frames), 'types': types, 'bytes': len(data),
+                   'elapsed': round(time.monotonic() - start, 3)})
+    return result
+
+
+def detect_sensor(baudrate=115200, listen_time=DEFAULT_LISTEN_TIME, min_frames=DEFAULT_MIN_FRAMES,
+                  exclude=(), verbose=True):
+    """Trouver le port du capteur ; retourne (identité du port, résultats des écoutes)
+
+    Le port portant le numéro de série mémorisé est écouté seul en premier ; sinon
+    tous les candidats sont écoutés en parallèle et celui qui a reçu le plus de
+    trames valides est retenu. Identité None si aucun port n'émet de trames.
+    """
+    candidates = [c for c in list_candidates() if c['device'] not in exclude]
+    remembered = load_remembered_device()
+
+    def probe_all(ports):
+        if not ports:
+            return []
+        with ThreadPoolExecutor(max_workers=len(ports)) as pool:
+            return list(pool.map(lambda c: probe_sensor(c['device'], baudrate, listen_time, min_frames), ports))
+
+    results = []
+    if remembered and remembered.get('serial_number'):
+        known = [c for c in candidates if c['serial_number'] == remembered['serial_number']]
+        results = probe_all(known)
+        for candidate, result in zip(known, results):
+            if result['frames'] >= min_frames:
+                if verbose:
+                    print(f"✅ Capteur mémorisé trouvé sur {candidate['device']} ({result['frames']} trames)")
+                if candidate['device'] != remembered.get('device'):
+                    remember_device(candidate)
+                return candidate, results
+        candidates = [c for c in candidates if c not in known]
+
+    if verbose:
+        print(f"🔍 Recherche du capteur sur {len(candidates)} port(s)...")
+    results += probe_all(candidates)
+    by_device = {c['device']: c for c in candidates}
+    live = [r for r in results if r['frames'] >= min_frames and r['device'] in by_device]
+    if not live:
+        return None, results
+
+    best = max(live, key=lambda r: r['frames'])
+    candidate = by_device[best['device']]
+    if verbose:
+        print(f"✅ Capteur détecté sur {candidate['device']} ({best['frames']} trames valides)")
+    remember_device(candidate)
+    return candidate, results
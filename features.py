@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Caractéristiques mécaniques calculées au fil de la mesure
+Force max, angle à force max, raideur initiale, angle de rupture, énergie
+(aire sous la courbe force/angle) et chute après le pic, mises à jour à chaque
+point moyenné pour être disponibles dès la fin de l'échantillon.
+"""
+
+
+class MechanicalFeatureTracker:
+    """Suivi incrémental des caractéristiques d'un échantillon (O(1) par point)"""
+
+    def __init__(self, stiffness_window_deg=5.0, rupture_ratio=0.8):
+        # Raideur : régression force/angle sur les premiers stiffness_window_deg degrés
+        self.stiffness_window_deg = stiffness_window_deg
+        # Rupture : première chute de la force sous rupture_ratio × force max après le pic
+        self.rupture_ratio = rupture_ratio
+        self.reset()
+
+    def reset(self):
+        """Réinitialiser pour un nouvel échantillon"""
+        self.count = 0
+        self.first_angle = None
+        self.last_angle = None
+        self.last_force = None
+
+        self.peak_force = None
+        self.peak_angle = None
+        self.post_peak_min = None
+        self.rupture_angle = None
+
+        self.energy = 0.0
+
+        self._stiffness_open = True
+        self._n = 0
+        self._sx = self._sy = self._sxx = self._sxy = 0.0
+
+    def update(self, angle, force):
+        """Prendre en compte un nouveau point (angle en °, force en kg)"""
+        self.count += 1
+        if self.first_angle is None:
+            self.first_angle = angle
+
+        # Pic de force (première occurrence du maximum)
+        if self.peak_force is None or force > self.peak_force:
+            self.peak_force = force
+            self.peak_angle = angle
+            self.post_peak_min = force
+            self.rupture_angle = None
+        else:
+            if force < self.post_peak_min:
+                self.post_peak_min = force
+            if self.rupture_angle is None and force < self.rupture_ratio * self.peak_force:
+                self.rupture_angle = angle
+
+        # Énergie : intégrale de la force selon l'angle (trapèzes)
+        if self.last_angle is not None:
+            self.energy += (force + self.last_force) / 2.0 * (angle - self.last_angle)
+        self.last_angle = angle
+        self.last_force = force
+
+        # Raideur initiale : moindres carrés sur la fenêtre de départ
+        if self._stiffness_open:
+            if abs(angle - self.first_angle) <= self.stiffness_window_deg:
+                self._n += 1
+                self._sx += angle
+                self._sy += force
+                self._sxx += angle * angle
+                self._sxy += angle * force
+            else:
+                self._stiffness_open = False
+
+    def stiffness(self):
+        """Pente force/angle initiale (kg/°), None si pas assez de points"""
+        if self._n < 2:
+            return None
+        denominator = self._n * self._sxx - self._sx * self._sx
+        if denominator <= 0:
+            return None
+        return (self._n * self._sxy - self._sx * self._sy) / denominator
+
+    def post_peak_drop(self):
+        """Chute de force après le pic, en % de la force max"""
+        if not self.peak_force or self.peak_force <= 0:
+            return 0.0
+        return (self.peak_force - self.post_peak_min) / self.peak_force * 100.0
+
+    def to_dict(self):
+        """Caractéristiques courantes (envoyées à l'interface)"""
+        stiffness = self.stiffness()
+        return {
+            'points': self.count,
+            'force_max_kg': round(self.peak_force, 3) if self.peak_force is not None else 0,
+            'angle_force_max_deg': round(self.peak_angle, 2) if self.peak_angle is not None else 0,
+            'raideur_initiale_kg_deg': round(stiffness, 4) if stiffness is not None else None,
+            'angle_rupture_deg': round(self.rupture_angle, 2) if self.rupture_angle is not None else None,
+            'energie_kg_deg': round(self.energy, 3),
+            'chute_post_pic_pct': round(self.post_peak_drop(), 1)
+        }
+
+    @classmethod
+    def from_points(cls, points, **kwargs):
+        """Calculer les caractéristiques d'une liste de points moyennés"""
+        tracker = cls(**kwargs)
+        for point in points:
+            tracker.update(point['angle'], point['force'])
+        return tracker
+
+
+def feature_metadata(features):
+    """Lignes de métadonnées (Information, Valeur) des caractéristiques mécaniques"""
+    return [
+        ('Raideur initiale (kg/°)', features['raideur_initiale_kg_deg']
+            if features['raideur_initiale_kg_deg'] is not None else ''),
+        ('Angle de rupture (°)', features['angle_rupture_deg']
+            if features['angle_rupture_deg'] is not None else ''),
+        ('Énergie (kg·°)', features['energie_kg_deg']),
+        ('Chute après pic (%)', features['chute_post_pic_pct'])
+    ]
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Latence de bout en bout des points en direct
+Trois étapes, mesurées point par point :
+  arrival_parse : arrivée des octets sur le port série → point moyenné produit
+  parse_emit    : point produit → envoi Socket.IO (par transport, JSON ou binaire)
+  emit_render   : envoi → graphique redessiné dans le navigateur (par client)
+
+Chaque point envoyé porte son heure d'envoi (emit_ts) ; le navigateur la renvoie
+dans un rapport 'render_report' juste après l'avoir dessiné, et le serveur en
+déduit emit_render sur sa propre horloge (aucune synchronisation d'horloge ;
+la valeur inclut le trajet retour du rapport, négligeable en local).
+Les distributions sont remises à zéro à chaque mesure (session) et cumulées
+dans l'histogramme de /api/metrics.
+"""
+
+import os
+import threading
+import time
+
+from stage_profiler import StageRing
+
+LATENCY_STAGES = ('arrival_parse', 'parse_emit', 'emit_render')
+BUDGET_ENV = 'MEVEM_LATENCY_BUDGET_MS'
+DEFAULT_BUDGET_MS = 100.0   # Budget arrivée → affichage (p95)
+RING_SIZE = 2048
+MAX_REPORTED_LATENCY = 60.0  # Rapports plus anciens ignorés (onglet en arrière-plan, horloge)
+
+
+def latency_budget_ms():
+    try:
+        return float(os.environ.get(BUDGET_ENV, DEFAULT_BUDGET_MS))
+    except ValueError:
+        return DEFAULT_BUDGET_MS
+
+
+class LatencyTracker:
+    """Distributions de latence de la mesure en cours, par étape, transport et client"""
+
+    def __init__(self, budget_ms=None, ring_size=RING_SIZE, histogram=None):
+        self.budget_ms = latency_budget_ms() if budget_ms is None else budget_ms
+        self.ring_size = ring_size
+        # Histogramme cumulé (pipeline_metrics), étiquettes (étape, transport)
+        self.histogram = histogram
+        self._lock = threading.Lock()
+        self.session_start = None
+        self._stages = {}
+        self._clients = {}
+
+    def start_session(self):
+        """Nouvelle mesure : repartir de distributions vides"""
+        with self._lock:
+            self.session_start = time.time()
+            self._stages = {}
+            for client in self._clients.values():
+                client['ring'] = StageRing(self.ring_size)
+
+    def _series(self, stage, transport):
+        key = (stage, transport)
+        series = self._stages.get(key)
+        if series is None:
+            child = self.histogram.labels(stage, transport) if self.histogram else None
+            with self._lock:
+                series = self._stages.setdefault(key, (StageRing(self.ring_size), child))
+        return series
+
+    def record(self, stage, seconds, transport=''):
+        ring, child = self._series(stage, transport)
+        ring.add(seconds)
+        if child is not None:
+            child.observe(seconds)
+
+    def record_render(self, sid, transport, emit_times, now=None):
+        """Rapport d'affichage d'un client : heures d'envoi des points dessinés"""
+        now = time.time() if now is None else now
+        with self._lock:
+            client = self._clients.get(sid)
+            if client is None:
+                client = self._clients[sid] = {'transport': transport, 'ring': StageRing(self.ring_size),
+                                               'connected_at': now}
+            client['transport'] = transport
+        ring = client['ring']
+        accepted = 0
+        for emit_ts in emit_times:
+            try:
+                seconds = now - float(emit_ts)
+            except (TypeError, ValueError):
+                continue
+            if 0.0 <= seconds <= MAX_REPORTED_LATENCY:
+                ring.add(seconds)
+                self.record('emit_render', seconds, transport)
+                accepted += 1
+        return accepted
+
+    def remove_client(self, sid):
+        with self._lock:
+            self._clients.pop(sid, None)
+
+    def to_dict(self):
+        with self._lock:
+            stages = dict(self._stages)
+            clients = dict(self._clients)
+
+        summaries = {}
+        for (stage, transport), (ring, _) in sorted(stages.items()):
+            summaries[f"{stage}/{transport}" if transport else stage] = ring.summary()
+
+        def p95(stage, transport=''):
+            series = stages.get((stage, transport))
+            return series[0].summary().get('p95_ms') if series else None
+
+        client_rows = []
+        arrival = p95('arrival_parse')
+        for sid, client in clients.items():
+            render = client['ring'].summary()
+            emit = p95('parse_emit', client['transport'])
+            parts = (arrival, emit, render.get('p95_ms'))
+            # Somme des p95 : borne haute du p95 de bout en bout
+            total = round(sum(parts), 3) if None not in parts else None
+            client_rows.append({
+                'sid': sid,
+                'transport': client['transport'],
+                'emit_render': render,
+                'total_p95_ms': total,
+                'within_budget': total <= self.budget_ms if total is not None else None
+            })
+
+        return {
+            'session_start': self.session_start,
+            'budget_ms': self.budget_ms,
+            'stages': summaries,
+            'clients': client_rows
+        }
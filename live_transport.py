@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Transport des points de mesure vers les navigateurs
+Chaque client choisit son format à la connexion : JSON (un objet par point,
+format historique) ou binaire (un lot de points en colonnes Float32/Int32,
+lu côté navigateur par des tableaux typés sans analyse JSON).
+
+Lot binaire (petit-boutiste) :
+  'MV' | version (uint8) | réservé (uint8) | nombre de points n (uint32)
+  arrivée du plus ancien point, envoi du lot (float64, secondes epoch du serveur)
+  timestamp, angle, force : n × float32 chacun
+  raw_angle, raw_force, samples_count : n × int32 chacun
+Toutes les colonnes commencent sur un multiple de 4 octets.
+"""
+
+import struct
+import threading
+
+TRANSPORT_FORMATS = ('json', 'binary')
+BATCH_MAGIC = b'MV'
+BATCH_VERSION = 2
+BATCH_HEADER = struct.Struct('<2sBBIdd')
+FLOAT_FIELDS = ('timestamp', 'angle', 'force')
+INT_FIELDS = ('raw_angle', 'raw_force', 'samples_count')
+
+
+def pack_points(points, arrival_ts=0.0, emit_ts=0.0):
+    """Lot binaire en colonnes d'une liste de points moyennés (horodatage pour la latence)"""
+    count = len(points)
+    floats = struct.Struct(f'<{count}f')
+    ints = struct.Struct(f'<{count}i')
+    parts = [BATCH_HEADER.pack(BATCH_MAGIC, BATCH_VERSION, 0, count, arrival_ts, emit_ts)]
+    parts.extend(floats.pack(*[p[field] for p in points]) for field in FLOAT_FIELDS)
+    parts.extend(ints.pack(*[int(p.get(field, 0)) for p in points]) for field in INT_FIELDS)
+    return b''.join(parts)
+
+
+def unpack_points(payload):
+    """Points d'un lot binaire (contrôle et outils ; le navigateur lit les colonnes directement)"""
+    magic, version, _, count, _, _ = BATCH_HEADER.unpack_from(payload)
+    if magic != BATCH_MAGIC or version != BATCH_VERSION:
+        raise ValueError("Lot binaire inconnu")
+    offset = BATCH_HEADER.size
+    columns = {}
+    for fields, code in ((FLOAT_FIELDS, 'f'), (INT_FIELDS, 'i')):
+        column = struct.Struct(f'<{count}{code}')
+        for field in fields:
+            columns[field] = column.unpack_from(payload, offset)
+            offset += column.size
+    return [{field: columns[field][i] for field in columns} for i in range(count)]
+
+
+class TransportRegistry:
+    """Format choisi par chaque client connecté (sid Socket.IO)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self.counts = {fmt: 0 for fmt in TRANSPORT_FORMATS}
+
+    def set(self, sid, fmt):
+        """Enregistrer le format d'un client ; retourne l'ancien format (ou None)"""
+        with self._lock:
+            previous = self._clients.get(sid)
+            if previous:
+                self.counts[previous] -= 1
+            self._clients[sid] = fmt
+            self.counts[fmt] += 1
+            return previous
+
+    def remove(self, sid):
+        with self._lock:
+            previous = self._clients.pop(sid, None)
+            if previous:
+                self.counts[previous] -= 1
+
+    def get(self, sid):
+        return self._clients.get(sid)
+
+    def has(self, fmt):
+        """Au moins un client dans ce format (évite de sérialiser pour personne)"""
+        return self.counts[fmt] > 0
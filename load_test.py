@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+Banc de charge du serveur web MEVEM
+Un capteur simulé (trames synthétiques ou capture rejouée) écrit dans un
+pseudo-terminal que le serveur ouvre comme port série, à débit croissant
+jusqu'à la limite de l'UART ; N clients Socket.IO sans navigateur reçoivent les
+points en direct. Pour chaque palier (clients × débit) :
+CPU et mémoire du serveur, latence d'envoi vers les clients (fan-out), lignes
+perdues côté série et points non reçus par les clients.
+
+Le serveur doit être lancé à part (python app.py). Les mesures côté serveur sont
+lues sur /api/metrics ; la latence suppose le banc et le serveur sur la même machine.
+Clients : pip install "python-socketio[client]".
+"""
+
+import json
+import math
+import os
+import sys
+import threading
+import time
+import urllib.request
+
+from live_transport import BATCH_HEADER
+
+DEFAULT_SERVER = 'http://127.0.0.1:5000'
+DEFAULT_BAUDRATE = 115200
+TICK = 0.01                 # Écriture du capteur simulé toutes les 10 ms
+DRAIN_TIME = 1.0            # Attente après le dernier octet écrit (points en vol)
+MAX_REPLAY_LINES = 1000000
+
+
+def synthetic_lines(count=4096):
+    """Cycle de trames VeTiMa/Ta (force et angle sinusoïdaux)"""
+    lines = []
+    for i in range(count):
+        phase = 2 * math.pi * i / count
+        force = 0x200 + int(0x180 * math.sin(phase))
+        angle = 0x3FB + int(0x140 * math.sin(phase / 2))
+        kind = 'Ta' if i % 2 else 'VeTiMa'
+        lines.append(f"{kind} 0x{force:X} 0x{angle:X}\r\n".encode('ascii'))
+    return lines
+
+
+def replay_lines(path):
+    """Lignes d'une capture texte ou d'un journal .mevraw, rejouées en boucle au débit demandé"""
+    from raw_reader import MappedRawLog
+
+    lines = []
+    with MappedRawLog(path) as log:
+        for buf, start, end in log.iter_chunks():
+            lines.extend(line + b'\n' for line in bytes(buf[start:end]).split(b'\n') if line.strip())
+            if len(lines) >= MAX_REPLAY_LINES:
+                break
+    if not lines:
+        raise ValueError(f"Aucune ligne dans {path}")
+    return lines[:MAX_REPLAY_LINES]
+
+
+def uart_line_rate(lines, baudrate=DEFAULT_BAUDRATE):
+    """Lignes par seconde à la limite de l'UART (8N1 : 10 bits par octet)"""
+    average = sum(len(line) for line in lines) / len(lines)
+    return baudrate / 10.0 / average
+
+
+class PtySensor:
+    """Pseudo-terminal : le serveur ouvre l'esclave comme un port série (Linux, macOS)"""
+
+    def __init__(self):
+        import pty
+        import tty
+
+        self.master, self._slave = pty.openpty()
+        tty.setraw(self._slave)
+        self.device = os.ttyname(self._slave)
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            written = os.write(self.master, view)
+            view = view[written:]
+
+    def close(self):
+        os.close(self.master)
+        os.close(self._slave)
+
+
+class SerialSensor:
+    """Port série réel relié au port du serveur (paire com0com sous Windows, câble null-modem)"""
+
+    def __init__(self, port, baudrate=DEFAULT_BAUDRATE, device=None):
+        import serial
+
+        self.conn = serial.Serial(port, baudrate=baudrate, write_timeout=1.0)
+        self.device = device or port
+
+    def write(self, data):
+        self.conn.write(data)
+
+    def close(self):
+        self.conn.close()
+
+
+class SensorFeeder:
+    """Écriture des lignes au débit demandé, par tranches de TICK secondes"""
+
+    def __init__(self, sensor, lines):
+        self.sensor = sensor
+        self.lines = lines
+        self.position = 0
+
+    def run(self, rate, duration):
+        """Écrire pendant duration secondes ; retourne (lignes, octets, retard max en s)"""
+        sent = 0
+        sent_bytes = 0
+        max_lag = 0.0
+        start = time.perf_counter()
+        while True:
+            elapsed = time.perf_counter() - start
+            if elapsed >= duration:
+                break
+            due = int(rate * elapsed) + 1
+            if due > sent:
+                chunk = []
+                for _ in range(due - sent):
+                    chunk.append(self.lines[self.position])
+                    self.position = (self.position + 1) % len(self.lines)
+                data = b''.join(chunk)
+                self.sensor.write(data)
+                sent = due
+                sent_bytes += len(data)
+            # Retard sur le calendrier : écriture bloquée (le serveur ne lit plus assez vite)
+            max_lag = max(max_lag, time.perf_counter() - start - elapsed)
+            time.sleep(TICK)
+        return sent, sent_bytes, max_lag
+
+
+class ViewerClient:
+    """Client Socket.IO sans navigateur : compte les points reçus et leur latence depuis l'envoi"""
+
+    def __init__(self, server, transport='json'):
+        import socketio
+
+        self.transport = transport
+        self.client = socketio.Client(reconnection=False)
+        self._lock = threading.Lock()
+        self.reset()
+        self.client.on('connect', self._on_connect)
+        self.client.on('measurement_data', self._on_point)
+        self.client.on('measurement_batch', self._on_batch)
+        self.client.connect(server, transports=['websocket'])
+
+    def _on_connect(self):
+        self.client.emit('set_transport', {'format': self.transport})
+
+    def _on_point(self, data):
+        now = time.time()
+        with self._lock:
+            self.points += 1
+            if data.get('emit_ts'):
+                self.latencies.append(now - data['emit_ts'])
+
+    def _on_batch(self, payload):
+        now = time.time()
+        _, _, _, count, _, emit_ts = BATCH_HEADER.unpack_from(payload)
+        with self._lock:
+            self.points += count
+            self.latencies.append(now - emit_ts)
+
+    def reset(self):
+        with self._lock:
+            self.points = 0
+            self.latencies = []
+
+    def snapshot(self):
+        with self._lock:
+            return self.points, list(self.latencies)
+
+    def close(self):
+        self.client.disconnect()
+
+
+def api(server, path, payload=None):
+    """Appel JSON de l'API du serveur (POST si payload)"""
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    request = urllib.request.Request(server + path, data=data, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+def scrape_metrics(server):
+    """Séries de /api/metrics : {'nom{étiquettes}': valeur}"""
+    with urllib.request.urlopen(server + '/api/metrics', timeout=10) as response:
+        text = response.read().decode('utf-8')
+    series = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            key, _, value = line.rpartition(' ')
+            series[key] = float(value.replace('+Inf', 'inf'))
+    return series
+
+
+def metric_total(series, name):
+    """Somme des séries d'une métrique (toutes étiquettes confondues)"""
+    return sum(value for key, value in series.items() if key == name or key.startswith(name + '{'))
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run_step(server, feeder, clients, rate, duration):
+    """Un palier : mesure en écoute, capteur au débit rate pendant duration secondes"""
+    for client in clients:
+        client.reset()
+    before = scrape_metrics(server)
+    api(server, '/api/measurement/start_listening', {})
+    wall_start = time.perf_counter()
+    lines, sent_bytes, max_lag = feeder.run(rate, duration)
+    time.sleep(DRAIN_TIME)
+    wall = time.perf_counter() - wall_start
+    after = scrape_metrics(server)
+    api(server, '/api/measurement/stop', {})
+
+    def delta(name):
+        return metric_total(after, name) - metric_total(before, name)
+
+    produced = delta('mevem_averaged_points_total')
+    received = []
+    latencies = []
+    for client in clients:
+        count, client_latencies = client.snapshot()
+        received.append(count)
+        latencies.extend(client_latencies)
+    missing = [max(0.0, produced - count) for count in received]
+    emits = delta('mevem_emit_seconds_count')
+
+    def ms(value):
+        return round(value * 1000, 2) if value is not None else None
+
+    return {
+        'clients': len(clients),
+        'rate_lines_s': round(rate, 1),
+        'bytes_s': round(sent_bytes / duration),
+        'lines_sent': lines,
+        'lines_decoded': int(delta('mevem_lines_total')),
+        'lines_lost': int(max(0, lines - delta('mevem_lines_total'))),
+        'parse_failures': int(delta('mevem_parse_failures_total')),
+        'points_produced': int(produced),
+        'points_missing_total': int(sum(missing)),
+        'points_missing_worst_pct': round(100 * max(missing) / produced, 2) if clients and produced else 0.0,
+        'fanout_p50_ms': ms(percentile(latencies, 0.50)),
+        'fanout_p95_ms': ms(percentile(latencies, 0.95)),
+        'fanout_max_ms': ms(max(latencies) if latencies else None),
+        'emit_mean_ms': ms(delta('mevem_emit_seconds_sum') / emits) if emits else None,
+        'cpu_pct': round(100 * delta('process_cpu_seconds_total') / wall, 1),
+        'rss_mb': round(metric_total(after, 'process_resident_memory_bytes') / 1e6, 1),
+        'threads': int(metric_total(after, 'process_threads')),
+        'feeder_lag_ms': ms(max_lag)
+    }
+
+
+COLUMNS = (
+    ('clients', 'Clients'), ('rate_lines_s', 'Lignes/s'), ('cpu_pct', 'CPU %'), ('rss_mb', 'RSS Mo'),
+    ('fanout_p50_ms', 'p50 ms'), ('fanout_p95_ms', 'p95 ms'), ('fanout_max_ms', 'max ms'),
+    ('lines_lost', 'Lignes perdues'), ('points_missing_worst_pct', 'Non reçus %'), ('feeder_lag_ms', 'Retard ms')
+)
+
+
+def print_row(row):
+    print('  '.join(f"{'—' if row[key] is None else row[key]!s:>{max(len(title), 6)}}" for key, title in COLUMNS))
+
+
+def run_load_test(server, client_steps, rates, duration, transport='json', source=None, port=None,
+                  server_port=None, baudrate=DEFAULT_BAUDRATE):
+    """Paliers clients × débits ; retourne la liste des résultats"""
+    lines = replay_lines(source) if source else synthetic_lines()
+    uart_rate = uart_line_rate(lines, baudrate)
+    rates = [uart_rate if rate == 'max' else float(rate) for rate in rates]
+    for rate in rates:
+        if rate > uart_rate * 1.001:
+            print(f"⚠️ {rate:.0f} lignes/s dépasse la limite UART ({uart_rate:.0f} lignes/s à {baudrate} bauds)")
+
+    sensor = SerialSensor(port, baudrate, server_port) if port else PtySensor()
+    previous_port = api(server, '/api/ports/list').get('current_port')
+    detection = api(server, '/api/detection/get')['settings']
+    clients = []
+    results = []
+    try:
+        print(f"🔌 Capteur simulé sur {sensor.device} ({'capture ' + source if source else 'trames synthétiques'})")
+        api(server, '/api/ports/select', {'port': sensor.device})
+        # Flux continu : pas de fin d'échantillon sur retour au repos pendant le palier
+        api(server, '/api/detection/set', {'enabled': False})
+        info = scrape_metrics(server)
+        modes = [key.split('"')[1] for key in info if key.startswith('mevem_server_info{')]
+        print(f"🖥️ Serveur {server} (mode {modes[0] if modes else 'inconnu'}), UART {uart_rate:.0f} lignes/s max")
+        print('  '.join(f"{title:>{max(len(title), 6)}}" for _, title in COLUMNS))
+
+        feeder = SensorFeeder(sensor, lines)
+        for count in client_steps:
+            while len(clients) < count:
+                fmt = ('json', 'binary')[len(clients) % 2] if transport == 'mixed' else transport
+                clients.append(ViewerClient(server, fmt))
+            time.sleep(0.5)  # Choix du transport pris en compte
+            for rate in rates:
+                row = run_step(server, feeder, clients[:count], rate, duration)
+                row['transport'] = transport
+                results.append(row)
+                print_row(row)
+    finally:
+        for client in clients:
+            try:
+                client.close()
+            except Exception:
+                pass
+        try:
+            api(server, '/api/measurement/stop', {})
+            api(server, '/api/detection/set', detection)
+            if previous_port and previous_port != '/dev/null':
+                api(server, '/api/ports/select', {'port': previous_port})
+        except Exception as e:
+            print(f"⚠️ Paramètres du serveur non restaurés: {e}")
+        sensor.close()
+    return results
+
+
+def check_stdout_pipeline(duration=3, rate=200, fmt='csv'):
+    """Mode pipeline de main.py : les données sur le descripteur 1, les messages sur stderr
+
+    main.py --stdout lit le capteur simulé ; retourne (réussite, résumé).
+    """
+    import subprocess
+
+    from stream_sink import CSV_HEADER
+
+    sensor = PtySensor()
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+    process = subprocess.Popen([sys.executable, script, '--port', sensor.device, '--stdout',
+                                '--format', fmt, '--duration', str(duration)],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    feeder = threading.Thread(target=SensorFeeder(sensor, synthetic_lines()).run,
+                              args=(rate, duration + 2.0), daemon=True)
+    feeder.start()
+    try:
+        out, err = process.communicate(timeout=duration + 30)
+    finally:
+        sensor.close()
+
+    rows = out.count(b'\n')
+    if fmt == 'csv':
+        header = CSV_HEADER.encode('ascii')
+        rows -= out.startswith(header)
+        leaked = header in err
+    else:
+        leaked = b'"raw_force"' in err
+    summary = {'returncode': process.returncode, 'stdout_bytes': len(out), 'stdout_rows': rows,
+               'stderr_bytes': len(err), 'data_on_stderr': leaked}
+    return process.returncode == 0 and rows > 0 and not leaked, summary
+
+
+def main():
+    """Fonction principale"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Banc de charge : N clients Socket.IO, débit capteur croissant')
+    parser.add_argument('--server', default=DEFAULT_SERVER, help='Adresse du serveur MEVEM déjà lancé')
+    parser.add_argument('--clients', default='1,5,10,20', help='Paliers de clients (ex. 1,5,10,20)')
+    parser.add_argument('--rates', default='100,300,max',
+                        help='Débits du capteur en lignes/s ; max = limite de l\'UART')
+    parser.add_argument('--duration', type=float, default=10.0, help='Durée de chaque palier (s)')
+    parser.add_argument('--transport', choices=('json', 'binary', 'mixed'), default='json',
+                        help='Format des points demandé par les clients')
+    parser.add_argument('--source', help='Capture texte ou .mevraw à rejouer (synthétique si absent)')
+    parser.add_argument('--port', help='Port série d\'écriture (sinon pseudo-terminal, Linux/macOS)')
+    parser.add_argument('--server-port', help='Port série ouvert par le serveur (avec --port)')
+    parser.add_argument('--baudrate', type=int, default=DEFAULT_BAUDRATE)
+    parser.add_argument('--output', help='Résultats détaillés en JSON')
+    parser.add_argument('--check-stdout', action='store_true',
+                        help='Vérifier seulement que main.py --stdout écrit les données sur la sortie standard')
+
+    args = parser.parse_args()
+    if args.check_stdout:
+        ok, summary = check_stdout_pipeline()
+        print(f"{'✅' if ok else '❌'} main.py --stdout : {json.dumps(summary)}")
+        sys.exit(0 if ok else 1)
+    if not args.port and sys.platform.startswith('win'):
+        parser.error("pas de pseudo-terminal sous Windows : utilisez --port et --server-port (paire com0com)")
+    try:
+        import socketio  # noqa: F401
+    except ImportError:
+        parser.error('client Socket.IO manquant : pip install "python-socketio[client]"')
+
+    rates = [rate if rate == 'max' else float(rate) for rate in args.rates.split(',')]
+    client_steps = [int(count) for count in args.clients.split(',')]
+    results = run_load_test(args.server, client_steps, rates, args.duration, args.transport, args.source,
+                            args.port, args.server_port, args.baudrate)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Résultats écrits dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
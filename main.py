@@ -4,7 +4,6 @@ Décodeur de capteur avec calibration
 Analyse les données angle/force avec système de calibration interactif
 """
 
-import serial
 import re
 import time
 import json
@@ -14,10 +13,98 @@ from collections import deque
 import threading
 import queue
 import os
+import sys
+import copy
+import math
+
+from calibration_lut import (DEFAULT_SCALES, build_table, calibration_points, convert_array, evaluate,
+                             table_array)
+from features import MechanicalFeatureTracker
+from outlier_filter import OutlierFilter, outlier_metadata
+from raw_recorder import RAW_EXTENSION, iter_raw_chunks
+from sample_detector import IDLE, SampleDetector
+from stream_sink import SINK_EXTENSIONS, SINK_FORMATS, StreamingSink, parse_size
+from variety_stats import RunningStats
+from zero_tracking import ForceZeroTracker
+
+# Trames émises par le capteur : <type> <force hex> <angle hex>
+FRAME_TYPES = ('VeTiMa', 'iMa', 'Ta')
+FRAME_PATTERNS = {
+    name: re.compile(name + r'\s*(0x[0-9A-Fa-f]{1,4})\s*(0x[0-9A-Fa-f]{1,4})')
+    for name in FRAME_TYPES
+}
+# Variante octets pour les tampons (mmap, bytes) : les blancs ne traversent pas
+# les fins de ligne, ce qui reproduit le découpage ligne par ligne du direct
+_WS_BYTES = rb'[\t\x0b\x0c\r \x1c-\x1f]*'
+_HEX_BYTES = rb'(0x[0-9A-Fa-f]{1,4})'
+FRAME_PATTERNS_BYTES = {
+    name: re.compile(name.encode('ascii') + _WS_BYTES + _HEX_BYTES + _WS_BYTES + _HEX_BYTES)
+    for name in FRAME_TYPES
+}
+# Passe unique : une trame VeTiMa contient toujours une trame iMa de mêmes valeurs
+# (le direct les compte toutes les deux), d'où le préfixe optionnel "VeT". La fin
+# de ligne est capturée pour repérer les lignes portant plusieurs trames.
+_FRAME_BYTES_SINGLE_PASS = re.compile(rb'(VeT(?=iMa))?(iMa|Ta)' + _WS_BYTES + _HEX_BYTES + _WS_BYTES + _HEX_BYTES
+                                      + rb'([^\n]*)')
+_FRAME_TOKEN = re.compile(rb'iMa|Ta')
+
+
+def parse_frames(buf, start=0, end=None):
+    """Décoder les trames d'un tampon d'octets sans le copier
+
+    buf peut être un mmap, bytes ou bytearray ; [start, end) doit être aligné
+    sur des débuts de ligne. Le résultat est identique à parse_line_raw appliqué
+    ligne par ligne : par ligne, puis par type de trame dans l'ordre de FRAME_TYPES.
+    """
+    if end is None:
+        end = len(buf)
+
+    frames = []
+    append = frames.append
+    for vetima, kind, force, angle, rest in _FRAME_BYTES_SINGLE_PASS.findall(buf, start, end):
+        if len(rest) > 7 and _FRAME_TOKEN.search(rest):
+            # Plusieurs trames sur une ligne : ordre ligne/type du direct
+            return _parse_frames_exact(buf, start, end)
+        raw_force = int(force, 16)
+        raw_angle = int(angle, 16)
+        if vetima:
+            append({'type': 'VeTiMa', 'raw_angle': raw_angle, 'raw_force': raw_force})
+        append({'type': 'iMa' if kind == b'iMa' else 'Ta', 'raw_angle': raw_angle, 'raw_force': raw_force})
+    return frames
+
+
+def _parse_frames_exact(buf, start, end):
+    """Passe exacte : un finditer par type puis tri par (ligne, type, position)"""
+    frames = []
+    for order, (name, pattern) in enumerate(FRAME_PATTERNS_BYTES.items()):
+        for match in pattern.finditer(buf, start, end):
+            val1 = int(match.group(1), 16)
+            val2 = int(match.group(2), 16)
+            if val1 <= 0xFFFF and val2 <= 0xFFFF:
+                pos = match.start()
+                frames.append((buf.rfind(b'\n', start, pos), order, pos, name, val2, val1))
+
+    frames.sort()
+    return [{'type': name, 'raw_angle': raw_angle, 'raw_force': raw_force}
+            for _, _, _, name, raw_angle, raw_force in frames]
+
+
+def get_config_directory():
+    """Répertoire de configuration de l'application (calibration, capteur mémorisé)"""
+    import platform
+    system = platform.system()
+
+    if system == "Windows":
+        # Windows: utiliser APPDATA
+        base_dir = os.environ.get('APPDATA', os.path.expanduser('~'))
+        return os.path.join(base_dir, 'MEVEM')
+    else:
+        # Linux/macOS: utiliser le dossier home
+        return os.path.join(os.path.expanduser('~'), '.mevem')
 
 
 class CalibratedSensorDecoder:
-    def __init__(self, port='/dev/ttyUSB0', baudrate=115200):
+    def __init__(self, port='/dev/ttyUSB0', baudrate=115200, calibration=None):
         self.port = port
         self.baudrate = baudrate
         self.serial_conn = None
@@ -45,8 +132,23 @@ class CalibratedSensorDecoder:
             }
         }
 
-        # Charger calibration existante
-        self.load_calibration()
+        # Tables de conversion (reconstruites à chaque chargement/sauvegarde)
+        self._angle_table = None
+        self._force_table = None
+        self._calibration_arrays = None
+        # Décalage brut du zéro de force (suivi automatique entre les échantillons)
+        self.force_offset = 0.0
+        # Table de force préparée en arrière-plan pour le prochain décalage : (décalage, table)
+        self._prepared_force = None
+        self._preparing_force = False
+        self._calibration_generation = 0
+
+        # Charger calibration existante (ou celle fournie, ex. retraitement d'un journal brut)
+        if calibration:
+            self.calibration.update(copy.deepcopy(calibration))
+        else:
+            self.load_calibration()
+        self.rebuild_calibration_tables()
 
         # Stockage des données
         self.data_buffer = deque(maxlen=1000)
@@ -55,28 +157,17 @@ class CalibratedSensorDecoder:
             'valid_packets': 0,
             'angles_count': 0,
             'forces_count': 0,
+            'parse_failures': 0,  # Lignes non vides sans trame valide
+            'frames_by_type': {name: 0 for name in FRAME_TYPES},
             'start_time': None
         }
 
         # Patterns regex
-        self.patterns = {
-            'VeTiMa': re.compile(r'VeTiMa\s*(0x[0-9A-Fa-f]{1,4})\s*(0x[0-9A-Fa-f]{1,4})'),
-            'iMa': re.compile(r'iMa\s*(0x[0-9A-Fa-f]{1,4})\s*(0x[0-9A-Fa-f]{1,4})'),
-            'Ta': re.compile(r'Ta\s*(0x[0-9A-Fa-f]{1,4})\s*(0x[0-9A-Fa-f]{1,4})')
-        }
+        self.patterns = FRAME_PATTERNS
 
     def _get_config_directory(self):
         """Obtenir le répertoire de configuration de l'application"""
-        import platform
-        system = platform.system()
-
-        if system == "Windows":
-            # Windows: utiliser APPDATA
-            base_dir = os.environ.get('APPDATA', os.path.expanduser('~'))
-            return os.path.join(base_dir, 'MEVEM')
-        else:
-            # Linux/macOS: utiliser le dossier home
-            return os.path.join(os.path.expanduser('~'), '.mevem')
+        return get_config_directory()
 
     def load_calibration(self):
         """Charger la calibration depuis un fichier"""
@@ -85,6 +176,7 @@ class CalibratedSensorDecoder:
                 with open(self.calibration_file, 'r') as f:
                     saved_cal = json.load(f)
                     self.calibration.update(saved_cal)
+                self.rebuild_calibration_tables()
                 print(f"✅ Calibration chargée depuis {self.calibration_file}")
             except Exception as e:
                 print(f"⚠️ Erreur chargement calibration: {e}")
@@ -97,6 +189,9 @@ class CalibratedSensorDecoder:
 
     def save_calibration(self):
         """Sauvegarder la calibration"""
+        # Une nouvelle calibration redéfinit le zéro : plus de correction de dérive
+        self.force_offset = 0.0
+        self.rebuild_calibration_tables()
         try:
             with open(self.calibration_file, 'w') as f:
                 json.dump(self.calibration, f, indent=2)
@@ -113,21 +208,27 @@ class CalibratedSensorDecoder:
         angle_cal = self.calibration['angle']
         print(f"📐 ANGLE: {'✅ Calibré' if angle_cal['calibrated'] else '❌ Non calibré'}")
         if angle_cal['calibrated']:
-            print(f"   {angle_cal['raw_min']} (brut) = {angle_cal['real_min']}°")
-            print(f"   {angle_cal['raw_max']} (brut) = {angle_cal['real_max']}°")
+            for raw, real in calibration_points(angle_cal):
+                print(f"   {raw} (brut) = {real}°")
+            if angle_cal.get('fit') == 'polynomial':
+                print(f"   Ajustement polynomial (degré {angle_cal.get('degree', 2)})")
 
         # Force
         force_cal = self.calibration['force']
         print(f"⚖️  FORCE: {'✅ Calibré' if force_cal['calibrated'] else '❌ Non calibré'}")
         if force_cal['calibrated']:
-            print(f"   {force_cal['raw_min']} (brut) = {force_cal['real_min']}kg")
-            print(f"   {force_cal['raw_max']} (brut) = {force_cal['real_max']}kg")
+            for raw, real in calibration_points(force_cal):
+                print(f"   {raw} (brut) = {real}kg")
+            if force_cal.get('fit') == 'polynomial':
+                print(f"   Ajustement polynomial (degré {force_cal.get('degree', 2)})")
 
         print()
 
     def connect(self):
         """Connexion au port série"""
         try:
+            import serial  # pyserial n'est pas nécessaire au retraitement hors ligne
+
             self.serial_conn = serial.Serial(
                 port=self.port,
                 baudrate=self.baudrate,
@@ -156,20 +257,40 @@ class CalibratedSensorDecoder:
             self.serial_conn.close()
             print("🔌 Déconnecté")
 
-    def read_current_values(self, duration=2):
-        """Lire les valeurs actuelles pendant une durée donnée"""
+    def capture_stable_values(self, target_sem=0.1, min_samples=20, min_duration=0.3, max_duration=5.0,
+                              verbose=True):
+        """Lire les valeurs brutes jusqu'à convergence de la moyenne
+
+        La lecture s'arrête dès que l'erreur standard de la moyenne (écart-type / √n)
+        des deux voies passe sous target_sem (unités brutes), ou au bout de
+        max_duration secondes : le point est alors signalé instable.
+        Retourne None si aucune trame n'a été reçue.
+        """
         if not self.serial_conn or not self.serial_conn.is_open:
             if not self.connect():
-                return None, None
+                return None
 
         buffer = ""
-        angle_values = []
-        force_values = []
+        angle_stats = RunningStats()
+        force_stats = RunningStats()
+
+        def sem(stats):
+            return stats.std(ddof=1) / math.sqrt(stats.count) if stats.count > 1 else float('inf')
 
-        print(f"📡 Lecture des valeurs pendant {duration}s...")
+        if verbose:
+            print(f"📡 Lecture jusqu'à stabilisation (erreur standard < {target_sem}, max {max_duration}s)...")
         start_time = time.time()
+        stable = False
+
+        while True:
+            elapsed = time.time() - start_time
+            if (angle_stats.count >= min_samples and elapsed >= min_duration and
+                    sem(angle_stats) <= target_sem and sem(force_stats) <= target_sem):
+                stable = True
+                break
+            if elapsed >= max_duration:
+                break
 
-        while time.time() - start_time < duration:
             try:
                 if self.serial_conn.in_waiting > 0:
                     bytes_to_read = min(self.serial_conn.in_waiting, 1024)
@@ -184,9 +305,9 @@ class CalibratedSensorDecoder:
 
                             if parsed:
                                 for data in parsed:
-                                    angle_values.append(data['raw_angle'])
-                                    force_values.append(data['raw_force'])
-                                    print(f"  📊 Angle: {data['raw_angle']} Force: {data['raw_force']}")
+                                    angle_stats.add(data['raw_angle'])
+                                    force_stats.add(data['raw_force'])
+                        continue
 
                 time.sleep(0.01)
 
@@ -194,14 +315,33 @@ class CalibratedSensorDecoder:
                 print(f"⚠️ Erreur lecture: {e}")
                 time.sleep(0.1)
 
-        if angle_values and force_values:
-            # Moyenner les valeurs
-            avg_angle = sum(angle_values) / len(angle_values)
-            avg_force = sum(force_values) / len(force_values)
-            print(f"📊 Moyennes: Angle={avg_angle:.1f} Force={avg_force:.1f}")
-            return avg_angle, avg_force
+        if not angle_stats.count:
+            return None
 
-        return None, None
+        result = {
+            'angle': angle_stats.mean,
+            'force': force_stats.mean,
+            'angle_sem': sem(angle_stats) if angle_stats.count > 1 else None,
+            'force_sem': sem(force_stats) if force_stats.count > 1 else None,
+            'samples': angle_stats.count,
+            'duration': round(time.time() - start_time, 2),
+            'stable': stable
+        }
+        if verbose:
+            status = "✅ stable" if stable else "⚠️ instable (pas de convergence)"
+            print(f"📊 Moyennes: Angle={result['angle']:.1f} Force={result['force']:.1f} "
+                  f"({result['samples']} valeurs en {result['duration']}s, {status})")
+        return result
+
+    def _capture_calibration_point(self, label):
+        """Point de calibration pour la procédure interactive, None si la lecture échoue"""
+        result = self.capture_stable_values()
+        if result is None:
+            print(f"❌ Impossible de lire les valeurs {label}")
+            return None
+        if not result['stable']:
+            print(f"⚠️ Signal instable {label} : vérifiez que le dispositif est immobile")
+        return result
 
     def parse_line_raw(self, line):
         """Parse une ligne et retourne les valeurs brutes"""
@@ -209,6 +349,10 @@ class CalibratedSensorDecoder:
         if not line:
             return None
 
+        stats = self.stats
+        if stats['start_time'] is None:
+            stats['start_time'] = time.time()
+        stats['total_lines'] += 1
         results = []
 
         for pattern_name, pattern in self.patterns.items():
@@ -228,7 +372,17 @@ class CalibratedSensorDecoder:
                 except ValueError:
                     continue
 
-        return results if results else None
+        if not results:
+            stats['parse_failures'] += 1
+            return None
+
+        stats['valid_packets'] += 1
+        stats['angles_count'] += len(results)
+        stats['forces_count'] += len(results)
+        frames_by_type = stats['frames_by_type']
+        for data in results:
+            frames_by_type[data['type']] = frames_by_type.get(data['type'], 0) + 1
+        return results
 
     def calibrate_sensor(self):
         """Procédure de calibration interactive"""
@@ -244,44 +398,46 @@ class CalibratedSensorDecoder:
         print("1. Placez le dispositif à 0° (position de référence)")
         input("   Appuyez sur Entrée quand c'est prêt...")
 
-        angle_0, force_0 = self.read_current_values(3)
-        if angle_0 is None:
-            print("❌ Impossible de lire les valeurs à 0°")
+        point = self._capture_calibration_point("à 0°")
+        if point is None:
             return
+        angle_0 = point['angle']
 
-        print(f"✅ Valeur angle à 0°: {angle_0:.1f}")
+        print(f"✅ Valeur angle à 0°: {angle_0:.1f} ± {2 * (point['angle_sem'] or 0):.2f}")
 
         print("\n2. Placez le dispositif à 45°")
         input("   Appuyez sur Entrée quand c'est prêt...")
 
-        angle_45, force_45 = self.read_current_values(3)
-        if angle_45 is None:
-            print("❌ Impossible de lire les valeurs à 45°")
+        point = self._capture_calibration_point("à 45°")
+        if point is None:
             return
+        angle_45 = point['angle']
 
-        print(f"✅ Valeur angle à 45°: {angle_45:.1f}")
+        print(f"✅ Valeur angle à 45°: {angle_45:.1f} ± {2 * (point['angle_sem'] or 0):.2f}")
+        angle_points = [[angle_0, 0.0], [angle_45, 45.0]] + self._capture_extra_points('angle', '°')
 
         # Calibration de la force
         print("\n⚖️  CALIBRATION DU POIDS")
         print("1. Enlevez tout poids (capteur à vide)")
         input("   Appuyez sur Entrée quand c'est prêt...")
 
-        angle_vide, force_vide = self.read_current_values(3)
-        if force_vide is None:
-            print("❌ Impossible de lire les valeurs à vide")
+        point = self._capture_calibration_point("à vide")
+        if point is None:
             return
+        force_vide = point['force']
 
-        print(f"✅ Valeur poids à vide: {force_vide:.1f}")
+        print(f"✅ Valeur poids à vide: {force_vide:.1f} ± {2 * (point['force_sem'] or 0):.2f}")
 
         print("\n2. Placez exactement 1kg sur le capteur")
         input("   Appuyez sur Entrée quand c'est prêt...")
 
-        angle_1kg, force_1kg = self.read_current_values(3)
-        if force_1kg is None:
-            print("❌ Impossible de lire les valeurs à 1kg")
+        point = self._capture_calibration_point("à 1kg")
+        if point is None:
             return
+        force_1kg = point['force']
 
-        print(f"✅ Valeur poids à 1kg: {force_1kg:.1f}")
+        print(f"✅ Valeur poids à 1kg: {force_1kg:.1f} ± {2 * (point['force_sem'] or 0):.2f}")
+        force_points = [[force_vide, 0.0], [force_1kg, 1.0]] + self._capture_extra_points('force', 'kg')
 
         # Sauvegarder la calibration (noter l'inversion corrigée)
         self.calibration['angle'] = {
@@ -291,6 +447,9 @@ class CalibratedSensorDecoder:
             'real_max': 45.0,
             'calibrated': True
         }
+        if len(angle_points) > 2:
+            self.calibration['angle']['points'] = angle_points
+            self.calibration['angle']['fit'] = 'linear'
 
         self.calibration['force'] = {
             'raw_min': force_vide,
@@ -299,6 +458,9 @@ class CalibratedSensorDecoder:
             'real_max': 1.0,
             'calibrated': True
         }
+        if len(force_points) > 2:
+            self.calibration['force']['points'] = force_points
+            self.calibration['force']['fit'] = 'linear'
 
         self.save_calibration()
 
@@ -306,40 +468,101 @@ class CalibratedSensorDecoder:
         print("📝 Note: Premier capteur = Poids, Deuxième capteur = Angle")
         self.print_calibration_status()
 
-    def convert_raw_to_physical(self, raw_angle, raw_force):
-        """Convertir les valeurs brutes en valeurs physiques"""
-        # Conversion angle
-        if self.calibration['angle']['calibrated']:
-            angle_cal = self.calibration['angle']
-            if angle_cal['raw_max'] != angle_cal['raw_min']:
-                angle_ratio = (raw_angle - angle_cal['raw_min']) / (angle_cal['raw_max'] - angle_cal['raw_min'])
-                angle_deg = angle_cal['real_min'] + angle_ratio * (angle_cal['real_max'] - angle_cal['real_min'])
-            else:
-                angle_deg = angle_cal['real_min']
-        else:
-            # Conversion par défaut
-            angle_deg = raw_angle * 360.0 / 1023.0
-
-        # Conversion force
-        if self.calibration['force']['calibrated']:
-            force_cal = self.calibration['force']
-            if force_cal['raw_max'] != force_cal['raw_min']:
-                force_ratio = (raw_force - force_cal['raw_min']) / (force_cal['raw_max'] - force_cal['raw_min'])
-                force_kg = force_cal['real_min'] + force_ratio * (force_cal['real_max'] - force_cal['real_min'])
-            else:
-                force_kg = force_cal['real_min']
+    def _capture_extra_points(self, channel, unit):
+        """Points de calibration supplémentaires (non-linéarité), saisis jusqu'à une ligne vide"""
+        points = []
+        while True:
+            value = input(f"   Point supplémentaire ({unit}, Entrée pour terminer): ").strip()
+            if not value:
+                return points
+            try:
+                real = float(value.replace(',', '.'))
+            except ValueError:
+                print("❌ Valeur invalide")
+                continue
+
+            input(f"   Placez le dispositif à {real}{unit} puis appuyez sur Entrée...")
+            point = self._capture_calibration_point(f"à {real}{unit}")
+            if point is None:
+                continue
+            raw = point[channel]
+            print(f"✅ Valeur brute à {real}{unit}: {raw:.1f} ± {2 * (point[channel + '_sem'] or 0):.2f}")
+            points.append([raw, real])
+
+    def rebuild_calibration_tables(self):
+        """Compiler la calibration en tables de 65536 valeurs (une par valeur brute 16 bits)"""
+        self._angle_table = build_table(self.calibration['angle'], DEFAULT_SCALES['angle'])
+        self._force_table = build_table(self.calibration['force'], DEFAULT_SCALES['force'], self.force_offset)
+        self._calibration_arrays = None
+        self._calibration_generation += 1
+        self._prepared_force = None
+
+    def prepare_force_offset(self, offset):
+        """Compiler en arrière-plan la table de force d'un décalage à venir
+
+        Appelé au repos : set_force_offset(offset) n'a plus qu'à échanger la table
+        au début de l'échantillon, sans compiler 65536 valeurs dans le thread de mesure.
+        """
+        prepared = self._prepared_force
+        if offset == self.force_offset or (prepared and prepared[0] == offset) or self._preparing_force:
+            return
+        self._preparing_force = True
+        channel = copy.deepcopy(self.calibration['force'])
+        generation = self._calibration_generation
+
+        def build():
+            try:
+                table = build_table(channel, DEFAULT_SCALES['force'], offset)
+                # Calibration changée pendant la compilation : table périmée
+                if generation == self._calibration_generation:
+                    self._prepared_force = (offset, table)
+            finally:
+                self._preparing_force = False
+
+        threading.Thread(target=build, name='force-table', daemon=True).start()
+
+    def set_force_offset(self, offset):
+        """Appliquer un décalage du zéro de force (unités brutes) dans la table de conversion
+
+        La table préparée par prepare_force_offset est reprise telle quelle ; sinon
+        elle est compilée ici (retraitement, changement de calibration, tare manuelle).
+        """
+        if offset == self.force_offset:
+            return
+        prepared = self._prepared_force
+        if prepared and prepared[0] == offset:
+            table = prepared[1]
         else:
-            # Conversion par défaut
-            force_kg = raw_force * 1.0 / 1023.0
+            table = build_table(self.calibration['force'], DEFAULT_SCALES['force'], offset)
+        self.force_offset = offset
+        self._force_table = table
+        self._calibration_arrays = None
 
-        return angle_deg, force_kg
+    def convert_raw_to_physical(self, raw_angle, raw_force):
+        """Convertir les valeurs brutes en valeurs physiques"""
+        try:
+            return self._angle_table[raw_angle], self._force_table[raw_force]
+        except (IndexError, TypeError):
+            # Valeur hors table ou non entière (ex. moyenne lue pendant la calibration)
+            return (evaluate(self.calibration['angle'], raw_angle, DEFAULT_SCALES['angle']),
+                    evaluate(self.calibration['force'], raw_force - self.force_offset, DEFAULT_SCALES['force']))
+
+    def convert_raw_arrays(self, raw_angles, raw_forces):
+        """Conversion vectorisée d'un bloc de valeurs brutes (tableaux numpy)"""
+        if self._calibration_arrays is None:
+            self._calibration_arrays = (table_array(self._angle_table), table_array(self._force_table))
+        angle_array, force_array = self._calibration_arrays
+        return convert_array(angle_array, raw_angles), convert_array(force_array, raw_forces)
 
     def parse_line(self, line):
         """Parse une ligne et retourne les valeurs converties"""
         raw_data = self.parse_line_raw(line)
         if not raw_data:
             return None
+        return self.convert_frames(raw_data)
 
+    def convert_frames(self, raw_data):
+        """Appliquer la calibration aux trames brutes d'une ligne (parse_line_raw)"""
         results = []
         for data in raw_data:
             angle_deg, force_kg = self.convert_raw_to_physical(data['raw_angle'], data['raw_force'])
@@ -355,9 +578,15 @@ class CalibratedSensorDecoder:
 
         return results
 
-    def monitor_sensors(self, duration=None):
-        """Surveiller les capteurs en temps réel"""
+    def monitor_sensors(self, duration=None, sink=None, verbose=True):
+        """Surveiller les capteurs en temps réel
+
+        Avec un sink (StreamingSink), les points sont écrits au fil de l'eau au
+        lieu d'être accumulés en mémoire ; la liste retournée est alors vide.
+        """
         if not self.connect():
+            if sink:
+                sink.close()
             return []
 
         print(f"📡 Surveillance des capteurs...")
@@ -392,11 +621,19 @@ class CalibratedSensorDecoder:
                                 parsed = self.parse_line(line)
 
                                 if parsed:
-                                    all_data.extend(parsed)
+                                    if sink:
+                                        for data in parsed:
+                                            sink.write(data)
+                                    else:
+                                        all_data.extend(parsed)
+
+                                    if verbose:
+                                        for data in parsed:
+                                            print(
+                                                f"🎯 {data['type']}: 📐{data['angle_deg']:6.1f}° ⚖️{data['force_kg']:6.3f}kg (Raw: F={data['raw_force']:4d}, A={data['raw_angle']:4d})")
 
-                                    for data in parsed:
-                                        print(
-                                            f"🎯 {data['type']}: 📐{data['angle_deg']:6.1f}° ⚖️{data['force_kg']:6.3f}kg (Raw: F={data['raw_force']:4d}, A={data['raw_angle']:4d})")
+                    elif sink:
+                        sink.tick()
 
                     time.sleep(0.01)
 
@@ -408,6 +645,8 @@ class CalibratedSensorDecoder:
             print("\n⏹️ Arrêt demandé")
         finally:
             self.disconnect()
+            if sink:
+                sink.close()
 
         return all_data
 
@@ -440,6 +679,263 @@ class CalibratedSensorDecoder:
             print(f"❌ Erreur sauvegarde: {e}")
 
 
+class SampleAverager:
+    """Filtrage du bruit initial et moyennage par blocs des points calibrés
+
+    Partagé entre l'acquisition en direct (app.py) et le retraitement des
+    journaux bruts pour que les deux chemins produisent exactement les mêmes points.
+    """
+
+    def __init__(self, averaging_window=25, initial_skip_points=10, verbose=True):
+        self.averaging_window = averaging_window
+        self.initial_skip_points = initial_skip_points
+        self.verbose = verbose
+        self.reset()
+
+    def configure(self, averaging_window, initial_skip_points):
+        """Mettre à jour la fenêtre de moyennage et le nombre de points ignorés"""
+        self.averaging_window = averaging_window
+        self.initial_skip_points = initial_skip_points
+
+    def reset(self):
+        """Réinitialiser pour une nouvelle mesure"""
+        self.points_received = 0
+        self.clear_accumulators()
+
+    def clear_accumulators(self):
+        """Vider le bloc en cours"""
+        self.angle_accumulator = []
+        self.force_accumulator = []
+
+    def add(self, data, timestamp):
+        """Ajouter un point calibré, retourne le point moyenné quand le bloc est complet"""
+        self.points_received += 1
+
+        # Ignorer les premiers points (bruit initial)
+        if self.points_received <= self.initial_skip_points:
+            if self.verbose:
+                print(f"🚫 Ignorer point {self.points_received}/{self.initial_skip_points} (bruit initial)")
+            return None
+
+        # Accumuler les valeurs
+        self.angle_accumulator.append((data['angle_deg'], data['raw_angle']))
+        self.force_accumulator.append((data['force_kg'], data['raw_force']))
+
+        # Si on a assez de valeurs, calculer la moyenne
+        if len(self.angle_accumulator) < self.averaging_window:
+            return None
+
+        count = len(self.angle_accumulator)
+        avg_angle = sum([item[0] for item in self.angle_accumulator]) / count
+        avg_force = sum([item[0] for item in self.force_accumulator]) / count
+        avg_raw_angle = sum([item[1] for item in self.angle_accumulator]) / count
+        avg_raw_force = sum([item[1] for item in self.force_accumulator]) / count
+
+        self.clear_accumulators()
+
+        return {
+            'timestamp': timestamp,
+            'angle': round(avg_angle, 2),
+            'force': round(avg_force, 3),
+            'raw_angle': int(avg_raw_angle),
+            'raw_force': int(avg_raw_force),
+            'samples_count': count
+        }
+
+
+def replay_raw_log(path, calibration=None, averaging_window=None, initial_skip_points=None):
+    """Rejouer un journal brut (.mevraw) avec le même traitement que l'acquisition en direct
+
+    Les paramètres non fournis reprennent ceux enregistrés dans l'en-tête du journal.
+    """
+    header, chunks = iter_raw_chunks(path)
+    settings = header.get('settings', {})
+
+    if averaging_window is None:
+        averaging_window = settings.get('averaging_window', 25)
+    if initial_skip_points is None:
+        initial_skip_points = settings.get('initial_skip_points', 10)
+
+    decoder = CalibratedSensorDecoder(port=header.get('port'), baudrate=header.get('baudrate') or 115200,
+                                      calibration=calibration or header.get('calibration'))
+    # Zéro de force tel qu'il était au début de l'enregistrement (journaux récents) ;
+    # avec une nouvelle calibration, le décalage est recalculé par rapport à son zéro
+    zero_state = settings.get('zero_tracking')
+    zero_tracker = ForceZeroTracker.from_dict(zero_state) if zero_state else None
+    if zero_tracker and not calibration:
+        decoder.set_force_offset(zero_state.get('offset', 0.0))
+    elif zero_tracker and zero_tracker.enabled and zero_tracker.ready and decoder.calibration['force']['calibrated']:
+        decoder.set_force_offset(zero_tracker.offset(decoder.calibration['force']['raw_min']))
+    averager = SampleAverager(averaging_window, initial_skip_points, verbose=False)
+    features = MechanicalFeatureTracker()
+    # Journaux enregistrés avec la détection début/fin : même découpage qu'en direct
+    detector = SampleDetector(settings['detection']) if settings.get('detection') else None
+    outlier_filter = OutlierFilter(settings['outliers']) if settings.get('outliers') else None
+
+    start_time = header.get('start_time')
+    buffer = ""
+    points = []
+
+    for reads, data in chunks:
+        for i, (offset, arrival_time) in enumerate(reads):
+            end = reads[i + 1][0] if i + 1 < len(reads) else len(data)
+            if start_time is None:
+                start_time = arrival_time
+
+            buffer += data[offset:end].decode('utf-8', errors='ignore')
+
+            while '\n' in buffer and not (detector and detector.finished):
+                line, buffer = buffer.split('\n', 1)
+                parsed = decoder.parse_line(line)
+
+                if parsed:
+                    for frame in parsed:
+                        if outlier_filter and not outlier_filter.accept(frame):
+                            continue
+
+                        if detector is None:
+                            released = [(frame, arrival_time)]
+                            origin = start_time
+                        else:
+                            false_starts = detector.false_starts
+                            previous_state = detector.state
+                            released = detector.feed(frame, arrival_time)
+                            origin = detector.start_time
+                            if zero_tracker:
+                                zero_tracker.step(decoder, previous_state, detector.state, frame, released)
+                            if outlier_filter and previous_state == IDLE and detector.state != IDLE:
+                                outlier_filter.reset_counts()
+                            if detector.false_starts != false_starts:
+                                points = []
+                                averager.reset()
+                                features.reset()
+
+                        for released_frame, frame_time in released:
+                            point = averager.add(released_frame, frame_time - origin)
+                            if point:
+                                points.append(point)
+                                features.update(point['angle'], point['force'])
+
+                        if detector and detector.finished:
+                            break
+
+    return {
+        'path': path,
+        'header': header,
+        'calibration': decoder.calibration,
+        'averaging_window': averaging_window,
+        'initial_skip_points': initial_skip_points,
+        'force_offset': decoder.force_offset,
+        'rejected_frames': outlier_filter.counts() if outlier_filter else {'angle': 0, 'force': 0},
+        'points': points,
+        'features': features.to_dict()
+    }
+
+
+def parse_raw_log_name(path):
+    """Extraire (variété, échantillon) d'un nom <variété>_ech<N>.mevraw"""
+    match = re.match(r'^(.+)_ech(\d+)' + re.escape(RAW_EXTENSION) + r'$', os.path.basename(path))
+    if not match:
+        return None, None
+    return match.group(1), int(match.group(2))
+
+
+def _reprocess_worker(job):
+    """Traitement d'un journal dans un processus du pool"""
+    path, calibration, averaging_window, initial_skip_points = job
+    try:
+        return replay_raw_log(path, calibration, averaging_window, initial_skip_points)
+    except Exception as e:
+        return {'path': path, 'error': str(e)}
+
+
+def reprocess_directory(directory, calibration=None, averaging_window=None, initial_skip_points=None,
+                        workers=None, exports_dir='exports'):
+    """Retraiter en parallèle tous les journaux bruts d'un dossier
+
+    Le décodage est réparti sur un pool de processus ; l'écriture des classeurs
+    est faite par le processus principal, une fois par variété.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from sample_store import build_sample_metadata, save_samples
+
+    jobs = []
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if not name.endswith(RAW_EXTENSION):
+                continue
+            path = os.path.join(root, name)
+            variety, sample_number = parse_raw_log_name(path)
+            if variety is None:
+                print(f"⚠️ Ignoré (nom non reconnu, attendu <variété>_ech<N>{RAW_EXTENSION}): {path}")
+                continue
+            jobs.append(path)
+
+    if not jobs:
+        print(f"⚠️ Aucun journal brut trouvé dans {directory}")
+        return []
+
+    workers = workers or os.cpu_count() or 1
+    print(f"🔁 Retraitement de {len(jobs)} journaux sur {workers} processus...")
+
+    by_variety = {}
+    summary = []
+    start = time.time()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_reprocess_worker, (path, calibration, averaging_window, initial_skip_points))
+                   for path in jobs]
+
+        for future in as_completed(futures):
+            result = future.result()
+            path = result['path']
+            variety, sample_number = parse_raw_log_name(path)
+
+            if 'error' in result:
+                print(f"❌ {path}: {result['error']}")
+                summary.append({'fichier': path, 'variete': variety, 'echantillon': sample_number,
+                                'points': 0, 'erreur': result['error']})
+                continue
+
+            points = result['points']
+            metadata = build_sample_metadata(variety, sample_number, points, features=result['features'], extra_metadata=[
+                ('Retraité depuis', os.path.basename(path)),
+                ('Fenêtre de moyennage', result['averaging_window']),
+                ('Points ignorés', result['initial_skip_points']),
+                ('Correction zéro force (brut)', round(result['force_offset'], 3))
+            ] + outlier_metadata(result['rejected_frames']))
+            by_variety.setdefault(variety, []).append({
+                'sample_number': sample_number,
+                'points': points,
+                'metadata': metadata,
+                'calibration': result['calibration'],
+                'settings': {
+                    'averaging_window': result['averaging_window'],
+                    'initial_skip_points': result['initial_skip_points'],
+                    'force_offset': result['force_offset']
+                }
+            })
+            summary.append({'fichier': path, 'variete': variety, 'echantillon': sample_number,
+                            'points': len(points), 'erreur': ''})
+            print(f"  ✅ {variety} ech{sample_number}: {len(points)} points")
+
+    for variety, samples in sorted(by_variety.items()):
+        samples.sort(key=lambda s: s['sample_number'])
+        filepath = save_samples(variety, samples, exports_dir)
+        print(f"💾 {variety}: {len(samples)} échantillons écrits dans {filepath}")
+
+    summary.sort(key=lambda row: (row['variete'] or '', row['echantillon'] or 0))
+    summary_file = os.path.join(exports_dir, f"retraitement_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    os.makedirs(exports_dir, exist_ok=True)
+    with open(summary_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['fichier', 'variete', 'echantillon', 'points', 'erreur'])
+        writer.writeheader()
+        writer.writerows(summary)
+
+    print(f"⏱️ Retraitement terminé en {time.time() - start:.1f}s - résumé dans {summary_file}")
+    return summary
+
+
 def main():
     """Fonction principale"""
     import argparse
@@ -449,10 +945,41 @@ def main():
     parser.add_argument('--baudrate', type=int, default=115200, help='Vitesse')
     parser.add_argument('--calibrate', action='store_true', help='Lancer la calibration')
     parser.add_argument('--duration', type=int, help='Durée de surveillance (secondes)')
-    parser.add_argument('--output', help='Fichier de sortie CSV')
+    parser.add_argument('--output', help='Fichier de sortie (écrit au fil de l\'eau)')
+    parser.add_argument('--format', choices=SINK_FORMATS, default='csv', help='Format de sortie')
+    parser.add_argument('--stdout', action='store_true',
+                        help='Écrire les points sur la sortie standard (messages sur stderr)')
+    parser.add_argument('--flush-interval', type=float, default=1.0, help='Vidage du tampon (secondes)')
+    parser.add_argument('--rotate-size', type=parse_size, help='Rotation des fichiers par taille (ex: 100M)')
+    parser.add_argument('--rotate-interval', type=float, help='Rotation des fichiers par durée (secondes)')
+    parser.add_argument('--reprocess', metavar='DOSSIER',
+                        help='Retraiter les journaux bruts (.mevraw) d\'un dossier au lieu de lire le port')
+    parser.add_argument('--calibration-file', help='Calibration JSON à appliquer au retraitement')
+    parser.add_argument('--averaging-window', type=int, help='Fenêtre de moyennage pour le retraitement')
+    parser.add_argument('--skip-points', type=int, help='Points initiaux ignorés pour le retraitement')
+    parser.add_argument('--workers', type=int, help='Nombre de processus pour le retraitement')
+    parser.add_argument('--exports-dir', default='exports', help='Dossier des classeurs par variété')
 
     args = parser.parse_args()
 
+    # Retraitement hors ligne des journaux bruts
+    if args.reprocess:
+        calibration = None
+        if args.calibration_file:
+            with open(args.calibration_file, 'r') as f:
+                calibration = json.load(f)
+        reprocess_directory(args.reprocess, calibration=calibration,
+                            averaging_window=args.averaging_window,
+                            initial_skip_points=args.skip_points,
+                            workers=args.workers, exports_dir=args.exports_dir)
+        return
+
+    # En mode pipeline, la sortie standard est réservée aux données :
+    # flux des données capturé avant de rediriger les messages vers stderr
+    data_out = sys.stdout.buffer if args.stdout else None
+    if args.stdout:
+        sys.stdout = sys.stderr
+
     # Créer le décodeur
     decoder = CalibratedSensorDecoder(port=args.port, baudrate=args.baudrate)
 
@@ -461,20 +988,24 @@ def main():
         decoder.calibrate_sensor()
         return
 
-    # Surveillance
-    data = decoder.monitor_sensors(duration=args.duration)
-
-    # Sauvegarder
-    if data:
-        decoder.save_data(data, args.output)
-
-        # Statistiques
-        if data:
-            angles = [d['angle_deg'] for d in data]
-            forces = [d['force_kg'] for d in data]
-            print(f"\n📊 RÉSUMÉ: {len(data)} échantillons")
-            print(f"   Angles: {min(angles):6.1f}° - {max(angles):6.1f}°")
-            print(f"   Forces: {min(forces):6.3f}kg - {max(forces):6.3f}kg")
+    # Surveillance avec écriture au fil de l'eau
+    output = args.output
+    if not output and not args.stdout:
+        output = f"sensor_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}{SINK_EXTENSIONS[args.format]}"
+
+    sink = StreamingSink(output, fmt=args.format, stdout=data_out,
+                         flush_interval=args.flush_interval,
+                         rotate_size=args.rotate_size, rotate_interval=args.rotate_interval,
+                         frame_types=FRAME_TYPES, calibration=decoder.calibration)
+    decoder.monitor_sensors(duration=args.duration, sink=sink, verbose=not args.stdout)
+
+    # Statistiques
+    if sink.count:
+        if sink.files:
+            print(f"💾 Données sauvegardées dans {', '.join(sink.files)}")
+        print(f"\n📊 RÉSUMÉ: {sink.count} échantillons")
+        print(f"   Angles: {sink.angle_min:6.1f}° - {sink.angle_max:6.1f}°")
+        print(f"   Forces: {sink.force_min:6.3f}kg - {sink.force_max:6.3f}kg")
 
 
 if __name__ == "__main__":
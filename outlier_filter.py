@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Rejet en ligne des trames aberrantes (filtre de Hampel causal par voie)
+Une trame corrompue (bit inversé, 0xFFFF...) est écartée avant la détection et
+le moyennage au lieu de fausser la moyenne du bloc et la force max ; les trames
+rejetées sont comptées par voie pour chaque échantillon.
+
+Un vrai saut (rupture, mise en charge rapide) dépasse lui aussi la bande
+(3 × 8 unités brutes ≈ 0,74 kg à ~32,5 unités/kg) : seule sa première trame est
+écartée, la suivante du même côté confirme le nouveau niveau et le mouvement est
+suivi sans attendre que la fenêtre se remplisse. En contrepartie, une corruption
+qui dure deux trames consécutives du même côté n'est écartée qu'à moitié.
+"""
+
+from collections import deque
+
+DEFAULT_OUTLIER = {
+    'enabled': True,
+    'window': 7,            # Nombre de valeurs brutes récentes (fenêtre glissante)
+    'threshold': 3.0,       # Écart toléré, en écarts-types robustes (1.4826 × MAD)
+    'min_deviation': 8.0    # Écart-type robuste minimal (unités brutes) : signal quantifié, MAD nulle
+                            # (un saut soutenu ne perd que sa première trame, voir HampelChannel)
+}
+
+
+def outlier_settings(settings=None):
+    """Paramètres du filtre complétés par les valeurs par défaut"""
+    merged = dict(DEFAULT_OUTLIER)
+    if settings:
+        merged.update({key: value for key, value in settings.items() if key in DEFAULT_OUTLIER})
+    return merged
+
+
+def validate_outlier_settings(settings):
+    """Vérifier des paramètres du filtre, retourne un message d'erreur ou None"""
+    for key, value in settings.items():
+        if key not in DEFAULT_OUTLIER:
+            return f"Paramètre de filtrage inconnu: {key}"
+        if key == 'enabled':
+            if not isinstance(value, bool):
+                return "Le paramètre enabled doit être un booléen"
+        elif key == 'window':
+            if not isinstance(value, int) or isinstance(value, bool) or value < 3:
+                return "La fenêtre doit être un entier supérieur ou égal à 3"
+        elif not isinstance(value, (int, float)) or isinstance(value, bool) or value <= 0:
+            return f"Le paramètre {key} doit être un nombre strictement positif"
+    return None
+
+
+class HampelChannel:
+    """Filtre de Hampel causal sur une voie
+
+    La valeur est comparée à la médiane des valeurs précédentes ; toutes les valeurs
+    entrent dans la fenêtre. Un écart qui se prolonge du même côté (nouveau niveau
+    ou rampe, chaque valeur pas plus loin de la précédente que celle-ci ne l'est de
+    la médiane) est accepté dès sa deuxième trame, alors qu'un pic isolé reste écarté.
+    """
+
+    def __init__(self, window=7, threshold=3.0, min_deviation=8.0):
+        self.threshold = threshold
+        self.min_deviation = min_deviation
+        self.min_history = window // 2 + 1
+        self.values = deque(maxlen=window)
+        # Écart en cours : côté (+1/-1, 0 si la valeur précédente était dans la bande) et dernière valeur
+        self._run_side = 0
+        self._run_value = None
+
+    def is_outlier(self, value):
+        values = self.values
+        outlier = False
+        if len(values) >= self.min_history:
+            ordered = sorted(values)
+            middle = len(ordered) // 2
+            median = ordered[middle]
+            mad = sorted(abs(v - median) for v in ordered)[middle]
+            deviation = value - median
+            if abs(deviation) > self.threshold * max(1.4826 * mad, self.min_deviation):
+                side = 1 if deviation > 0 else -1
+                # Saut soutenu : l'écart précédent, du même côté, est confirmé par cette valeur
+                sustained = (side == self._run_side and
+                             abs(value - self._run_value) <= abs(self._run_value - median))
+                outlier = not sustained
+                self._run_side, self._run_value = side, value
+            else:
+                self._run_side = 0
+        values.append(value)
+        return outlier
+
+
+class OutlierFilter:
+    """Filtre des trames décodées (voies angle et force) avec comptage des rejets"""
+
+    def __init__(self, settings=None):
+        self.configure(settings)
+
+    def configure(self, settings=None):
+        """Mettre à jour les paramètres (vide l'historique)"""
+        self.settings = outlier_settings(settings)
+        self.reset()
+
+    def reset(self):
+        """Vider l'historique et les compteurs (nouvelle écoute)"""
+        params = (self.settings['window'], self.settings['threshold'], self.settings['min_deviation'])
+        self._angle = HampelChannel(*params)
+        self._force = HampelChannel(*params)
+        self.reset_counts()
+
+    def reset_counts(self):
+        """Remettre à zéro les compteurs (début d'échantillon)"""
+        self.rejected_angle = 0
+        self.rejected_force = 0
+
+    def accept(self, frame):
+        """True si la trame est conservée, False si l'une des voies est aberrante"""
+        if not self.settings['enabled']:
+            return True
+        # Les deux voies sont toujours évaluées pour garder leurs fenêtres à jour
+        angle_outlier = self._angle.is_outlier(frame['raw_angle'])
+        force_outlier = self._force.is_outlier(frame['raw_force'])
+        if angle_outlier:
+            self.rejected_angle += 1
+        if force_outlier:
+            self.rejected_force += 1
+        return not (angle_outlier or force_outlier)
+
+    def counts(self):
+        """Trames rejetées par voie depuis le début de l'échantillon"""
+        return {
+            'angle': self.rejected_angle,
+            'force': self.rejected_force
+        }
+
+
+def outlier_metadata(counts):
+    """Lignes de métadonnées (Information, Valeur) des trames rejetées"""
+    return [
+        ('Trames rejetées (angle)', counts['angle']),
+        ('Trames rejetées (force)', counts['force'])
+    ]
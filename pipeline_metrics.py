@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Compteurs et histogrammes de supervision de la chaîne d'acquisition
+Exposés au format texte Prometheus par /api/metrics. Une mesure coûte une
+addition (compteur, jauge) ou une recherche dichotomique dans des bornes fixes
+(histogramme), sans verrou ni allocation : chaque métrique du chemin chaud
+n'est écrite que par le thread de mesure. Les valeurs déjà tenues ailleurs
+(statistiques du décodeur, clients connectés) sont lues au moment de la
+collecte par des fonctions, sans rien coûter pendant l'acquisition.
+"""
+
+import functools
+import math
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Bornes (s) adaptées aux émissions Socket.IO et aux exports Excel
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Métrique éventuellement étiquetée : labels(...) retourne la série correspondante"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+
+    def labels(self, *values):
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _series(self):
+        if self.labelnames:
+            return sorted(self._children.items())
+        return [((), self)]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for values, series in self._series():
+            lines.extend(series._samples(self.name, self.labelnames, values))
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.value = 0
+
+    def _new_child(self):
+        return Counter(self.name, self.documentation)
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def _samples(self, name, labelnames, values):
+        return [f'{name}{_format_labels(labelnames, values)} {_format_value(self.value)}']
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return Gauge(self.name, self.documentation)
+
+    def set(self, value):
+        self.value = value
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Un compte par intervalle (non cumulé) ; le dernier reçoit les valeurs > borne max
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def _new_child(self):
+        return Histogram(self.name, self.documentation, buckets=self.buckets)
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def timed(self, func):
+        """Décorateur : durée de chaque appel de func (route Flask, export...)"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.observe(time.perf_counter() - start)
+        return wrapper
+
+    def _samples(self, name, labelnames, values):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{_format_labels(labelnames, values, [("le", _format_value(bound))])} '
+                         f'{cumulative}')
+        lines.append(f'{name}_sum{_format_labels(labelnames, values)} {_format_value(self.sum)}')
+        lines.append(f'{name}_count{_format_labels(labelnames, values)} {cumulative}')
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Valeur lue à la collecte : func() retourne un nombre, ou {étiquettes: nombre}"""
+
+    def __init__(self, name, documentation, kind, func, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.func = func
+
+    def _series(self):
+        try:
+            result = self.func()
+        except Exception:
+            return []
+        if result is None:
+            return []
+        if not self.labelnames:
+            return [((), result)]
+        return sorted(((key if isinstance(key, tuple) else (key,)), value) for key, value in result.items())
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for values, value in self._series():
+            lines.append(f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}')
+        return lines
+
+
+class MetricsRegistry:
+    """Ensemble des métriques de l'application, rendues dans l'ordre de création"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._add(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._add(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name, documentation, func, kind='gauge', labelnames=()):
+        return self._add(CallbackMetric(name, documentation, kind, func, labelnames))
+
+    def render(self):
+        """Texte d'exposition Prometheus (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+def _resident_memory_bytes():
+    """Mémoire résidente du processus (Linux : /proc ; ailleurs : pic via resource, si disponible)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def register_process_metrics(registry):
+    """Métriques standard du processus (CPU, mémoire, threads) lues à la collecte"""
+    registry.callback('process_cpu_seconds_total', "Temps CPU utilisateur et système du processus",
+                      lambda: sum(os.times()[:2]), kind='counter')
+    registry.callback('process_resident_memory_bytes', "Mémoire résidente du processus", _resident_memory_bytes)
+    registry.callback('process_threads', "Threads Python actifs", threading.active_count)
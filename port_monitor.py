@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Surveillance des ports série en arrière-plan
+Les branchements/débranchements sont détectés par une empreinte peu coûteuse
+(/dev/serial/by-id et /dev/ttyUSB*, /dev/ttyACM* sous Linux) ; seuls les ports
+nouveaux sont testés, en parallèle, et le résultat est gardé en cache :
+la liste des ports est servie sans ouvrir aucun port dans la requête.
+"""
+
+import glob
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import serial
+import serial.tools.list_ports
+
+LINUX_HOTPLUG_PATTERNS = ('/dev/serial/by-id/*', '/dev/ttyUSB*', '/dev/ttyACM*')
+
+
+def check_port_access(port):
+    """Vérifier l'accès à un port série"""
+    try:
+        # Essayer d'ouvrir le port brièvement
+        test_conn = serial.Serial(port, timeout=0.1)
+        test_conn.close()
+        return {'accessible': True}
+    except serial.SerialException as e:
+        error_msg = str(e)
+        if 'Permission denied' in error_msg:
+            return {
+                'accessible': False,
+                'error': 'Permission refusée - Ajoutez votre utilisateur au groupe dialout'
+            }
+        elif 'Device or resource busy' in error_msg:
+            return {
+                'accessible': False,
+                'error': 'Port occupé par une autre application'
+            }
+        else:
+            return {
+                'accessible': False,
+                'error': f'Erreur: {error_msg}'
+            }
+    except Exception as e:
+        return {
+            'accessible': False,
+            'error': f'Erreur inconnue: {str(e)}'
+        }
+
+
+def port_identity(port):
+    """Identité USB d'un port (ListPortInfo de pyserial)"""
+    return {
+        'device': port.device,
+        'description': port.description,
+        'manufacturer': port.manufacturer or 'Inconnu',
+        'serial_number': port.serial_number,
+        'vid': port.vid,
+        'pid': port.pid,
+        'location': port.location
+    }
+
+
+def hotplug_fingerprint():
+    """Empreinte des ports branchés, sans ouvrir aucun port
+
+    Sous Linux, simple lecture de /dev ; ailleurs, énumération pyserial.
+    """
+    if sys.platform.startswith('linux'):
+        return tuple(sorted(path for pattern in LINUX_HOTPLUG_PATTERNS for path in glob.glob(pattern)))
+    return tuple(sorted(port.device for port in serial.tools.list_ports.comports()))
+
+
+class PortMonitor:
+    """Cache des ports série tenu à jour par un thread de surveillance
+
+    in_use() retourne les ports ouverts par l'application : ils ne sont jamais
+    ouverts pour un test (la mesure en cours n'est pas perturbée).
+    on_change(ports) est appelé à chaque modification de la liste.
+    """
+
+    def __init__(self, interval=1.0, rescan_interval=30.0, max_workers=8, probe=check_port_access,
+                 in_use=None, on_change=None):
+        self.interval = interval
+        # Énumération complète périodique (ports hors des motifs surveillés)
+        self.rescan_interval = rescan_interval
+        self.max_workers = max_workers
+        self.probe = probe
+        self.in_use = in_use or (lambda: set())
+        self.on_change = on_change
+        self._lock = threading.Lock()
+        self._scan_lock = threading.Lock()
+        self._ports = {}
+        self._fingerprint = None
+        self._last_scan = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Premier inventaire puis surveillance en arrière-plan"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='port-monitor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        self.refresh()
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"⚠️ Surveillance des ports: {e}")
+
+    def poll(self):
+        """Relancer l'inventaire si un port a été branché ou débranché"""
+        fingerprint = hotplug_fingerprint()
+        if fingerprint != self._fingerprint or time.monotonic() - self._last_scan >= self.rescan_interval:
+            self.refresh(fingerprint=fingerprint)
+
+    def refresh(self, reprobe=False, fingerprint=None):
+        """Énumérer les ports et tester les nouveaux (tous si reprobe) ; retourne la liste"""
+        with self._scan_lock:
+            self._fingerprint = fingerprint if fingerprint is not None else hotplug_fingerprint()
+            self._last_scan = time.monotonic()
+            identities = {port.device: port_identity(port) for port in serial.tools.list_ports.comports()}
+            busy = self.in_use()
+
+            with self._lock:
+                known = dict(self._ports)
+            to_probe = [device for device in identities
+                        if device not in busy and (reprobe or device not in known or known[device]['in_use'])]
+
+            results = {}
+            if to_probe:
+                with ThreadPoolExecutor(max_workers=min(self.max_workers, len(to_probe))) as pool:
+                    for device, access in zip(to_probe, pool.map(self.probe, to_probe)):
+                        results[device] = access
+
+            ports = {}
+            for device, identity in identities.items():
+                entry = dict(identity)
+                if device in busy:
+                    entry.update({'accessible': True, 'error': '', 'in_use': True,
+                                  'probed_at': known.get(device, {}).get('probed_at')})
+                elif device in results:
+                    entry.update({'accessible': results[device]['accessible'],
+                                  'error': results[device].get('error', ''),
+                                  'in_use': False, 'probed_at': time.time()})
+                else:
+                    previous = known[device]
+                    entry.update({key: previous[key] for key in ('accessible', 'error', 'in_use', 'probed_at')})
+                ports[device] = entry
+
+            with self._lock:
+                changed = ports != self._ports
+                self._ports = ports
+
+        if changed and self.on_change:
+            self.on_change(self.ports())
+        return self.ports()
+
+    def ports(self):
+        """Ports connus (cache), triés par nom"""
+        with self._lock:
+            return [dict(self._ports[device]) for device in sorted(self._ports)]
+
+    def get(self, device):
+        with self._lock:
+            entry = self._ports.get(device)
+            return dict(entry) if entry else None
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Lecture par projection mémoire (mmap) des captures brutes volumineuses
+Accepte les captures texte du port série et les journaux .mevraw. Le flux est
+découpé en morceaux alignés sur les fins de ligne, passés sans copie à
+parse_frames ; chaque processus peut traiter sa propre plage d'octets.
+"""
+
+import mmap
+import os
+import time
+
+from main import parse_frames
+from raw_recorder import CHUNK_HEADER, CHUNK_MAGIC, CODECS, HEADER_LENGTH, RAW_MAGIC, READ_ENTRY
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+class MappedRawLog:
+    """Capture brute projetée en mémoire, vue comme un flux texte continu
+
+    Les positions manipulées (size, split, iter_chunks) sont des positions
+    logiques dans ce flux : pour un .mevraw, les octets série décompressés mis
+    bout à bout, hors en-têtes et index de blocs.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        file_size = os.fstat(self._file.fileno()).st_size
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if file_size else b''
+
+        # Segments : (position logique, longueur, position dans le fichier, octets stockés, codec)
+        self.segments = []
+        self.codec = None
+
+        if self._mm[:len(RAW_MAGIC)] == RAW_MAGIC:
+            self._index_raw_log()
+        elif file_size:
+            self.segments.append((0, file_size, 0, file_size, 'none'))
+
+        self.size = sum(segment[1] for segment in self.segments)
+
+    def _index_raw_log(self):
+        """Parcourir les en-têtes de blocs d'un .mevraw (sans décompresser)"""
+        import json
+
+        mm = self._mm
+        pos = len(RAW_MAGIC)
+        (length,) = HEADER_LENGTH.unpack_from(mm, pos)
+        pos += HEADER_LENGTH.size
+        self.header = json.loads(bytes(mm[pos:pos + length]).decode('utf-8'))
+        self.codec = self.header.get('codec', 'zlib')
+        pos += length
+
+        logical = 0
+        while pos + CHUNK_HEADER.size <= len(mm):
+            magic, n_reads, raw_len, stored_len = CHUNK_HEADER.unpack_from(mm, pos)
+            if magic != CHUNK_MAGIC:
+                raise ValueError(f"Bloc corrompu dans {self.path} (octet {pos})")
+            data_pos = pos + CHUNK_HEADER.size + n_reads * READ_ENTRY.size
+            if data_pos + stored_len > len(mm):
+                # Fichier tronqué : on ignore le dernier bloc incomplet
+                break
+            self.segments.append((logical, raw_len, data_pos, stored_len, self.codec))
+            logical += raw_len
+            pos = data_pos + stored_len
+
+    def close(self):
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _segment_buffer(self, index):
+        """Tampon d'un segment : (buf, début, fin) - sans copie si non compressé"""
+        _, length, file_pos, stored_len, codec = self.segments[index]
+        if codec == 'none':
+            return self._mm, file_pos, file_pos + length
+        data = CODECS[codec][1](self._mm[file_pos:file_pos + stored_len])
+        return data, 0, len(data)
+
+    def _segment_at(self, logical):
+        """Indice du segment contenant une position logique"""
+        lo, hi = 0, len(self.segments) - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self.segments[mid][0] <= logical:
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
+
+    def next_line_start(self, logical):
+        """Première position de début de ligne à partir de logical"""
+        if logical <= 0:
+            return 0
+        index = self._segment_at(logical)
+        while index < len(self.segments):
+            seg_start = self.segments[index][0]
+            buf, begin, end = self._segment_buffer(index)
+            search_from = begin + max(0, logical - seg_start)
+            # La position logical est un début de ligne si l'octet précédent est '\n'
+            nl = buf.find(b'\n', max(begin, search_from - 1), end)
+            if nl != -1:
+                return seg_start + (nl - begin) + 1
+            index += 1
+        return self.size
+
+    def split(self, parts):
+        """Découper le flux en plages [début, fin) alignées sur les lignes"""
+        bounds = [0]
+        for k in range(1, parts):
+            bounds.append(max(bounds[-1], self.next_line_start(self.size * k // parts)))
+        bounds.append(self.size)
+        return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+    def iter_chunks(self, start=0, end=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Itérer sur des morceaux (buf, début, fin) alignés sur les fins de ligne
+
+        Les morceaux pris dans un segment non compressé pointent directement
+        dans le mmap ; seules les lignes à cheval sur deux segments sont copiées.
+        Une dernière ligne sans '\\n' en fin de capture est ignorée, comme en direct.
+        """
+        end = self.size if end is None else min(end, self.size)
+        if start >= end:
+            return
+
+        carry = b''
+        index = self._segment_at(start)
+        while index < len(self.segments) and self.segments[index][0] < end:
+            seg_start, seg_len = self.segments[index][:2]
+            buf, begin, seg_end = self._segment_buffer(index)
+            pos = begin + max(0, start - seg_start)
+            stop = begin + min(end, seg_start + seg_len) - seg_start
+            index += 1
+
+            if carry:
+                nl = buf.find(b'\n', pos, stop)
+                if nl == -1:
+                    carry += buf[pos:stop]
+                    continue
+                line = carry + buf[pos:nl + 1]
+                carry = b''
+                yield line, 0, len(line)
+                pos = nl + 1
+
+            while pos < stop:
+                target = pos + chunk_size
+                if target < stop:
+                    nl = buf.rfind(b'\n', pos, target)
+                    if nl == -1:
+                        nl = buf.find(b'\n', target, stop)
+                else:
+                    nl = buf.rfind(b'\n', pos, stop)
+                if nl == -1:
+                    carry = buf[pos:stop]
+                    break
+                yield buf, pos, nl + 1
+                pos = nl + 1
+
+    def iter_frames(self, start=0, end=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Itérer sur les trames brutes d'une plage du flux"""
+        for buf, chunk_start, chunk_end in self.iter_chunks(start, end, chunk_size):
+            yield from parse_frames(buf, chunk_start, chunk_end)
+
+
+def _count_frames_range(job):
+    """Compter les trames d'une plage (exécuté dans un processus du pool)"""
+    path, start, end = job
+    with MappedRawLog(path) as log:
+        count = 0
+        for buf, chunk_start, chunk_end in log.iter_chunks(start, end):
+            count += len(parse_frames(buf, chunk_start, chunk_end))
+        return count
+
+
+def count_frames_parallel(path, workers=None):
+    """Compter les trames d'une capture en répartissant les plages sur plusieurs processus"""
+    from concurrent.futures import ProcessPoolExecutor
+
+    workers = workers or os.cpu_count() or 1
+    with MappedRawLog(path) as log:
+        ranges = log.split(workers)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return sum(pool.map(_count_frames_range, [(path, start, end) for start, end in ranges]))
+
+
+def write_synthetic_capture(path, size_mb):
+    """Générer une capture texte synthétique (trames VeTiMa/Ta) pour le benchmark"""
+    lines = []
+    for i in range(4096):
+        force = 0x17 + (i * 7) % 40
+        angle = 0x3FB - (i * 3) % 320
+        lines.append(f"VeTiMa 0x{force:X} 0x{angle:X}\r\nTa 0x{force:X} 0x{angle:X}\r\n")
+    block = ''.join(lines).encode('ascii')
+
+    target = int(size_mb * 1024 * 1024)
+    with open(path, 'wb') as f:
+        written = 0
+        while written < target:
+            f.write(block)
+            written += len(block)
+    return written
+
+
+def benchmark(path=None, size_mb=256, workers=None):
+    """Mesurer le débit de décodage (Mo/s) en un processus puis en parallèle"""
+    import tempfile
+
+    temp_path = None
+    if path is None:
+        fd, temp_path = tempfile.mkstemp(suffix='.txt', prefix='mevem_bench_')
+        os.close(fd)
+        print(f"🧪 Génération d'une capture synthétique de {size_mb} Mo...")
+        write_synthetic_capture(temp_path, size_mb)
+        path = temp_path
+
+    try:
+        with MappedRawLog(path) as log:
+            size = log.size
+            print(f"📦 {path}: {size / 1e6:.1f} Mo ({len(log.segments)} segment(s), codec {log.codec or 'texte'})")
+
+            start = time.perf_counter()
+            frames = sum(len(parse_frames(buf, s, e)) for buf, s, e in log.iter_chunks())
+            elapsed = time.perf_counter() - start
+        print(f"⏱️ 1 processus : {frames} trames en {elapsed:.2f}s -> {size / 1e6 / elapsed:.1f} Mo/s")
+
+        workers = workers or os.cpu_count() or 1
+        start = time.perf_counter()
+        frames_parallel = count_frames_parallel(path, workers)
+        elapsed = time.perf_counter() - start
+        print(f"⏱️ {workers} processus : {frames_parallel} trames en {elapsed:.2f}s -> {size / 1e6 / elapsed:.1f} Mo/s")
+
+        if frames_parallel != frames:
+            print("⚠️ Nombre de trames différent entre lecture séquentielle et parallèle")
+    finally:
+        if temp_path:
+            os.remove(temp_path)
+
+
+def main():
+    """Fonction principale"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Lecture mmap des captures brutes et benchmark de débit')
+    parser.add_argument('path', nargs='?', help='Capture texte ou journal .mevraw (synthétique si absent)')
+    parser.add_argument('--size-mb', type=float, default=256, help='Taille de la capture synthétique (Mo)')
+    parser.add_argument('--workers', type=int, help='Nombre de processus pour la lecture parallèle')
+
+    args = parser.parse_args()
+    benchmark(args.path, args.size_mb, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Enregistrement du flux série brut pour retraitement ultérieur
+Chaque échantillon produit un fichier .mevraw : en-tête JSON (calibration et
+paramètres actifs) suivi de blocs compressés d'octets série horodatés
+"""
+
+import json
+import lzma
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+
+RAW_EXTENSION = '.mevraw'
+RAW_MAGIC = b'MEVRAW1\n'
+RAW_VERSION = 1
+
+# Longueur de l'en-tête JSON (uint32)
+HEADER_LENGTH = struct.Struct('<I')
+# Bloc : marqueur, nombre de lectures, octets bruts, octets stockés
+CHUNK_HEADER = struct.Struct('<4sIII')
+CHUNK_MAGIC = b'CHNK'
+# Index d'un bloc : décalage dans les octets bruts, instant d'arrivée (epoch)
+READ_ENTRY = struct.Struct('<Id')
+
+CODECS = {
+    'none': (lambda data: data, lambda data: data),
+    'zlib': (lambda data: zlib.compress(data, 6), zlib.decompress),
+    'lzma': (lambda data: lzma.compress(data, preset=1), lzma.decompress),
+}
+
+
+class RawStreamRecorder:
+    """Tee des octets série vers un journal compressé par blocs
+
+    feed() est appelé depuis la boucle d'acquisition : il se contente d'ajouter
+    la lecture à une liste. La compression et l'écriture disque se font dans un
+    thread dédié pour ne pas ralentir la lecture du port série.
+    """
+
+    def __init__(self, path, calibration=None, settings=None, codec='zlib',
+                 chunk_size=64 * 1024, flush_interval=1.0, port=None, baudrate=None,
+                 start_time=None):
+        if codec not in CODECS:
+            raise ValueError(f"Codec inconnu: {codec} (disponibles: {', '.join(CODECS)})")
+
+        self.path = path
+        self.codec = codec
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+
+        self._compress = CODECS[codec][0]
+        self._pending = []
+        self._pending_bytes = 0
+        self._last_flush = time.time()
+        self._queue = queue.Queue()
+        self._closed = False
+        self._close_lock = threading.Lock()
+
+        self.bytes_recorded = 0
+        self.chunks_written = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, 'wb')
+
+        header = {
+            'version': RAW_VERSION,
+            'codec': codec,
+            'created': datetime.now().isoformat(),
+            'start_time': start_time if start_time is not None else time.time(),
+            'port': port,
+            'baudrate': baudrate,
+            'encoding': 'utf-8',
+            'calibration': json.loads(json.dumps(calibration or {})),
+            'settings': dict(settings or {})
+        }
+        header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+        self._file.write(RAW_MAGIC)
+        self._file.write(HEADER_LENGTH.pack(len(header_bytes)))
+        self._file.write(header_bytes)
+
+        self._writer = threading.Thread(target=self._writer_loop, daemon=True)
+        self._writer.start()
+
+    def feed(self, chunk, arrival_time=None):
+        """Ajouter une lecture série (appelé depuis la boucle d'acquisition)"""
+        if self._closed or not chunk:
+            return
+
+        now = time.time() if arrival_time is None else arrival_time
+        self._pending.append((now, chunk))
+        self._pending_bytes += len(chunk)
+
+        if self._pending_bytes >= self.chunk_size or now - self._last_flush >= self.flush_interval:
+            self._handoff(now)
+
+    def _handoff(self, now):
+        """Transmettre les lectures en attente au thread d'écriture"""
+        if self._pending:
+            self._queue.put(self._pending)
+            self._pending = []
+            self._pending_bytes = 0
+        self._last_flush = now
+
+    def _writer_loop(self):
+        """Compresser et écrire les blocs en arrière-plan"""
+        while True:
+            reads = self._queue.get()
+            if reads is None:
+                break
+            try:
+                self._write_chunk(reads)
+            except Exception as e:
+                print(f"⚠️ Erreur écriture flux brut: {e}")
+
+    def _write_chunk(self, reads):
+        index = bytearray()
+        offset = 0
+        for arrival_time, chunk in reads:
+            index += READ_ENTRY.pack(offset, arrival_time)
+            offset += len(chunk)
+
+        data = b''.join(chunk for _, chunk in reads)
+        stored = self._compress(data)
+
+        self._file.write(CHUNK_HEADER.pack(CHUNK_MAGIC, len(reads), len(data), len(stored)))
+        self._file.write(index)
+        self._file.write(stored)
+
+        self.bytes_recorded += len(data)
+        self.chunks_written += 1
+
+    def close(self):
+        """Vider les lectures en attente et fermer le fichier"""
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._handoff(time.time())
+            self._queue.put(None)
+            self._writer.join()
+            self._file.close()
+
+
+def read_raw_header(f):
+    """Lire l'en-tête d'un journal brut ouvert en binaire"""
+    if f.read(len(RAW_MAGIC)) != RAW_MAGIC:
+        raise ValueError("Fichier non reconnu (en-tête MEVRAW absent)")
+    (length,) = HEADER_LENGTH.unpack(f.read(HEADER_LENGTH.size))
+    return json.loads(f.read(length).decode('utf-8'))
+
+
+def iter_raw_chunks(path):
+    """Itérer sur les blocs d'un journal brut
+
+    Retourne l'en-tête puis un générateur de (lectures, données) où lectures est
+    une liste de (décalage, instant d'arrivée) dans les données décompressées.
+    """
+    f = open(path, 'rb')
+    header = read_raw_header(f)
+    decompress = CODECS[header.get('codec', 'zlib')][1]
+
+    def chunks():
+        with f:
+            while True:
+                chunk_header = f.read(CHUNK_HEADER.size)
+                if len(chunk_header) < CHUNK_HEADER.size:
+                    break
+                magic, n_reads, raw_len, stored_len = CHUNK_HEADER.unpack(chunk_header)
+                if magic != CHUNK_MAGIC:
+                    raise ValueError(f"Bloc corrompu dans {path}")
+
+                index = f.read(n_reads * READ_ENTRY.size)
+                stored = f.read(stored_len)
+                if len(stored) < stored_len:
+                    # Fichier tronqué (arrêt brutal) : on garde ce qui est lisible
+                    break
+
+                reads = [READ_ENTRY.unpack_from(index, i * READ_ENTRY.size) for i in range(n_reads)]
+                data = decompress(stored)
+                if len(data) != raw_len:
+                    raise ValueError(f"Taille de bloc incohérente dans {path}")
+                yield reads, data
+
+    return header, chunks()
+
+
+def iter_raw_reads(path):
+    """Itérer sur les lectures (instant d'arrivée, octets) d'un journal brut"""
+    header, chunks = iter_raw_chunks(path)
+    for reads, data in chunks:
+        for i, (offset, arrival_time) in enumerate(reads):
+            end = reads[i + 1][0] if i + 1 < len(reads) else len(data)
+            yield arrival_time, data[offset:end]
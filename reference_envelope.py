@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Enveloppe de référence d'une variété et comparaison en direct
+Les courbes force/angle des échantillons enregistrés sont ramenées sur une
+grille d'angle commune ; l'enveloppe (courbe moyenne et bande de percentiles)
+sert à noter chaque point de l'échantillon en cours, dès sa mesure.
+"""
+
+import math
+import os
+import threading
+
+from variety_stats import RunningStats
+
+DEFAULT_ANGLE_STEP = 0.5        # Pas de la grille d'angle (°)
+DEFAULT_BAND = (10.0, 90.0)     # Percentiles de la bande de référence
+MIN_REFERENCE_SAMPLES = 2       # En dessous, pas d'enveloppe
+
+
+def bin_curve(points, step=DEFAULT_ANGLE_STEP):
+    """Force moyenne par case de la grille d'angle ({indice: force})"""
+    sums = {}
+    for point in points:
+        index = int(math.floor(point['angle'] / step + 0.5))
+        total, count = sums.get(index, (0.0, 0))
+        sums[index] = (total + point['force'], count + 1)
+    return {index: total / count for index, (total, count) in sums.items()}
+
+
+def build_envelope(curves, step=DEFAULT_ANGLE_STEP, band=DEFAULT_BAND):
+    """Enveloppe de plusieurs courbes ramenées sur la grille (None si trop peu de courbes)
+
+    Une case n'entre dans l'enveloppe que si au moins MIN_REFERENCE_SAMPLES courbes la couvrent.
+    """
+    if len(curves) < MIN_REFERENCE_SAMPLES:
+        return None
+
+    by_bin = {}
+    for curve in curves:
+        for index, force in curve.items():
+            by_bin.setdefault(index, []).append(force)
+
+    indexes = sorted(index for index, values in by_bin.items() if len(values) >= MIN_REFERENCE_SAMPLES)
+    if not indexes:
+        return None
+
+    envelope = {'step': step, 'band': list(band), 'samples': len(curves),
+                'angles': [], 'mean': [], 'low': [], 'high': []}
+    for index in indexes:
+        stats = RunningStats(by_bin[index])
+        envelope['angles'].append(round(index * step, 3))
+        envelope['mean'].append(stats.mean)
+        envelope['low'].append(stats.quantile(band[0] / 100.0))
+        envelope['high'].append(stats.quantile(band[1] / 100.0))
+    envelope['peak'] = max(envelope['mean'])
+    return envelope
+
+
+class EnvelopeScorer:
+    """Écart incrémental de l'échantillon en cours à l'enveloppe de sa variété (O(1) par point)"""
+
+    def __init__(self, envelope, variety=None, warn_pct=15.0, min_points=5):
+        self.envelope = envelope
+        self.variety = variety
+        self.step = envelope['step']
+        # Seuil d'alerte sur l'écart RMS (en % de la force max de référence)
+        self.warn_pct = warn_pct
+        self.min_points = min_points
+        # Normalisation : force max de la courbe moyenne (évite les divisions par ~0 au départ)
+        self.scale = envelope['peak'] if envelope['peak'] > 0 else 1.0
+        self._bins = {
+            int(math.floor(angle / self.step + 0.5)): (mean, low, high)
+            for angle, mean, low, high in zip(envelope['angles'], envelope['mean'],
+                                              envelope['low'], envelope['high'])
+        }
+        self.reset()
+
+    def reset(self):
+        """Recommencer la notation (nouvel échantillon ou faux départ)"""
+        self.compared = 0
+        self.outside = 0
+        self._sum_sq = 0.0
+
+    def rms_pct(self):
+        return 100.0 * math.sqrt(self._sum_sq / self.compared) if self.compared else 0.0
+
+    def outside_pct(self):
+        return 100.0 * self.outside / self.compared if self.compared else 0.0
+
+    def update(self, angle, force):
+        """Noter un point moyenné, None si son angle est hors de l'enveloppe"""
+        reference = self._bins.get(int(math.floor(angle / self.step + 0.5)))
+        if reference is None:
+            return None
+
+        mean, low, high = reference
+        deviation = (force - mean) / self.scale
+        self.compared += 1
+        self._sum_sq += deviation * deviation
+        inside = low <= force <= high
+        if not inside:
+            self.outside += 1
+
+        result = self.to_dict()
+        result.update({
+            'angle': angle,
+            'reference': round(mean, 3),
+            'low': round(low, 3),
+            'high': round(high, 3),
+            'deviation_pct': round(100.0 * deviation, 1),
+            'inside': inside
+        })
+        return result
+
+    def to_dict(self):
+        """Écart cumulé depuis le début de l'échantillon"""
+        rms = self.rms_pct()
+        return {
+            'variety': self.variety,
+            'reference_samples': self.envelope['samples'],
+            'compared_points': self.compared,
+            'rms_pct': round(rms, 1),
+            'outside_pct': round(self.outside_pct(), 1),
+            'status': 'warning' if self.compared >= self.min_points and rms > self.warn_pct else 'ok'
+        }
+
+
+class ReferenceEnvelopeRegistry:
+    """Courbes ramenées sur la grille par variété, enveloppes en cache
+
+    loader(variety) retourne {numéro d'échantillon: points} des échantillons enregistrés ;
+    il n'est appelé qu'au premier accès ou si le dossier de la variété a changé
+    (ex. retraitement hors ligne). Les sauvegardes et suppressions mettent les
+    courbes à jour sans relecture.
+    """
+
+    def __init__(self, loader=None, source_path=None, step=DEFAULT_ANGLE_STEP, band=DEFAULT_BAND):
+        self.loader = loader
+        self.source_path = source_path
+        self.step = step
+        self.band = band
+        self._lock = threading.RLock()
+        self._varieties = {}
+
+    def _source_mtime(self, variety):
+        if not self.source_path:
+            return None
+        path = self.source_path(variety)
+        return os.path.getmtime(path) if os.path.exists(path) else None
+
+    def _entry(self, variety, check_source=True):
+        entry = self._varieties.get(variety)
+        if entry is not None and not check_source:
+            return entry
+        mtime = self._source_mtime(variety)
+        if entry is None or entry['mtime'] != mtime:
+            entry = {'curves': {}, 'envelopes': {}, 'mtime': mtime}
+            self._varieties[variety] = entry
+            if self.loader:
+                for sample_number, points in self.loader(variety).items():
+                    entry['curves'][sample_number] = bin_curve(points, self.step)
+        return entry
+
+    def set_curve(self, variety, sample_number, points):
+        """Ajouter ou remplacer la courbe d'un échantillon (après sauvegarde)"""
+        with self._lock:
+            entry = self._entry(variety, check_source=False)
+            entry['curves'][sample_number] = bin_curve(points, self.step)
+            entry['envelopes'].clear()
+            entry['mtime'] = self._source_mtime(variety)
+
+    def remove_curve(self, variety, sample_number):
+        """Retirer la courbe d'un échantillon supprimé"""
+        with self._lock:
+            entry = self._entry(variety, check_source=False)
+            entry['curves'].pop(sample_number, None)
+            entry['envelopes'].clear()
+            entry['mtime'] = self._source_mtime(variety)
+
+    def envelope(self, variety, exclude=None):
+        """Enveloppe de la variété, sans l'échantillon exclude (celui en cours de remesure)"""
+        with self._lock:
+            entry = self._entry(variety)
+            if exclude not in entry['envelopes']:
+                curves = [curve for number, curve in entry['curves'].items() if number != exclude]
+                entry['envelopes'][exclude] = build_envelope(curves, self.step, self.band)
+            return entry['envelopes'][exclude]
+
+    def scorer(self, variety, exclude=None, **kwargs):
+        """Notation de l'échantillon à venir, None si la variété n'a pas assez d'échantillons"""
+        envelope = self.envelope(variety, exclude)
+        return EnvelopeScorer(envelope, variety, **kwargs) if envelope else None
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Détection du début et de la fin d'un échantillon sur le signal calibré
+Machine à états (repos, armement, mesure, fin) avec seuils de force et d'angle
+à hystérésis, anti-rebond et condition de retour au repos : l'échantillon se
+termine dès que la force retombe, sans attendre l'arrêt du flux série.
+"""
+
+IDLE = 'idle'
+ARMING = 'arming'
+ACTIVE = 'active'
+ENDING = 'ending'
+DONE = 'done'
+
+DEFAULT_DETECTION = {
+    'enabled': True,
+    'start_force_kg': 0.1,     # Seuil haut de force (début)
+    'stop_force_kg': 0.05,     # Seuil bas de force (retour au repos)
+    'start_angle_deg': 2.0,    # Déplacement angulaire depuis le repos (début), None pour ignorer
+    'stop_angle_deg': 1.0,     # Variation d'angle tolérée pendant le retour au repos, None pour ignorer
+    'debounce_s': 0.1,         # Durée minimale au-dessus des seuils pour démarrer
+    'rest_time_s': 0.3,        # Durée au repos avant de terminer l'échantillon
+    'min_duration_s': 0.5      # Plus court : faux départ, l'échantillon est abandonné
+}
+
+
+def detection_settings(settings=None):
+    """Paramètres de détection complétés par les valeurs par défaut"""
+    merged = dict(DEFAULT_DETECTION)
+    if settings:
+        merged.update({key: value for key, value in settings.items() if key in DEFAULT_DETECTION})
+    return merged
+
+
+def validate_detection_settings(settings, current=None):
+    """Vérifier des paramètres de détection (appliqués sur current), retourne un message d'erreur ou None"""
+    for key, value in settings.items():
+        if key not in DEFAULT_DETECTION:
+            return f"Paramètre de détection inconnu: {key}"
+        if key == 'enabled':
+            if not isinstance(value, bool):
+                return "Le paramètre enabled doit être un booléen"
+        elif value is None:
+            if key not in ('start_angle_deg', 'stop_angle_deg'):
+                return f"Le paramètre {key} est obligatoire"
+        elif not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0:
+            return f"Le paramètre {key} doit être un nombre positif"
+
+    merged = detection_settings({**(current or {}), **settings})
+    if merged['stop_force_kg'] > merged['start_force_kg']:
+        return "Le seuil de fin doit être inférieur ou égal au seuil de début (hystérésis)"
+    return None
+
+
+class SampleDetector:
+    """Début/fin d'échantillon à partir des trames calibrées
+
+    feed() reçoit chaque trame décodée avec son instant d'arrivée et retourne
+    les trames à moyenner : aucune au repos, celles de l'armement (pré-déclenchement)
+    au passage en mesure, puis chaque trame tant que l'échantillon est en cours.
+    """
+
+    def __init__(self, settings=None):
+        self.configure(settings)
+        self.reset()
+
+    def configure(self, settings=None):
+        """Mettre à jour les seuils (complétés par les valeurs par défaut)"""
+        self.settings = detection_settings(settings)
+
+    def reset(self):
+        """Revenir au repos pour un nouvel échantillon"""
+        self.state = IDLE
+        self.rest_angle = None
+        self.start_time = None
+        self.end_time = None
+        self.false_starts = 0
+        self._since = None
+        self._rest_ref = None
+        self._pending = []
+
+    @property
+    def finished(self):
+        return self.state == DONE
+
+    @property
+    def started(self):
+        return self.state in (ARMING, ACTIVE, ENDING, DONE)
+
+    def _above_start(self, frame):
+        """Signal au-dessus des seuils hauts (force ou déplacement angulaire)"""
+        if frame['force_kg'] >= self.settings['start_force_kg']:
+            return True
+        start_angle = self.settings['start_angle_deg']
+        return (start_angle is not None and self.rest_angle is not None and
+                abs(frame['angle_deg'] - self.rest_angle) >= start_angle)
+
+    def _at_rest(self, frame):
+        """Retour au repos : force sous le seuil bas et angle immobile (si demandé)"""
+        if frame['force_kg'] > self.settings['stop_force_kg']:
+            return False
+        stop_angle = self.settings['stop_angle_deg']
+        return (stop_angle is None or self._rest_ref is None or
+                abs(frame['angle_deg'] - self._rest_ref) <= stop_angle)
+
+    def feed(self, frame, arrival_time):
+        """Traiter une trame, retourne la liste des (trame, instant) à moyenner"""
+        if self.state == DONE:
+            return []
+
+        if not self.settings['enabled']:
+            if self.start_time is None:
+                self.start_time = arrival_time
+                self.state = ACTIVE
+            return [(frame, arrival_time)]
+
+        if self.state == IDLE:
+            if self._above_start(frame):
+                self.state = ARMING
+                self._since = arrival_time
+                self._pending = [(frame, arrival_time)]
+            else:
+                # Angle de repos suivi lentement pour absorber la dérive
+                angle = frame['angle_deg']
+                self.rest_angle = angle if self.rest_angle is None else self.rest_angle + 0.05 * (angle - self.rest_angle)
+            return []
+
+        if self.state == ARMING:
+            if not self._above_start(frame):
+                # Rebond : retour au repos, les trames en attente sont abandonnées
+                self.state = IDLE
+                self._pending = []
+                return []
+            self._pending.append((frame, arrival_time))
+            if arrival_time - self._since < self.settings['debounce_s']:
+                return []
+            self.state = ACTIVE
+            self.start_time = self._since
+            released, self._pending = self._pending, []
+            return released
+
+        if self.state == ACTIVE:
+            if frame['force_kg'] <= self.settings['stop_force_kg']:
+                # Angle de référence : le bras ne doit plus bouger pendant rest_time_s
+                self.state = ENDING
+                self._since = arrival_time
+                self._rest_ref = frame['angle_deg']
+            return [(frame, arrival_time)]
+
+        # ENDING : la fin est confirmée après rest_time_s au repos
+        if not self._at_rest(frame):
+            self.state = ACTIVE
+            self._rest_ref = None
+            return [(frame, arrival_time)]
+        if arrival_time - self._since < self.settings['rest_time_s']:
+            return [(frame, arrival_time)]
+
+        if self._since - self.start_time < self.settings['min_duration_s']:
+            # Faux départ (choc, bruit) : on revient au repos sans terminer
+            self.false_starts += 1
+            self.state = IDLE
+            self.start_time = None
+            return []
+
+        self.state = DONE
+        self.end_time = arrival_time
+        return []
+
+    def to_dict(self):
+        """État courant (envoyé à l'interface)"""
+        return {
+            'state': self.state,
+            'rest_angle': round(self.rest_angle, 2) if self.rest_angle is not None else None,
+            'false_starts': self.false_starts
+        }
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Format binaire indexé des échantillons (.mevs)
+Enregistrements de largeur fixe, en-tête JSON (calibration, paramètres),
+index temporel creux tous les N enregistrements et niveaux décimés min/max :
+un intervalle de temps se lit sans parcourir tout le fichier.
+
+Disposition : MAGIC | longueur en-tête (uint32) | en-tête JSON | données
+Les positions de l'en-tête sont relatives au début de la zone de données.
+"""
+
+import bisect
+import json
+import os
+import struct
+
+SAMPLE_FILE_EXTENSION = '.mevs'
+SAMPLE_FILE_MAGIC = b'MEVSMP1\n'
+SAMPLE_FILE_VERSION = 1
+
+HEADER_LENGTH = struct.Struct('<I')
+# instant (s), angle (°), force (kg), brut angle, brut force, nombre de valeurs moyennées
+RECORD = struct.Struct('<dffHHH')
+RECORD_FIELDS = ('timestamp', 'angle', 'force', 'raw_angle', 'raw_force', 'samples_count')
+INDEX_ENTRY = struct.Struct('<d')
+
+DEFAULT_INDEX_EVERY = 64
+DECIMATION_FACTOR = 8
+MIN_LEVEL_RECORDS = 256
+
+
+def _pack_points(points):
+    return b''.join(RECORD.pack(p['timestamp'], p['angle'], p['force'],
+                                int(p['raw_angle']), int(p['raw_force']), int(p.get('samples_count', 1)))
+                    for p in points)
+
+
+def _decimate(points, factor):
+    """Enveloppe min/max de la force par paquet de factor points (ordre temporel conservé)"""
+    decimated = []
+    for start in range(0, len(points), factor):
+        bucket = points[start:start + factor]
+        low = min(bucket, key=lambda p: p['force'])
+        high = max(bucket, key=lambda p: p['force'])
+        if low is high:
+            decimated.append(low)
+        else:
+            decimated.extend(sorted((low, high), key=lambda p: p['timestamp']))
+    return decimated
+
+
+def write_sample_file(path, points, header_info=None, index_every=DEFAULT_INDEX_EVERY):
+    """Écrire les points moyennés d'un échantillon au format .mevs"""
+    levels = []
+    blocks = []
+    offset = 0
+    level_points = list(points)
+    factor = 1
+
+    while True:
+        data = _pack_points(level_points)
+        index = b''.join(INDEX_ENTRY.pack(level_points[i]['timestamp'])
+                         for i in range(0, len(level_points), index_every))
+        levels.append({
+            'factor': factor,
+            'count': len(level_points),
+            'offset': offset,
+            'index_offset': offset + len(data),
+            'index_count': len(index) // INDEX_ENTRY.size
+        })
+        blocks.extend((data, index))
+        offset += len(data) + len(index)
+
+        if len(level_points) < MIN_LEVEL_RECORDS:
+            break
+        level_points = _decimate(level_points, DECIMATION_FACTOR)
+        factor *= DECIMATION_FACTOR
+
+    header = dict(header_info or {})
+    header.update({
+        'version': SAMPLE_FILE_VERSION,
+        'record': RECORD.format,
+        'fields': RECORD_FIELDS,
+        'index_every': index_every,
+        'count': len(points),
+        'levels': levels
+    })
+    header_bytes = json.dumps(header, ensure_ascii=False, default=str).encode('utf-8')
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(SAMPLE_FILE_MAGIC)
+        f.write(HEADER_LENGTH.pack(len(header_bytes)))
+        f.write(header_bytes)
+        for block in blocks:
+            f.write(block)
+    os.replace(tmp_path, path)
+    return path
+
+
+class SampleFileReader:
+    """Lecture par tranches d'un fichier .mevs"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        if self._file.read(len(SAMPLE_FILE_MAGIC)) != SAMPLE_FILE_MAGIC:
+            self._file.close()
+            raise ValueError(f"Fichier non reconnu (en-tête MEVSMP absent): {path}")
+        (length,) = HEADER_LENGTH.unpack(self._file.read(HEADER_LENGTH.size))
+        self.header = json.loads(self._file.read(length).decode('utf-8'))
+        self.data_start = len(SAMPLE_FILE_MAGIC) + HEADER_LENGTH.size + length
+        self.levels = self.header['levels']
+        self.index_every = self.header['index_every']
+        self._indexes = {}
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def count(self):
+        return self.header['count']
+
+    def _index(self, level):
+        """Index temporel creux d'un niveau (chargé une seule fois)"""
+        if level not in self._indexes:
+            info = self.levels[level]
+            self._file.seek(self.data_start + info['index_offset'])
+            data = self._file.read(info['index_count'] * INDEX_ENTRY.size)
+            self._indexes[level] = [entry[0] for entry in INDEX_ENTRY.iter_unpack(data)]
+        return self._indexes[level]
+
+    def read_records(self, start, stop, level=0):
+        """Lire les enregistrements [start, stop) d'un niveau"""
+        info = self.levels[level]
+        start = max(0, start)
+        stop = min(stop, info['count'])
+        if stop <= start:
+            return []
+        self._file.seek(self.data_start + info['offset'] + start * RECORD.size)
+        data = self._file.read((stop - start) * RECORD.size)
+        return [dict(zip(RECORD_FIELDS, record)) for record in RECORD.iter_unpack(data)]
+
+    def locate(self, t0=None, t1=None, level=0):
+        """Plage [start, stop) d'enregistrements couvrant l'intervalle [t0, t1]"""
+        info = self.levels[level]
+        index = self._index(level)
+        start = 0
+        stop = info['count']
+
+        if t0 is not None:
+            block = max(0, bisect.bisect_right(index, t0) - 1)
+            start = block * self.index_every
+        if t1 is not None:
+            block = bisect.bisect_right(index, t1)
+            stop = min(stop, block * self.index_every)
+        return start, stop
+
+    def read_range(self, t0=None, t1=None, level=0):
+        """Lire les points dont l'instant est dans [t0, t1]"""
+        start, stop = self.locate(t0, t1, level)
+        records = self.read_records(start, stop, level)
+        return [r for r in records
+                if (t0 is None or r['timestamp'] >= t0) and (t1 is None or r['timestamp'] <= t1)]
+
+    def level_for(self, max_points, t0=None, t1=None):
+        """Niveau le plus fin dont la tranche [t0, t1] tient dans max_points"""
+        for level in range(len(self.levels)):
+            start, stop = self.locate(t0, t1, level)
+            if stop - start <= max_points:
+                return level
+        return len(self.levels) - 1
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Stockage des échantillons dans le classeur Excel de chaque variété
+exports/<variété>/<variété>_mesures.xlsx : onglets Echantillon_N et Meta_Ech_N
+"""
+
+import os
+import re
+from datetime import datetime
+
+from features import MechanicalFeatureTracker, feature_metadata
+from sample_file import SAMPLE_FILE_EXTENSION, SampleFileReader, write_sample_file
+
+EXPORTS_DIR = 'exports'
+
+
+def variety_directory(variety, exports_dir=EXPORTS_DIR):
+    """Dossier d'une variété"""
+    return os.path.join(exports_dir, variety)
+
+
+def variety_workbook_path(variety, exports_dir=EXPORTS_DIR):
+    """Chemin du classeur principal d'une variété"""
+    return os.path.join(variety_directory(variety, exports_dir), f"{variety}_mesures.xlsx")
+
+
+def sample_file_path(variety, sample_number, exports_dir=EXPORTS_DIR):
+    """Chemin du fichier binaire indexé d'un échantillon"""
+    return os.path.join(variety_directory(variety, exports_dir),
+                        f"{variety}_ech{sample_number}{SAMPLE_FILE_EXTENSION}")
+
+
+def build_sample_metadata(variety, sample_number, points, measured_at=None, extra_metadata=None,
+                          features=None):
+    """Calculer les métadonnées d'un échantillon (liste de paires Information/Valeur)
+
+    features : caractéristiques déjà calculées pendant la mesure
+    (MechanicalFeatureTracker.to_dict) ; recalculées depuis les points sinon.
+    """
+    forces = [p['force'] for p in points]
+    angles = [p['angle'] for p in points]
+    timestamps = [p['timestamp'] for p in points]
+
+    if features is None:
+        features = MechanicalFeatureTracker.from_points(points).to_dict()
+
+    metadata = [
+        ('Date de mesure', (measured_at or datetime.now()).strftime('%Y-%m-%d %H:%M:%S')),
+        ('Variété', variety),
+        ('Échantillon', sample_number),
+        ('Nombre de points', len(points)),
+        ('Durée (s)', round(max(timestamps) - min(timestamps) if timestamps else 0, 2)),
+        ('Angle min (°)', round(min(angles) if angles else 0, 2)),
+        ('Angle max (°)', round(max(angles) if angles else 0, 2)),
+        ('Force min (kg)', round(min(forces) if forces else 0, 3)),
+        ('Force max (kg)', features['force_max_kg']),
+        ('Angle à force max (°)', features['angle_force_max_deg'])
+    ]
+    metadata.extend(feature_metadata(features))
+    if extra_metadata:
+        metadata.extend(extra_metadata)
+    return metadata
+
+
+def save_samples(variety, samples, exports_dir=EXPORTS_DIR):
+    """Écrire un ou plusieurs échantillons dans le classeur de la variété
+
+    samples : liste de dictionnaires {'sample_number', 'points', 'metadata'} avec
+    optionnellement 'calibration' et 'settings' (recopiés dans le fichier .mevs).
+    Les onglets existants du même échantillon sont remplacés.
+    """
+    import pandas as pd
+
+    os.makedirs(variety_directory(variety, exports_dir), exist_ok=True)
+    filepath = variety_workbook_path(variety, exports_dir)
+
+    # Si le fichier existe déjà, on l'ouvre et on remplace/ajoute les onglets
+    if os.path.exists(filepath):
+        writer_args = {'mode': 'a', 'if_sheet_exists': 'replace'}
+    else:
+        writer_args = {}
+
+    with pd.ExcelWriter(filepath, engine='openpyxl', **writer_args) as writer:
+        for sample in samples:
+            sample_number = sample['sample_number']
+
+            # Données de la mesure
+            pd.DataFrame(sample['points']).to_excel(
+                writer, sheet_name=f"Echantillon_{sample_number}", index=False)
+
+            # Métadonnées
+            metadata = sample['metadata']
+            metadata_df = pd.DataFrame({
+                'Information': [info for info, _ in metadata],
+                'Valeur': [value for _, value in metadata]
+            })
+            metadata_df.to_excel(writer, sheet_name=f"Meta_Ech_{sample_number}", index=False)
+
+    # Copie binaire indexée pour la lecture par tranches (interface, analyses)
+    for sample in samples:
+        write_sample_file(sample_file_path(variety, sample['sample_number'], exports_dir), sample['points'], {
+            'variety': variety,
+            'sample_number': sample['sample_number'],
+            'metadata': dict(sample['metadata']),
+            'calibration': sample.get('calibration'),
+            'settings': sample.get('settings')
+        })
+
+    return filepath
+
+
+def save_sample(variety, sample_number, points, exports_dir=EXPORTS_DIR, extra_metadata=None,
+                calibration=None, settings=None, features=None):
+    """Écrire un échantillon dans le classeur de la variété"""
+    metadata = build_sample_metadata(variety, sample_number, points, extra_metadata=extra_metadata,
+                                     features=features)
+    return save_samples(variety, [{
+        'sample_number': sample_number,
+        'points': points,
+        'metadata': metadata,
+        'calibration': calibration,
+        'settings': settings
+    }], exports_dir)
+
+
+def read_sample_metadata(variety, exports_dir=EXPORTS_DIR, exclude=()):
+    """Lire les métadonnées des échantillons du classeur d'une variété
+
+    exclude : numéros d'échantillons déjà connus par ailleurs (onglets non relus)
+    """
+    main_file = variety_workbook_path(variety, exports_dir)
+    if not os.path.exists(main_file):
+        return []
+
+    import pandas as pd
+
+    sample_stats = []
+
+    # Lister tous les onglets du fichier Excel
+    xls = pd.ExcelFile(main_file)
+
+    for sheet_name in xls.sheet_names:
+        if sheet_name.startswith('Meta_Ech_'):
+            # Extraire le numéro d'échantillon
+            sample_num = int(sheet_name.split('_')[-1])
+            if sample_num in exclude:
+                continue
+
+            # Lire les métadonnées
+            metadata_df = pd.read_excel(xls, sheet_name=sheet_name)
+            metadata_dict = dict(zip(metadata_df['Information'], metadata_df['Valeur']))
+
+            sample_stats.append({
+                'echantillon': sample_num,
+                'force_max_kg': float(metadata_dict.get('Force max (kg)', 0)),
+                'angle_force_max_deg': float(metadata_dict.get('Angle à force max (°)', 0)),
+                'date_mesure': metadata_dict.get('Date de mesure', ''),
+                'nb_points': metadata_dict.get('Nombre de points', 0),
+                'duree_s': metadata_dict.get('Durée (s)', 0)
+            })
+
+    # Trier par numéro d'échantillon
+    sample_stats.sort(key=lambda x: x['echantillon'])
+    return sample_stats
+
+
+def read_sample_points(variety, exports_dir=EXPORTS_DIR):
+    """Points de tous les échantillons d'une variété ({numéro: points}, fichiers .mevs)"""
+    directory = variety_directory(variety, exports_dir)
+    if not os.path.isdir(directory):
+        return {}
+
+    pattern = re.compile(re.escape(variety) + r'_ech(\d+)' + re.escape(SAMPLE_FILE_EXTENSION) + r'$')
+    samples = {}
+    for filename in os.listdir(directory):
+        match = pattern.match(filename)
+        if not match:
+            continue
+        with SampleFileReader(os.path.join(directory, filename)) as reader:
+            samples[int(match.group(1))] = reader.read_records(0, reader.count)
+    return samples
+
+
+def sample_summary_row(metadata):
+    """Ligne de détail d'un échantillon (même forme que read_sample_metadata)"""
+    values = dict(metadata)
+    return {
+        'echantillon': values['Échantillon'],
+        'force_max_kg': values['Force max (kg)'],
+        'angle_force_max_deg': values['Angle à force max (°)'],
+        'date_mesure': values['Date de mesure'],
+        'nb_points': values['Nombre de points'],
+        'duree_s': values['Durée (s)']
+    }
+
+
+def delete_sample(variety, sample_number, exports_dir=EXPORTS_DIR):
+    """Supprimer les onglets et le fichier binaire d'un échantillon"""
+    from openpyxl import load_workbook
+
+    filepath = variety_workbook_path(variety, exports_dir)
+    binary_path = sample_file_path(variety, sample_number, exports_dir)
+    if os.path.exists(binary_path):
+        os.remove(binary_path)
+
+    if not os.path.exists(filepath):
+        return False
+
+    workbook = load_workbook(filepath)
+    sheets = [f"Echantillon_{sample_number}", f"Meta_Ech_{sample_number}"]
+    removed = False
+    for sheet_name in sheets:
+        if sheet_name in workbook.sheetnames:
+            workbook.remove(workbook[sheet_name])
+            removed = True
+
+    if not workbook.sheetnames:
+        # Un classeur ne peut pas être vide : plus aucun échantillon
+        os.remove(filepath)
+    elif removed:
+        workbook.save(filepath)
+    return removed
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Profilage à la demande de la chaîne de mesure
+Mode facultatif (MEVEM_PROFILE_PIPELINE=1 ou /api/debug/profile) : chaque étape
+du thread de mesure (lecture série, décodage, expressions régulières,
+calibration, détection, moyennage, envoi Socket.IO) et chaque export est
+chronométré dans un tampon circulaire de taille fixe. Désactivé, il ne coûte
+qu'un test de booléen par bloc lu.
+
+Des captures de N secondes sont aussi possibles : cProfile dans le thread de
+mesure (fichier .prof pour snakeviz, flameprof...) ou échantillonnage des piles
+de tous les threads (piles repliées pour flamegraph.pl ou speedscope).
+"""
+
+import functools
+import os
+import sys
+import threading
+import time
+from array import array
+
+PROFILE_ENV = 'MEVEM_PROFILE_PIPELINE'
+STAGES = ('serial_read', 'decode', 'parse', 'calibration', 'detection', 'averaging', 'emit')
+RING_SIZE = 4096            # Durées gardées par étape
+MAX_CAPTURE_SECONDS = 60.0
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+
+class StageRing:
+    """Dernières durées d'une étape (tampon circulaire, sans allocation)"""
+
+    __slots__ = ('values', 'size', 'count', 'total')
+
+    def __init__(self, size=RING_SIZE):
+        self.size = size
+        self.values = array('d', bytes(8 * size))
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, duration):
+        self.values[self.count % self.size] = duration
+        self.count += 1
+        self.total += duration
+
+    def summary(self):
+        """Statistiques sur les durées du tampon (en millisecondes)"""
+        kept = sorted(self.values[:min(self.count, self.size)])
+        if not kept:
+            return {'count': self.count, 'window': 0}
+
+        def quantile(q):
+            return kept[min(len(kept) - 1, int(q * len(kept)))] * 1000
+
+        return {
+            'count': self.count,
+            'window': len(kept),
+            'total_ms': round(self.total * 1000, 3),
+            'mean_ms': round(sum(kept) / len(kept) * 1000, 4),
+            'p50_ms': round(quantile(0.50), 4),
+            'p95_ms': round(quantile(0.95), 4),
+            'p99_ms': round(quantile(0.99), 4),
+            'max_ms': round(kept[-1] * 1000, 4)
+        }
+
+
+class PipelineProfiler:
+    """Durées par étape et captures cProfile / échantillonnage à la demande"""
+
+    def __init__(self, enabled=None, ring_size=RING_SIZE):
+        self.enabled = os.environ.get(PROFILE_ENV) == '1' if enabled is None else enabled
+        self.ring_size = ring_size
+        self.stages = {name: StageRing(ring_size) for name in STAGES}
+        self._lock = threading.Lock()
+        self._capture = None
+
+    def ring(self, name):
+        ring = self.stages.get(name)
+        if ring is None:
+            with self._lock:
+                ring = self.stages.setdefault(name, StageRing(self.ring_size))
+        return ring
+
+    def record(self, name, duration):
+        self.ring(name).add(duration)
+
+    def timed(self, name):
+        """Décorateur : durée de chaque appel (routes d'export) quand le profilage est actif"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def reset(self):
+        with self._lock:
+            self.stages = {name: StageRing(self.ring_size) for name in STAGES}
+
+    def to_dict(self):
+        return {
+            'enabled': self.enabled,
+            'ring_size': self.ring_size,
+            'stages': {name: ring.summary() for name, ring in list(self.stages.items())}
+        }
+
+    # ---- Capture cProfile dans le thread de mesure ----
+
+    def request_cprofile(self, seconds):
+        """Demander une capture cProfile ; le thread de mesure la démarre à son prochain passage"""
+        with self._lock:
+            if self._capture is not None:
+                return None
+            self._capture = {'seconds': seconds, 'profile': None, 'deadline': None, 'done': threading.Event()}
+            return self._capture
+
+    def cancel_cprofile(self, capture):
+        with self._lock:
+            if self._capture is capture:
+                if capture['profile'] is not None:
+                    capture['profile'].disable()
+                self._capture = None
+
+    def poll_capture(self):
+        """Appelé par le thread de mesure à chaque tour de boucle"""
+        capture = self._capture
+        if capture is None:
+            return
+        if capture['profile'] is None:
+            import cProfile
+
+            capture['profile'] = cProfile.Profile()
+            capture['deadline'] = time.monotonic() + capture['seconds']
+            capture['profile'].enable()
+        elif time.monotonic() >= capture['deadline']:
+            capture['profile'].disable()
+            with self._lock:
+                self._capture = None
+            capture['done'].set()
+
+    def finish_capture(self):
+        """Fin du thread de mesure : clore une capture en cours"""
+        capture = self._capture
+        if capture is not None and capture['profile'] is not None:
+            capture['profile'].disable()
+            with self._lock:
+                self._capture = None
+            capture['done'].set()
+
+
+def sample_stacks(seconds, interval=DEFAULT_SAMPLE_INTERVAL, thread_names=None):
+    """Échantillonner les piles des threads ; retourne {pile repliée: nombre d'échantillons}
+
+    Les piles repliées ("thread;module:fonction;...") se lisent avec flamegraph.pl
+    ou speedscope. thread_names restreint l'échantillonnage à certains threads.
+    """
+    me = threading.get_ident()
+    counts = {}
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            name = names.get(ident, str(ident))
+            if ident == me or (thread_names and name not in thread_names):
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            stack.append(name)
+            key = ';'.join(reversed(stack))
+            counts[key] = counts.get(key, 0) + 1
+        time.sleep(interval)
+    return counts
+
+
+def collapsed_text(counts):
+    """Piles repliées au format "pile nombre", une par ligne"""
+    return ''.join(f"{stack} {count}\n" for stack, count in sorted(counts.items()))
+
+
+def profile_dump(profile):
+    """Contenu binaire d'un fichier .prof (pstats) pour une capture cProfile"""
+    import marshal
+    import pstats
+
+    stats = pstats.Stats(profile)
+    return marshal.dumps(stats.stats)
+
+
+def profile_top(profile, limit=30):
+    """Fonctions les plus coûteuses (temps cumulé) d'une capture cProfile"""
+    import pstats
+
+    stats = pstats.Stats(profile)
+    rows = []
+    for (filename, line, name), (calls, primitive, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            'function': f"{os.path.basename(filename)}:{line}({name})",
+            'calls': calls,
+            'tottime_ms': round(tottime * 1000, 3),
+            'cumtime_ms': round(cumtime * 1000, 3)
+        })
+    rows.sort(key=lambda row: row['cumtime_ms'], reverse=True)
+    return rows[:limit]
+
+
+pipeline_profiler = PipelineProfiler()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Mesure du temps de démarrage de l'application, phase par phase
+(imports, initialisation du décodeur, recherche du port, ouverture du serveur,
+préchargement des modules lourds). Le rapport est affiché si la variable
+d'environnement MEVEM_PROFILE_STARTUP vaut 1, et reste consultable par l'API.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+PROFILE_ENV = 'MEVEM_PROFILE_STARTUP'
+# Modules chargés à la demande (export Excel, statistiques), préchargés après le démarrage
+WARM_MODULES = ('pandas', 'openpyxl', 'numpy')
+
+
+class StartupProfiler:
+    """Durées des phases de démarrage (secondes depuis l'import de ce module)"""
+
+    def __init__(self, enabled=None):
+        self.t0 = time.perf_counter()
+        self.enabled = os.environ.get(PROFILE_ENV) == '1' if enabled is None else enabled
+        self.phases = []
+        self.finished = False
+        self._last = self.t0
+        self._lock = threading.Lock()
+
+    def _record(self, name, start, end):
+        with self._lock:
+            self.phases.append({
+                'phase': name,
+                'start': round(start - self.t0, 4),
+                'duration': round(end - start, 4)
+            })
+        if self.enabled:
+            print(f"⏱️ [démarrage] {name}: {(end - start) * 1000:.0f} ms")
+
+    def mark(self, name):
+        """Clore une phase commencée à la marque précédente"""
+        now = time.perf_counter()
+        if not self.finished:
+            self._record(name, self._last, now)
+        self._last = now
+
+    @contextmanager
+    def phase(self, name):
+        """Chronométrer un bloc (sans effet une fois le démarrage terminé)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            if not self.finished:
+                self._record(name, start, end)
+            self._last = end
+
+    def finish(self):
+        """Démarrage terminé (serveur prêt) : afficher le rapport si demandé"""
+        if self.finished:
+            return
+        self.finished = True
+        self.total = time.perf_counter() - self.t0
+        if self.enabled:
+            print(self.report())
+
+    def report(self):
+        lines = ["📋 Profil de démarrage", "-" * 44]
+        for phase in self.phases:
+            lines.append(f"  {phase['phase']:<32} {phase['duration'] * 1000:8.0f} ms")
+        if self.finished:
+            lines.append("-" * 44)
+            lines.append(f"  {'Serveur prêt après':<32} {self.total * 1000:8.0f} ms")
+        return "\n".join(lines)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'finished': self.finished,
+                'total': round(self.total, 4) if self.finished else None,
+                'phases': list(self.phases)
+            }
+
+
+def warm_imports(profiler=None, modules=WARM_MODULES):
+    """Importer les modules lourds en arrière-plan (premier export sans attente)"""
+    import importlib
+
+    for name in modules:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            print(f"⚠️ Préchargement {name} impossible: {e}")
+            continue
+        if profiler and profiler.enabled:
+            print(f"⏱️ [arrière-plan] import {name}: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+
+def wait_for_server(host, port, timeout=30.0):
+    """Attendre que le serveur accepte les connexions ; retourne True s'il est prêt"""
+    import socket
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+startup_profiler = StartupProfiler()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Écriture en continu des points décodés (mode surveillance de main.py)
+Formats csv, ndjson ou binaire, tampon en mémoire vidé périodiquement,
+rotation des fichiers par taille ou par durée, sortie standard pour les pipelines
+"""
+
+import json
+import os
+import struct
+import sys
+import time
+
+SINK_FORMATS = ('csv', 'ndjson', 'binary')
+SINK_EXTENSIONS = {'csv': '.csv', 'ndjson': '.ndjson', 'binary': '.mevbin'}
+
+CSV_HEADER = 'Timestamp,Type,Angle_deg,Force_kg,Raw_Angle,Raw_Force\n'
+
+# Binaire : en-tête JSON puis enregistrements de largeur fixe
+BINARY_MAGIC = b'MEVSTRM1'
+BINARY_HEADER_LENGTH = struct.Struct('<I')
+# instant (epoch), type de trame, brut angle, brut force, angle (°), force (kg)
+BINARY_RECORD = struct.Struct('<dBHHff')
+BINARY_FIELDS = ('timestamp', 'type', 'raw_angle', 'raw_force', 'angle_deg', 'force_kg')
+
+
+class StreamingSink:
+    """Écrivain tamponné avec vidage périodique et rotation
+
+    stdout : True (sortie standard du processus) ou flux binaire ouvert, à capturer
+    avant toute redirection de sys.stdout vers les messages. Le fichier (ou la
+    première partie d'une rotation) n'est créé qu'au premier point écrit.
+    """
+
+    def __init__(self, path=None, fmt='csv', stdout=False, flush_interval=1.0,
+                 rotate_size=None, rotate_interval=None, buffer_size=64 * 1024,
+                 frame_types=(), calibration=None):
+        if fmt not in SINK_FORMATS:
+            raise ValueError(f"Format inconnu: {fmt} (disponibles: {', '.join(SINK_FORMATS)})")
+
+        self.path = path
+        self.fmt = fmt
+        self.to_stdout = bool(stdout)
+        self._stdout = (sys.__stdout__.buffer if stdout is True else stdout) if stdout else None
+        self.flush_interval = flush_interval
+        self.rotate_size = rotate_size
+        self.rotate_interval = rotate_interval
+        self.buffer_size = buffer_size
+        self.frame_types = list(frame_types)
+        self.calibration = calibration
+
+        self._type_codes = {name: code for code, name in enumerate(self.frame_types)}
+        self._buffer = bytearray()
+        self._file = None
+        self._part = 0
+        self._file_bytes = 0
+        self._file_opened_at = 0.0
+        self._last_flush = time.time()
+
+        # Résumé de la session (remplace la liste complète des points)
+        self.count = 0
+        self.files = []
+        self.angle_min = self.angle_max = None
+        self.force_min = self.force_max = None
+
+        self._serialize = {
+            'csv': self._serialize_csv,
+            'ndjson': self._serialize_ndjson,
+            'binary': self._serialize_binary
+        }[fmt]
+
+    def _next_path(self):
+        """Nom du prochain fichier (suffixe _001, _002... si rotation)"""
+        if not (self.rotate_size or self.rotate_interval):
+            return self.path
+        stem, ext = os.path.splitext(self.path)
+        return f"{stem}_{self._part:03d}{ext}"
+
+    def _open(self):
+        self._part += 1
+        if self.to_stdout:
+            self._file = self._stdout
+        else:
+            path = self._next_path()
+            self._file = open(path, 'wb')
+            self.files.append(path)
+        self._file_bytes = 0
+        self._file_opened_at = time.time()
+        self._buffer += self._file_header()
+
+    def _file_header(self):
+        """En-tête écrit au début de chaque fichier"""
+        if self.fmt == 'csv':
+            return CSV_HEADER.encode('ascii')
+        if self.fmt == 'binary':
+            header = json.dumps({
+                'record': BINARY_RECORD.format,
+                'fields': BINARY_FIELDS,
+                'types': self.frame_types,
+                'calibration': self.calibration
+            }).encode('utf-8')
+            return BINARY_MAGIC + BINARY_HEADER_LENGTH.pack(len(header)) + header
+        return b''
+
+    def _serialize_csv(self, point):
+        return (f"{point['timestamp'].isoformat()},{point['type']},{point['angle_deg']:.3f},"
+                f"{point['force_kg']:.4f},{point['raw_angle']},{point['raw_force']}\n").encode('ascii')
+
+    def _serialize_ndjson(self, point):
+        return (json.dumps({
+            'timestamp': point['timestamp'].isoformat(),
+            'type': point['type'],
+            'angle_deg': round(point['angle_deg'], 3),
+            'force_kg': round(point['force_kg'], 4),
+            'raw_angle': point['raw_angle'],
+            'raw_force': point['raw_force']
+        }) + '\n').encode('utf-8')
+
+    def _serialize_binary(self, point):
+        type_code = self._type_codes.get(point['type'])
+        if type_code is None:
+            type_code = self._type_codes[point['type']] = len(self.frame_types)
+            self.frame_types.append(point['type'])
+        return BINARY_RECORD.pack(point['timestamp'].timestamp(), type_code,
+                                  point['raw_angle'], point['raw_force'],
+                                  point['angle_deg'], point['force_kg'])
+
+    def write(self, point):
+        """Ajouter un point décodé (dictionnaire de CalibratedSensorDecoder.parse_line)"""
+        if self._file is None:
+            self._open()
+        self._buffer += self._serialize(point)
+        self.count += 1
+
+        angle = point['angle_deg']
+        force = point['force_kg']
+        if self.angle_min is None:
+            self.angle_min = self.angle_max = angle
+            self.force_min = self.force_max = force
+        else:
+            if angle < self.angle_min:
+                self.angle_min = angle
+            elif angle > self.angle_max:
+                self.angle_max = angle
+            if force < self.force_min:
+                self.force_min = force
+            elif force > self.force_max:
+                self.force_max = force
+
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+        else:
+            self.tick()
+
+    def tick(self):
+        """Vidage périodique (à appeler aussi quand aucune donnée n'arrive)"""
+        if self._file is None:
+            return
+        now = time.time()
+        if self._buffer and now - self._last_flush >= self.flush_interval:
+            self.flush()
+        elif self.rotate_interval and not self.to_stdout and now - self._file_opened_at >= self.rotate_interval:
+            self._rotate()
+
+    def flush(self):
+        """Écrire le tampon et forcer l'écriture sur disque/sortie"""
+        if self._file is None:
+            return
+        if self._buffer:
+            self._file.write(self._buffer)
+            self._file_bytes += len(self._buffer)
+            self._buffer = bytearray()
+        self._file.flush()
+        self._last_flush = time.time()
+
+        if self.to_stdout:
+            return
+        if ((self.rotate_size and self._file_bytes >= self.rotate_size) or
+                (self.rotate_interval and self._last_flush - self._file_opened_at >= self.rotate_interval)):
+            self._rotate()
+
+    def _rotate(self):
+        """Fermer le fichier courant ; le suivant est ouvert au prochain point"""
+        self._file.close()
+        self._file = None
+
+    def close(self):
+        """Vider le tampon et fermer"""
+        if self._file is None:
+            return
+        self.flush()
+        if self._file is not None and not self.to_stdout:
+            self._file.close()
+        self._file = None
+
+
+def parse_size(value):
+    """Convertir une taille '50M', '2G', '512k' ou '1000' en octets"""
+    units = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+    value = value.strip().lower()
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+Analyse croisée de toutes les variétés d'un essai (dossier exports/)
+Les variétés sont lues en parallèle sur un pool de processus ; le résultat de
+chacune est mis en cache (empreinte mtime/taille ou contenu de ses fichiers) et
+le rapport (classement, intervalles de confiance, comparaisons deux à deux) se
+complète au fur et à mesure que les variétés sont traitées.
+"""
+
+import hashlib
+import json
+import math
+import os
+import time
+from datetime import datetime
+
+from bootstrap_stats import variety_bootstrap
+from sample_file import SAMPLE_FILE_EXTENSION, SampleFileReader
+from sample_store import EXPORTS_DIR, read_sample_metadata, sample_summary_row, variety_workbook_path
+from variety_stats import RunningStats
+
+ANALYTICS_CACHE = '.analytics_cache.json'
+CACHE_VERSION = 2  # À incrémenter quand le contenu des résultats change
+CACHE_MODES = ('mtime', 'hash')
+RANKING_METRIC = 'force_max'
+
+# Quantiles à 97,5 % de la loi de Student (IC bilatéral à 95 %) ; au-delà de 30 ddl,
+# valeur du palier inférieur (intervalle légèrement élargi, donc prudent)
+_T_975 = {
+    1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306, 9: 2.262,
+    10: 2.228, 11: 2.201, 12: 2.179, 13: 2.160, 14: 2.145, 15: 2.131, 16: 2.120, 17: 2.110,
+    18: 2.101, 19: 2.093, 20: 2.086, 21: 2.080, 22: 2.074, 23: 2.069, 24: 2.064, 25: 2.060,
+    26: 2.056, 27: 2.052, 28: 2.048, 29: 2.045, 30: 2.042, 40: 2.021, 60: 2.000, 120: 1.980
+}
+
+
+def t_critical(df):
+    """Quantile 97,5 % de Student pour df degrés de liberté (df non entier arrondi par défaut)"""
+    df = int(math.floor(df))
+    if df < 1:
+        return None
+    if df in _T_975:
+        return _T_975[df]
+    lower = [d for d in _T_975 if d < df]
+    return _T_975[max(lower)] if df < 120 else 1.960
+
+
+def describe_series(values):
+    """Statistiques d'une série avec intervalle de confiance à 95 % de la moyenne"""
+    stats = RunningStats(values)
+    if not stats.count:
+        return None
+    sem = stats.std(ddof=1) / math.sqrt(stats.count) if stats.count > 1 else None
+    margin = t_critical(stats.count - 1) * sem if sem is not None else None
+    return {
+        'count': stats.count,
+        'mean': stats.mean,
+        'median': stats.median(),
+        'min': stats.min,
+        'max': stats.max,
+        'std_sample': stats.std(ddof=1),
+        'sem': sem,
+        'ci_low': stats.mean - margin if margin is not None else None,
+        'ci_high': stats.mean + margin if margin is not None else None
+    }
+
+
+def compare(a, b):
+    """Différence des moyennes de deux séries décrites (test de Welch, IC à 95 %)
+
+    None si l'une des séries a moins de deux échantillons.
+    """
+    if not a or not b or a['count'] < 2 or b['count'] < 2:
+        return None
+    var_a = a['std_sample'] ** 2 / a['count']
+    var_b = b['std_sample'] ** 2 / b['count']
+    difference = a['mean'] - b['mean']
+    se = math.sqrt(var_a + var_b)
+    if se == 0:
+        return {'difference': difference, 'df': None, 'ci_low': difference, 'ci_high': difference,
+                'significant': difference != 0}
+
+    # Degrés de liberté de Welch-Satterthwaite
+    df = (var_a + var_b) ** 2 / (var_a ** 2 / (a['count'] - 1) + var_b ** 2 / (b['count'] - 1))
+    margin = t_critical(df) * se
+    return {
+        'difference': difference,
+        'df': df,
+        'ci_low': difference - margin,
+        'ci_high': difference + margin,
+        'significant': difference - margin > 0 or difference + margin < 0
+    }
+
+
+def list_varieties(exports_dir=EXPORTS_DIR):
+    """Variétés du dossier d'exports (sous-dossiers contenant un classeur ou des fichiers .mevs)"""
+    if not os.path.isdir(exports_dir):
+        return []
+    varieties = []
+    for name in sorted(os.listdir(exports_dir)):
+        directory = os.path.join(exports_dir, name)
+        if os.path.isdir(directory) and _variety_files(name, exports_dir):
+            varieties.append(name)
+    return varieties
+
+
+def _variety_files(variety, exports_dir):
+    """Fichiers de données d'une variété (classeur principal et .mevs), triés"""
+    directory = os.path.join(exports_dir, variety)
+    workbook = os.path.basename(variety_workbook_path(variety, exports_dir))
+    prefix = f"{variety}_ech"
+    return sorted(name for name in os.listdir(directory)
+                  if name == workbook or (name.startswith(prefix) and name.endswith(SAMPLE_FILE_EXTENSION)))
+
+
+def variety_signature(variety, exports_dir=EXPORTS_DIR, mode='mtime'):
+    """Empreinte des fichiers d'une variété : (nom, mtime, taille) ou SHA-1 du contenu"""
+    directory = os.path.join(exports_dir, variety)
+    signature = []
+    for name in _variety_files(variety, exports_dir):
+        path = os.path.join(directory, name)
+        if mode == 'hash':
+            digest = hashlib.sha1()
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+            signature.append([name, digest.hexdigest()])
+        else:
+            stat = os.stat(path)
+            signature.append([name, stat.st_mtime_ns, stat.st_size])
+    return signature
+
+
+def read_variety_samples(variety, exports_dir=EXPORTS_DIR):
+    """Lignes de détail des échantillons d'une variété
+
+    Les métadonnées sont prises dans l'en-tête des fichiers .mevs ; seuls les
+    échantillons sans fichier .mevs (enregistrés avant ce format) sont relus dans
+    le classeur.
+    """
+    directory = os.path.join(exports_dir, variety)
+    rows = []
+    for name in _variety_files(variety, exports_dir):
+        if not name.endswith(SAMPLE_FILE_EXTENSION):
+            continue
+        with SampleFileReader(os.path.join(directory, name)) as reader:
+            rows.append(sample_summary_row(reader.header['metadata']))
+    known = {int(row['echantillon']) for row in rows}
+    # Valeurs numpy du classeur converties pour le cache JSON
+    rows.extend({key: value.item() if hasattr(value, 'item') else value for key, value in row.items()}
+                for row in read_sample_metadata(variety, exports_dir, exclude=known))
+    rows.sort(key=lambda row: row['echantillon'])
+    return rows
+
+
+def analyse_variety(variety, exports_dir=EXPORTS_DIR):
+    """Résultat d'une variété : détail des échantillons et statistiques avec IC"""
+    samples = read_variety_samples(variety, exports_dir)
+    return {
+        'variety': variety,
+        'count': len(samples),
+        'force_max': describe_series([float(s['force_max_kg']) for s in samples]),
+        'angle_force_max': describe_series([float(s['angle_force_max_deg']) for s in samples]),
+        'bootstrap': variety_bootstrap(samples),
+        'samples': samples
+    }
+
+
+def _analyse_worker(job):
+    """Analyse d'une variété dans un processus du pool"""
+    variety, exports_dir = job
+    try:
+        return analyse_variety(variety, exports_dir)
+    except Exception as e:
+        return {'variety': variety, 'error': str(e)}
+
+
+class TrialReport:
+    """Rapport d'essai complété variété par variété
+
+    L'ajout d'une variété ne calcule que ses comparaisons avec les variétés déjà
+    présentes (O(N)) : le rapport partiel est consultable à tout moment.
+    """
+
+    def __init__(self, metric=RANKING_METRIC):
+        self.metric = metric
+        self.results = {}
+        self.errors = {}
+        self.comparisons = {}
+
+    def add(self, result):
+        """Ajouter ou remplacer le résultat d'une variété"""
+        variety = result['variety']
+        if 'error' in result:
+            self.errors[variety] = result['error']
+            self.results.pop(variety, None)
+            self.comparisons = {pair: c for pair, c in self.comparisons.items() if variety not in pair}
+            return
+
+        self.errors.pop(variety, None)
+        self.results[variety] = result
+        for other, other_result in self.results.items():
+            if other == variety:
+                continue
+            pair = tuple(sorted((variety, other)))
+            self.comparisons[pair] = compare(self.results[pair[0]][self.metric],
+                                             self.results[pair[1]][self.metric])
+
+    def ranking(self):
+        """Variétés classées par moyenne décroissante de la métrique"""
+        ranked = sorted((r for r in self.results.values() if r[self.metric]),
+                        key=lambda r: r[self.metric]['mean'], reverse=True)
+        return [{
+            'rank': position,
+            'variety': result['variety'],
+            'count': result['count'],
+            self.metric: result[self.metric],
+            'angle_force_max': result['angle_force_max'],
+            'bootstrap': result['bootstrap']
+        } for position, result in enumerate(ranked, 1)]
+
+    def comparison_rows(self):
+        """Comparaisons deux à deux, dans l'ordre du classement"""
+        order = {row['variety']: row['rank'] for row in self.ranking()}
+        rows = []
+        for (a, b), comparison in self.comparisons.items():
+            if a not in order or b not in order:
+                continue
+            # Variété la mieux classée en premier : différence positive
+            if order[b] < order[a]:
+                a, b = b, a
+                if comparison:
+                    comparison = {**comparison, 'difference': -comparison['difference'],
+                                  'ci_low': -comparison['ci_high'], 'ci_high': -comparison['ci_low']}
+            rows.append({'variety_a': a, 'variety_b': b, 'comparison': comparison})
+        rows.sort(key=lambda row: (order[row['variety_a']], order[row['variety_b']]))
+        return rows
+
+    def to_dict(self):
+        return {
+            'metric': self.metric,
+            'varieties': len(self.results),
+            'ranking': self.ranking(),
+            'comparisons': self.comparison_rows(),
+            'errors': self.errors
+        }
+
+
+def _load_cache(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(path, cache):
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(cache, f, default=str)
+    os.replace(temp_path, path)
+
+
+def analyse_exports(exports_dir=EXPORTS_DIR, workers=None, cache_mode='mtime', use_cache=True,
+                    on_result=None, report=None):
+    """Analyser toutes les variétés du dossier d'exports
+
+    Les variétés dont l'empreinte n'a pas changé sont reprises du cache ; les
+    autres sont analysées en parallèle. on_result(result, done, total) est appelé
+    à chaque variété ajoutée au rapport (reprise du cache ou fin d'analyse).
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    if cache_mode not in CACHE_MODES:
+        raise ValueError(f"Mode de cache inconnu: {cache_mode}")
+
+    report = report or TrialReport()
+    varieties = list_varieties(exports_dir)
+    cache_path = os.path.join(exports_dir, ANALYTICS_CACHE)
+    cache = _load_cache(cache_path) if use_cache else {}
+    new_cache = {}
+    total = len(varieties)
+    done = 0
+
+    def publish(result):
+        nonlocal done
+        done += 1
+        report.add(result)
+        if on_result:
+            on_result(result, done, total)
+
+    stale = []
+    for variety in varieties:
+        signature = variety_signature(variety, exports_dir, cache_mode)
+        entry = cache.get(variety)
+        if (entry and entry.get('version') == CACHE_VERSION and entry.get('mode') == cache_mode
+                and entry.get('signature') == signature):
+            new_cache[variety] = entry
+            publish(entry['result'])
+        else:
+            stale.append((variety, signature))
+
+    def store(result, signature):
+        if 'error' not in result:
+            new_cache[result['variety']] = {'version': CACHE_VERSION, 'mode': cache_mode,
+                                            'signature': signature, 'result': result}
+        publish(result)
+
+    signatures = dict(stale)
+    workers = min(workers or os.cpu_count() or 1, len(stale))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_analyse_worker, (variety, exports_dir)) for variety, _ in stale]
+            for future in as_completed(futures):
+                result = future.result()
+                store(result, signatures[result['variety']])
+    else:
+        # Une seule variété à relire : pas de coût de démarrage du pool
+        for variety, signature in stale:
+            store(_analyse_worker((variety, exports_dir)), signature)
+
+    if use_cache and os.path.isdir(exports_dir):
+        _save_cache(cache_path, new_cache)
+    return report
+
+
+def _round(value, digits):
+    return round(value, digits) if value is not None else None
+
+
+def write_trial_report(report, target):
+    """Écrire le rapport d'essai dans un classeur Excel (chemin ou flux binaire)"""
+    import pandas as pd
+
+    def bootstrap_bound(row, metric, bound, digits):
+        return _round(row['bootstrap'][metric][bound], digits) if row['bootstrap'] else None
+
+    ranking = [{
+        'Rang': row['rank'],
+        'Variété': row['variety'],
+        'Nombre échantillons': row['count'],
+        'Force max moyenne (kg)': _round(row['force_max']['mean'], 3),
+        'IC 95 % bas (kg)': _round(row['force_max']['ci_low'], 3),
+        'IC 95 % haut (kg)': _round(row['force_max']['ci_high'], 3),
+        'IC bootstrap bas (kg)': bootstrap_bound(row, 'force_max', 'low', 3),
+        'IC bootstrap haut (kg)': bootstrap_bound(row, 'force_max', 'high', 3),
+        'Écart-type force (kg)': _round(row['force_max']['std_sample'], 3),
+        'Angle moyen à force max (°)': _round(row['angle_force_max']['mean'], 1),
+        'IC 95 % bas angle (°)': _round(row['angle_force_max']['ci_low'], 1),
+        'IC 95 % haut angle (°)': _round(row['angle_force_max']['ci_high'], 1),
+        'IC bootstrap bas angle (°)': bootstrap_bound(row, 'angle_force_max', 'low', 1),
+        'IC bootstrap haut angle (°)': bootstrap_bound(row, 'angle_force_max', 'high', 1)
+    } for row in report.ranking()]
+
+    comparisons = []
+    for row in report.comparison_rows():
+        comparison = row['comparison'] or {}
+        comparisons.append({
+            'Variété A': row['variety_a'],
+            'Variété B': row['variety_b'],
+            'Différence force max (kg)': _round(comparison.get('difference'), 3),
+            'IC 95 % bas (kg)': _round(comparison.get('ci_low'), 3),
+            'IC 95 % haut (kg)': _round(comparison.get('ci_high'), 3),
+            'Différence significative': ('Oui' if comparison['significant'] else 'Non') if comparison
+            else 'Trop peu d\'échantillons'
+        })
+
+    details = [dict(sample, variete=result['variety'])
+               for result in sorted(report.results.values(), key=lambda r: r['variety'])
+               for sample in result['samples']]
+
+    with pd.ExcelWriter(target, engine='openpyxl') as writer:
+        pd.DataFrame(ranking).to_excel(writer, sheet_name='Classement', index=False)
+        pd.DataFrame(comparisons).to_excel(writer, sheet_name='Comparaisons', index=False)
+        pd.DataFrame(details).to_excel(writer, sheet_name='Détail échantillons', index=False)
+        if report.errors:
+            pd.DataFrame([{'Variété': v, 'Erreur': e} for v, e in sorted(report.errors.items())]).to_excel(
+                writer, sheet_name='Erreurs', index=False)
+    return target
+
+
+def main():
+    """Fonction principale"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Rapport croisé de toutes les variétés d\'un essai')
+    parser.add_argument('exports_dir', nargs='?', default=EXPORTS_DIR, help='Dossier des variétés')
+    parser.add_argument('--output', help='Classeur du rapport (par défaut dans le dossier des variétés)')
+    parser.add_argument('--workers', type=int, help='Nombre de processus')
+    parser.add_argument('--hash', action='store_true', help='Cache indexé sur le contenu des fichiers')
+    parser.add_argument('--no-cache', action='store_true', help='Tout relire sans utiliser le cache')
+
+    args = parser.parse_args()
+
+    def progress(result, done, total):
+        if 'error' in result:
+            print(f"  ❌ [{done}/{total}] {result['variety']}: {result['error']}")
+        else:
+            print(f"  ✅ [{done}/{total}] {result['variety']}: {result['count']} échantillons")
+
+    start = time.time()
+    print(f"📈 Analyse des variétés de {args.exports_dir}...")
+    report = analyse_exports(args.exports_dir, workers=args.workers,
+                             cache_mode='hash' if args.hash else 'mtime',
+                             use_cache=not args.no_cache, on_result=progress)
+
+    output = args.output or os.path.join(
+        args.exports_dir, f"rapport_essai_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx")
+    write_trial_report(report, output)
+    print(f"⏱️ {len(report.results)} variétés analysées en {time.time() - start:.1f}s - rapport dans {output}")
+
+
+if __name__ == "__main__":
+    main()
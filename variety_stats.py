@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Statistiques par variété tenues à jour incrémentalement
+Moyenne et variance de Welford (ajout et retrait), min/max et quantiles exacts
+sur une liste triée : le résumé d'une variété se calcule sans relire les classeurs.
+"""
+
+import bisect
+import math
+import os
+import threading
+
+from bootstrap_stats import variety_bootstrap
+
+
+class RunningStats:
+    """Agrégats d'une série de valeurs avec ajout et retrait"""
+
+    def __init__(self, values=()):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self._sorted = []
+        for value in values:
+            self.add(value)
+
+    def add(self, value):
+        """Ajouter une valeur (Welford)"""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        bisect.insort(self._sorted, value)
+
+    def remove(self, value):
+        """Retirer une valeur précédemment ajoutée (Welford inversé)"""
+        index = bisect.bisect_left(self._sorted, value)
+        if index == len(self._sorted) or self._sorted[index] != value:
+            raise ValueError(f"Valeur absente des statistiques: {value}")
+        del self._sorted[index]
+
+        if self.count == 1:
+            self.count = 0
+            self.mean = 0.0
+            self._m2 = 0.0
+            return
+
+        old_mean = self.mean
+        self.mean = (self.count * old_mean - value) / (self.count - 1)
+        self._m2 = max(0.0, self._m2 - (value - old_mean) * (value - self.mean))
+        self.count -= 1
+
+    def variance(self, ddof=0):
+        """Variance (ddof=0 : population, ddof=1 : échantillon)"""
+        if self.count - ddof <= 0:
+            return 0.0
+        return self._m2 / (self.count - ddof)
+
+    def std(self, ddof=0):
+        return math.sqrt(self.variance(ddof))
+
+    @property
+    def min(self):
+        return self._sorted[0] if self._sorted else None
+
+    @property
+    def max(self):
+        return self._sorted[-1] if self._sorted else None
+
+    def quantile(self, q):
+        """Quantile exact avec interpolation linéaire (méthode par défaut de NumPy)"""
+        if not self._sorted:
+            return None
+        position = (len(self._sorted) - 1) * q
+        low = math.floor(position)
+        high = math.ceil(position)
+        if low == high:
+            return self._sorted[low]
+        return self._sorted[low] + (self._sorted[high] - self._sorted[low]) * (position - low)
+
+    def median(self):
+        return self.quantile(0.5)
+
+    def values(self):
+        """Valeurs triées"""
+        return list(self._sorted)
+
+
+class VarietyStatsRegistry:
+    """Agrégats par variété, mis à jour à chaque sauvegarde, remplacement ou suppression
+
+    loader(variety) retourne la liste des échantillons déjà enregistrés
+    (dictionnaires avec 'echantillon', 'force_max_kg', 'angle_force_max_deg'...).
+    Il n'est appelé qu'au premier accès à une variété, ou si son classeur a été
+    modifié par un autre processus (ex. retraitement hors ligne).
+    """
+
+    def __init__(self, loader=None, source_path=None):
+        self.loader = loader
+        self.source_path = source_path
+        self._lock = threading.RLock()
+        self._varieties = {}
+
+    def _source_mtime(self, variety):
+        if not self.source_path:
+            return None
+        path = self.source_path(variety)
+        return os.path.getmtime(path) if os.path.exists(path) else None
+
+    def _entry(self, variety, check_source=True):
+        """Agrégats d'une variété (chargés depuis le classeur si nécessaire)"""
+        entry = self._varieties.get(variety)
+        if entry is not None and not check_source:
+            return entry
+        mtime = self._source_mtime(variety)
+        if entry is None or entry['mtime'] != mtime:
+            entry = {'samples': {}, 'force': RunningStats(), 'angle': RunningStats(), 'mtime': mtime,
+                     'bootstrap': None}
+            self._varieties[variety] = entry
+            if self.loader:
+                for sample in self.loader(variety):
+                    self._set(entry, sample)
+        return entry
+
+    def _set(self, entry, sample):
+        number = sample['echantillon']
+        previous = entry['samples'].get(number)
+        if previous:
+            entry['force'].remove(previous['force_max_kg'])
+            entry['angle'].remove(previous['angle_force_max_deg'])
+        entry['samples'][number] = sample
+        entry['bootstrap'] = None
+        entry['force'].add(sample['force_max_kg'])
+        entry['angle'].add(sample['angle_force_max_deg'])
+
+    def set_sample(self, variety, sample):
+        """Ajouter ou remplacer un échantillon (après écriture du classeur)"""
+        with self._lock:
+            entry = self._entry(variety, check_source=False)
+            self._set(entry, sample)
+            entry['mtime'] = self._source_mtime(variety)
+
+    def remove_sample(self, variety, sample_number):
+        """Retirer un échantillon ; retourne False s'il était absent"""
+        with self._lock:
+            entry = self._entry(variety, check_source=False)
+            previous = entry['samples'].pop(sample_number, None)
+            if previous:
+                entry['force'].remove(previous['force_max_kg'])
+                entry['angle'].remove(previous['angle_force_max_deg'])
+                entry['bootstrap'] = None
+            entry['mtime'] = self._source_mtime(variety)
+            return previous is not None
+
+    def samples(self, variety):
+        """Échantillons de la variété, triés par numéro"""
+        with self._lock:
+            entry = self._entry(variety)
+            return [entry['samples'][number] for number in sorted(entry['samples'])]
+
+    def summary(self, variety):
+        """Résumé de la variété à partir des agrégats courants
+
+        Les intervalles bootstrap ne sont recalculés qu'après une modification des échantillons.
+        """
+        with self._lock:
+            entry = self._entry(variety)
+            if entry['bootstrap'] is None and entry['force'].count >= 2:
+                entry['bootstrap'] = variety_bootstrap(list(entry['samples'].values()))
+            return {
+                'variety': variety,
+                'count': entry['force'].count,
+                'force_max': _describe(entry['force']),
+                'angle_force_max': _describe(entry['angle']),
+                'bootstrap': entry['bootstrap']
+            }
+
+
+def _describe(stats):
+    """Dictionnaire des statistiques d'une série"""
+    if not stats.count:
+        return None
+    return {
+        'mean': stats.mean,
+        'median': stats.median(),
+        'min': stats.min,
+        'max': stats.max,
+        'std': stats.std(ddof=0),
+        'std_sample': stats.std(ddof=1),
+        'q1': stats.quantile(0.25),
+        'q3': stats.quantile(0.75)
+    }
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Suivi automatique du zéro de la voie force (tare en continu)
+La ligne de base brute est estimée par moyenne exponentielle pendant les phases
+de repos détectées entre deux échantillons. Le décalage, arrondi à `resolution`
+unité brute, est compilé en arrière-plan dès qu'il change au repos ; au début de
+chaque échantillon la table de conversion déjà prête est simplement échangée
+(aucune compilation dans le thread de mesure, aucun coût par trame).
+"""
+
+from sample_detector import ARMING, IDLE
+
+
+class ForceZeroTracker:
+    """Estimation de la dérive du zéro de force pendant le repos"""
+
+    def __init__(self, enabled=True, alpha=0.02, min_rest_frames=50, max_offset=8.0, resolution=0.25):
+        self.enabled = enabled
+        # Poids de la moyenne exponentielle (≈ 1/alpha trames de mémoire)
+        self.alpha = alpha
+        # Nombre de trames au repos avant la première correction
+        self.min_rest_frames = min_rest_frames
+        # Correction maximale (unités brutes) : au-delà, charge oubliée ou capteur défaillant
+        self.max_offset = max_offset
+        # Pas du décalage appliqué (unités brutes) : une table n'est recompilée que s'il change
+        self.resolution = resolution
+        self.reset()
+
+    def reset(self):
+        """Oublier la ligne de base estimée"""
+        self.estimate = None
+        self.rest_frames = 0
+
+    @property
+    def ready(self):
+        return self.estimate is not None and self.rest_frames >= self.min_rest_frames
+
+    def observe(self, raw_force):
+        """Prendre en compte une valeur brute mesurée au repos"""
+        self.rest_frames += 1
+        if self.estimate is None:
+            self.estimate = float(raw_force)
+        else:
+            self.estimate += self.alpha * (raw_force - self.estimate)
+
+    def offset(self, raw_zero):
+        """Décalage brut à appliquer par rapport au zéro de calibration (borné, arrondi)"""
+        drift = max(-self.max_offset, min(self.max_offset, self.estimate - raw_zero))
+        if self.resolution:
+            drift = round(drift / self.resolution) * self.resolution
+        return drift
+
+    def step(self, decoder, previous_state, state, frame, released):
+        """Suivi du zéro après SampleDetector.feed (acquisition directe et retraitement)
+
+        Au repos la trame alimente l'estimation et la table du décalage courant est
+        préparée en arrière-plan ; au début de l'armement elle remplace la table de
+        conversion, et les trames de pré-déclenchement, converties avant la tare,
+        sont reconverties à leur libération. Les trames armées et la trame du rebond
+        (armement abandonné, charge pas encore retombée) n'entrent pas dans l'estimation.
+        """
+        if not self.enabled:
+            return
+        calibrated = decoder.calibration['force']['calibrated']
+        if state == IDLE:
+            if previous_state == ARMING:
+                return
+            self.observe(frame['raw_force'])
+            if self.ready and calibrated:
+                decoder.prepare_force_offset(self.offset(decoder.calibration['force']['raw_min']))
+            return
+        if previous_state == IDLE and self.ready and calibrated:
+            decoder.set_force_offset(self.offset(decoder.calibration['force']['raw_min']))
+        if previous_state == ARMING:
+            for pending, _ in released:
+                pending['angle_deg'], pending['force_kg'] = decoder.convert_raw_to_physical(
+                    pending['raw_angle'], pending['raw_force'])
+
+    def to_dict(self):
+        """État du suivi (enregistré dans l'en-tête des journaux bruts pour le retraitement)"""
+        return {
+            'enabled': self.enabled,
+            'alpha': self.alpha,
+            'min_rest_frames': self.min_rest_frames,
+            'max_offset': self.max_offset,
+            'resolution': self.resolution,
+            'estimate': self.estimate,
+            'rest_frames': self.rest_frames
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        """Reconstituer un suivi à partir de to_dict()"""
+        tracker = cls(state.get('enabled', True), state.get('alpha', 0.02),
+                      state.get('min_rest_frames', 50), state.get('max_offset', 8.0),
+                      state.get('resolution', 0))
+        tracker.estimate = state.get('estimate')
+        tracker.rest_frames = state.get('rest_frames', 0)
+        return tracker